@@ -0,0 +1,81 @@
+"""
+Measures the overhead of `dotcfg.tracing.AccessTracer` on a read heavy
+loop, once every key the loop uses has been read at least once.
+
+Usage:
+    python benchmarks/access_tracing.py [--sections 1000] [--exact-dead-keys]
+"""
+
+import argparse
+import statistics
+import time
+
+from dotcfg.collections import Config
+from dotcfg.tracing import AccessTracer
+
+
+def build_config(sections: int) -> Config:
+    return Config(
+        {
+            f"service_{i}": {"host": f"service-{i}-internal", "port": 8000 + i}
+            for i in range(sections)
+        }
+    )
+
+
+def read_loop(config: Config, seconds: float) -> int:
+    """Reads keys for `seconds`, returning the number of iterations"""
+    services = [f"service_{i}" for i in range(0, len(config), 10)]
+    iterations = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for name in services:
+            service = config[name]
+            service.host
+            service["port"]
+        iterations += 1
+    return iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--exact-dead-keys", action="store_true")
+    args = parser.parse_args()
+
+    config = build_config(args.sections)
+    read_loop(config, 0.5)
+
+    # Rounds alternate between tracing and not, since timings drift
+    baseline, traced = [], []
+    for _ in range(args.rounds):
+        baseline.append(read_loop(config, args.seconds))
+        with AccessTracer(
+            config,
+            sample_rate=args.sample_rate,
+            interval=args.interval,
+            exact_dead_keys=args.exact_dead_keys,
+        ) as tracer:
+            # Reads every section once, as a long running service would have
+            for section in config.values():
+                section.host
+                section.port
+            traced.append(read_loop(config, args.seconds))
+            report = tracer.report(top=3)
+
+    untraced_rate = statistics.median(baseline) / args.seconds
+    traced_rate = statistics.median(traced) / args.seconds
+    overhead = (untraced_rate - traced_rate) / untraced_rate * 100
+    print(f"  baseline: {untraced_rate:10.0f} iterations/s")
+    print(f"    traced: {traced_rate:10.0f} iterations/s")
+    print(f"  overhead: {overhead:10.2f}%")
+    for stats in report.hot:
+        print(f"  hot: {'.'.join(stats.path)} ~{stats.estimated_reads:.0f} reads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares building a large `Config` one key at a time (the way Box does)
+with `dotcfg.collections.build_config`, which builds it in a single pass,
+for each of the paths that build configurations in bulk.
+
+Usage:
+    python benchmarks/config_construction.py [--sections 2000] [--rounds 5]
+"""
+
+import argparse
+import statistics
+import time
+from typing import Any, Callable, Dict
+
+from dotcfg import collections
+from dotcfg.collections import Config
+
+
+def build_tree(sections: int) -> Dict[str, Any]:
+    return {
+        f"service_{i}": {
+            "host": f"service-{i}-internal",
+            "port": 8000 + i,
+            "tags": ["internal", f"team-{i % 10}"],
+            "pool": {"size": 10, "timeout": 5.0, "retry": {"attempts": 3}},
+        }
+        for i in range(sections)
+    }
+
+
+def per_key_copy(config: Config) -> Config:
+    """`Config.copy` before it used `build_config`"""
+    new_config = Config()
+    for key, value in config.items():
+        if isinstance(value, Config):
+            value = per_key_copy(value)
+        new_config[key] = value
+    return new_config
+
+
+def per_key_flatdict(flat: dict) -> Config:
+    """`flatdict_to_dict(flat, dct_class=Config)` before it used `build_config`"""
+    result = Config()
+    for key, value in flat.items():
+        current = result
+        for part in key[:-1]:
+            if part not in current:
+                current[part] = Config()
+            current = current[part]
+        current[key[-1]] = value
+    return result
+
+
+def median_time(function: Callable[[], Any], rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    tree = build_tree(args.sections)
+    config = Config(tree)
+    flat = collections.dict_to_flatdict(tree)
+
+    cases = {
+        "nested": (lambda: Config(tree), lambda: collections.build_config(tree)),
+        "copy": (lambda: per_key_copy(config), config.copy),
+        "flat": (
+            lambda: per_key_flatdict(flat),
+            lambda: collections.flatdict_to_dict(flat, dct_class=Config),
+        ),
+        "merge": (
+            lambda: Config(collections.merge_dicts(tree, tree)),
+            lambda: collections.merge_dicts(config, tree),
+        ),
+    }
+    for name, (per_key, bulk) in cases.items():
+        per_key_time = median_time(per_key, args.rounds)
+        bulk_time = median_time(bulk, args.rounds)
+        print(
+            f"  {name:>6}: per key {per_key_time * 1000:8.1f} ms, "
+            f"bulk {bulk_time * 1000:8.1f} ms ({per_key_time / bulk_time:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Measures the per-child unique memory (USS) of forked processes sharing a
+large configuration loaded by the parent, with and without
+`dotcfg.utils.freeze_for_fork`.
+
+Linux only (reads `/proc/<pid>/smaps_rollup`).
+
+Usage:
+    python benchmarks/fork_memory.py [--sections 2000] [--children 4]
+"""
+
+import argparse
+import gc
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+from typing import Any, List
+
+import toml
+
+from dotcfg import load_configuration
+from dotcfg.collections import Config
+from dotcfg.utils import freeze_for_fork
+
+
+def unique_set_size(pid: int) -> int:
+    """Returns the private (unshared) memory of a process in kB"""
+    total = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+def touch(value: Any) -> None:
+    """Reads every value, like a worker serving requests would"""
+    if isinstance(value, Config):
+        for item in value.values():
+            touch(item)
+
+
+def write_config(location: pathlib.Path, sections: int) -> None:
+    contents = {
+        f"service_{i}": {
+            "host": f"service-{i}-internal",
+            "port": 8000 + i,
+            "timeout": 2.5,
+            "enabled": True,
+            "tags": ["blue", "green", f"shard-{i % 16}"],
+        }
+        for i in range(sections)
+    }
+    with open(location, "w") as f:
+        toml.dump(contents, f)
+
+
+def measure(config: Config, children: int) -> List[int]:
+    readers = []
+    for _ in range(children):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            touch(config)
+            gc.collect()
+            os.write(write_fd, str(unique_set_size(os.getpid())).encode())
+            os._exit(0)
+        os.close(write_fd)
+        readers.append((pid, read_fd))
+
+    sizes = []
+    for pid, read_fd in readers:
+        with os.fdopen(read_fd) as f:
+            sizes.append(int(f.read()))
+        os.waitpid(pid, 0)
+    return sizes
+
+
+def run(sections: int, children: int, freeze: bool) -> None:
+    with tempfile.TemporaryDirectory() as td:
+        location = pathlib.Path(td) / "config.toml"
+        write_config(location, sections)
+        config = load_configuration(location)
+
+    if freeze:
+        freeze_for_fork(config)
+    else:
+        gc.collect()
+
+    sizes = measure(config, children)
+    label = "freeze_for_fork" if freeze else "baseline"
+    average = sum(sizes) / len(sizes)
+    print(f"{label:>16}: {average:10.0f} kB USS per child  {sizes}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sections", type=int, default=2000)
+    parser.add_argument("--children", type=int, default=4)
+    parser.add_argument(
+        "--mode", choices=["both", "baseline", "frozen"], default="both"
+    )
+    args = parser.parse_args()
+
+    if args.mode != "both":
+        run(args.sections, args.children, freeze=args.mode == "frozen")
+        return
+
+    # Each mode runs in a fresh parent process, since frozen objects
+    # would otherwise leak into the baseline measurement.
+    for mode in ("baseline", "frozen"):
+        cmd = [sys.executable, __file__, "--mode", mode]
+        cmd += ["--sections", str(args.sections), "--children", str(args.children)]
+        subprocess.run(cmd, check=True)
+
+
+if __name__ == "__main__":
+    main()
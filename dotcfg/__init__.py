@@ -1,8 +1,49 @@
+"""
+Submodules (and the names re-exported from them) are imported the first
+time they're used, so `import dotcfg` doesn't pay for importing Box or
+the parsers until they're needed.
+"""
+from __future__ import annotations
+
+import importlib
+
+# Not imported from `typing`, which is slower to import than all of this
+# module. Type checkers treat any `TYPE_CHECKING` constant the same way.
+TYPE_CHECKING = False
+
 __version__ = "0.1.4"
-import dotcfg.collections
-import dotcfg.engine
-import dotcfg.errors
-import dotcfg.types
-from dotcfg.collections import Config
-from dotcfg.configuration import load_configuration
-from dotcfg.utils import set_temporary_config
+
+_SUBMODULES = {"collections", "configuration", "engine", "errors", "types", "utils"}
+
+# Name re-exported by the package, along with the submodule defining it
+_EXPORTS = {
+    "Config": "collections",
+    "load_configuration": "configuration",
+    "load_variants": "configuration",
+    "set_temporary_config": "utils",
+}
+
+__all__ = sorted(_SUBMODULES | set(_EXPORTS))
+
+if TYPE_CHECKING:
+    from typing import Any, List
+
+    from dotcfg import collections, configuration, engine, errors, types, utils
+    from dotcfg.collections import Config
+    from dotcfg.configuration import load_configuration, load_variants
+    from dotcfg.utils import set_temporary_config
+
+
+def __getattr__(name: str) -> Any:
+    if name in _SUBMODULES:
+        return importlib.import_module(f"dotcfg.{name}")
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f"dotcfg.{_EXPORTS[name]}"), name)
+        # Cached, so later lookups don't go through `__getattr__`
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
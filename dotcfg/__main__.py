@@ -0,0 +1,5 @@
+import sys
+
+from dotcfg.cli import main
+
+sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+A random access binary configuration format.
+
+Every value of the configuration is stored individually, behind a sorted
+index of the `CompoundKey` paths leading to them. Files are memory mapped
+when read, so looking up a handful of keys (or a single section) only
+decodes those keys, no matter how large the file is.
+
+Layout (all integers are little endian):
+
+    header:   magic (4 bytes) | format version (u8) | padding (3 bytes) | count (u64)
+    offsets:  `count` entries of
+              key offset (u64) | key length (u32) | value offset (u64) | value length (u32)
+    keys:     UTF-8 encoded paths, with parts separated by `\\x1f`, sorted bytewise
+    values:   type tag (1 byte) followed by the encoded value
+"""
+import datetime
+import json
+import mmap
+import pathlib
+import struct
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+from dotcfg import collections, errors
+
+MAGIC = b"DCFG"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sB3xQ")
+_ENTRY = struct.Struct("<QIQI")
+
+# Separates the parts of a path in the index. Since it sorts before any
+# printable character, all keys in a section are stored next to each other.
+_SEPARATOR = "\x1f"
+_SECTION_END = b"\x20"
+
+# Type tags for the encoded values
+_JSON = b"j"
+_DATETIME = b"d"
+_DATE = b"D"
+_TIME = b"t"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, collections.CompactArray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_JSON_ENCODER = json.JSONEncoder(separators=(",", ":"), default=_json_default)
+
+PathLike = Union[str, collections.CompoundKey, Tuple[str, ...]]
+
+
+def _encode_key(key: Tuple) -> bytes:
+    for part in key:
+        if not isinstance(part, str) or _SEPARATOR in part:
+            raise errors.UnsupportedConfiguration(
+                f"Can't store key {key!r}; keys must be strings without {_SEPARATOR!r}."
+            )
+    return _SEPARATOR.join(key).encode()
+
+
+def _encode_value(value: Any) -> bytes:
+    # Checked before `date`, since datetimes are also dates
+    if isinstance(value, datetime.datetime):
+        return _DATETIME + value.isoformat().encode()
+    if isinstance(value, datetime.date):
+        return _DATE + value.isoformat().encode()
+    if isinstance(value, datetime.time):
+        return _TIME + value.isoformat().encode()
+    try:
+        return _JSON + _JSON_ENCODER.encode(value).encode()
+    except TypeError as exc:
+        raise errors.UnsupportedConfiguration(
+            f"Can't store value {value!r} of type {type(value).__name__}."
+        ) from exc
+
+
+_DECODERS: Dict[bytes, Callable[[str], Any]] = {
+    _JSON: json.loads,
+    _DATETIME: datetime.datetime.fromisoformat,
+    _DATE: datetime.date.fromisoformat,
+    _TIME: datetime.time.fromisoformat,
+}
+
+
+def _decode_value(data: bytes) -> Any:
+    return _DECODERS[data[:1]](data[1:].decode())
+
+
+def dump(data: dict, location: pathlib.Path) -> None:
+    """
+    Writes a (nested) configuration to `location` in the binary format.
+
+    Args:
+        - data (dict): Configuration to write
+        - location (pathlib.Path): Location of the file to write
+
+    Raises:
+        - UnsupportedConfiguration: If a key isn't a string, or a value
+            can't be represented in JSON (or as a date / time)
+    """
+    entries = sorted(
+        (_encode_key(key), _encode_value(value))
+        for key, value in collections._leaves(data)
+    )
+
+    keys_start = _HEADER.size + _ENTRY.size * len(entries)
+    values_start = keys_start + sum(len(key) for key, _ in entries)
+
+    offsets = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, len(entries)))
+    key_offset, value_offset = keys_start, values_start
+    for key, value in entries:
+        offsets += _ENTRY.pack(key_offset, len(key), value_offset, len(value))
+        key_offset += len(key)
+        value_offset += len(value)
+
+    with open(location, "wb") as f:
+        f.write(offsets)
+        f.write(b"".join(key for key, _ in entries))
+        f.write(b"".join(value for _, value in entries))
+
+
+class BinaryConfig:
+    """
+    Read only, memory mapped access to a configuration stored in the
+    binary format. Keys and sections are decoded on demand.
+
+    Example:
+
+        ```python
+        with BinaryConfig("flags.dcfg") as flags:
+            flags.get("feature_flags.beta")
+            flags.section("services.database")
+        ```
+    """
+
+    def __init__(self, location: Union[str, pathlib.Path]) -> None:
+        self.location = pathlib.Path(location)
+        with open(self.location, "rb") as f:
+            if self.location.stat().st_size == 0:
+                raise errors.UnsupportedConfiguration(f"{location} is empty.")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, self._count = _HEADER.unpack_from(self._mmap, 0)
+        except struct.error as exc:
+            self.close()
+            raise errors.UnsupportedConfiguration(
+                f"{location} is not a dotcfg binary configuration."
+            ) from exc
+
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise errors.UnsupportedConfiguration(
+                f"{location} is not a dotcfg binary configuration "
+                f"(version {FORMAT_VERSION})."
+            )
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self) -> "BinaryConfig":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._mmap, _HEADER.size + _ENTRY.size * index)
+
+    def _key(self, index: int) -> bytes:
+        offset, length, _, _ = self._entry(index)
+        return self._mmap[offset : offset + length]
+
+    def _value(self, index: int) -> Any:
+        _, _, offset, length = self._entry(index)
+        return _decode_value(self._mmap[offset : offset + length])
+
+    def _bisect(self, target: bytes) -> int:
+        # Index of the first key that is >= `target`
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def _parts(path: PathLike) -> Tuple[str, ...]:
+        if isinstance(path, str):
+            return tuple(path.split(".")) if path else ()
+        return tuple(path)
+
+    def _section_range(self, parts: Tuple[str, ...]) -> Tuple[int, int]:
+        if not parts:
+            return 0, self._count
+        prefix = _encode_key(parts)
+        return (
+            self._bisect(prefix + _SEPARATOR.encode()),
+            self._bisect(prefix + _SECTION_END),
+        )
+
+    def keys(self) -> Iterator[collections.CompoundKey]:
+        """Yields the path of every value, in sorted order"""
+        for index in range(self._count):
+            key = self._key(index).decode()
+            yield collections.CompoundKey(key.split(_SEPARATOR))
+
+    def get(self, path: PathLike, default: Any = None) -> Any:
+        """
+        Looks up a single value, or an entire section.
+
+        Args:
+            - path (PathLike): `.` delimited path, or a tuple of keys
+            - default (Any): Returned if nothing exists at `path`
+
+        Returns:
+            - Any: The value (or nested section) found at `path`
+        """
+        parts = self._parts(path)
+        if parts:
+            key = _encode_key(parts)
+            index = self._bisect(key)
+            if index < self._count and self._key(index) == key:
+                return self._value(index)
+
+        start, end = self._section_range(parts)
+        if start == end:
+            return default
+        return self._build(start, end, len(parts))
+
+    def section(self, path: PathLike) -> dict:
+        """
+        Decodes every value nested under `path`.
+
+        Raises:
+            - KeyError: If `path` isn't a section
+        """
+        parts = self._parts(path)
+        start, end = self._section_range(parts)
+        if start == end:
+            raise KeyError(path)
+        return self._build(start, end, len(parts))
+
+    def _build(self, start: int, end: int, depth: int) -> dict:
+        flat = {}
+        for index in range(start, end):
+            key = self._key(index).decode().split(_SEPARATOR)[depth:]
+            flat[collections.CompoundKey(key)] = self._value(index)
+        return dict(collections.flatdict_to_dict(flat))
+
+    def to_dict(self) -> dict:
+        """Decodes the entire configuration"""
+        return self._build(0, self._count, 0)
+
+
+def load(location: pathlib.Path) -> dict:
+    """
+    Reads an entire binary configuration file.
+
+    Args:
+        - location (pathlib.Path): Location of the file
+
+    Returns:
+        - dict: Contents of the configuration file
+    """
+    with BinaryConfig(location) as config:
+        return config.to_dict()
@@ -0,0 +1,251 @@
+"""
+Command line interface, available as `python -m dotcfg`.
+
+    python -m dotcfg compile base.toml prod.toml -o config.dcfg
+    python -m dotcfg show base.toml prod.toml --path database.host
+    python -m dotcfg diff base.toml dev.toml --against base.toml prod.toml
+    python -m dotcfg bench base.toml prod.toml --repeat 20 --max-ms 50
+"""
+import argparse
+import compileall
+import json
+import pathlib
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, TextIO
+
+from dotcfg import binary, collections, configuration, engine, errors, serializers
+
+_FORMATS: Dict[str, Callable[..., None]] = {
+    "json": serializers.dump_json,
+    "toml": serializers.dump_toml,
+    "env": serializers.dump_env,
+}
+
+
+def _load(args: argparse.Namespace, paths: Sequence[str]) -> collections.Config:
+    return configuration.load_configuration(
+        *paths,
+        env_var_prefix=args.env_prefix,
+        replace_references=not args.no_references,
+        file_type=engine.SupportedFileTypes[args.file_type.upper()],
+    )
+
+
+def _compile(args: argparse.Namespace, out: TextIO) -> int:
+    config = _load(args, args.paths)
+    binary.dump(config.to_dict(), pathlib.Path(args.output))
+    out.write(f"Wrote {len(config.flat_view())} values to {args.output}\n")
+
+    if args.bytecode:
+        # Saves compiling dotcfg itself at startup, for read only images
+        package = pathlib.Path(__file__).parent
+        compileall.compile_dir(str(package), quiet=1)
+    return 0
+
+
+_NOT_FOUND = object()
+
+
+def _show(args: argparse.Namespace, out: TextIO) -> int:
+    config = _load(args, args.paths)
+    value: Any = config
+    if args.path:
+        value = config.get_path(args.path, default=_NOT_FOUND)
+        if value is _NOT_FOUND:
+            raise KeyError(f"{args.path} isn't in the configuration")
+
+    if not isinstance(value, dict):
+        # A single value, printed as is (or as JSON, if it isn't a string)
+        text = value if isinstance(value, str) else json.dumps(value, default=str)
+        out.write(f"{text}\n")
+        return 0
+
+    kwargs: Dict[str, Any] = {"redact": args.redact}
+    if args.format == "env":
+        kwargs["prefix"] = args.env_prefix
+    _FORMATS[args.format](value, out, **kwargs)
+    if args.format == "json":
+        out.write("\n")
+    return 0
+
+
+def _diff(args: argparse.Namespace, out: TextIO) -> int:
+    left = _load(args, args.paths).flat_view()
+    right = _load(args, args.against).flat_view()
+
+    def dotted(key: collections.CompoundKey) -> str:
+        return ".".join(str(part) for part in key)
+
+    changes = 0
+    for key in sorted(set(left) | set(right), key=dotted):
+        if key not in right:
+            out.write(f"- {dotted(key)} = {left[key]!r}\n")
+        elif key not in left:
+            out.write(f"+ {dotted(key)} = {right[key]!r}\n")
+        elif left[key] != right[key]:
+            out.write(f"~ {dotted(key)}: {left[key]!r} -> {right[key]!r}\n")
+        else:
+            continue
+        changes += 1
+
+    # Like `diff`, exits with 1 if there are any differences
+    return 1 if changes else 0
+
+
+def _time(function: Callable[[], Any], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _bench(args: argparse.Namespace, out: TextIO) -> int:
+    file_type = engine.SupportedFileTypes[args.file_type.upper()]
+    replace_references = not args.no_references
+
+    def read_cold() -> List[dict]:
+        engine.clear_parse_cache()
+        return configuration._read_layers(args.paths, file_type)
+
+    def read_warm() -> List[dict]:
+        return configuration._read_layers(args.paths, file_type)
+
+    layers = read_warm()
+    merged = configuration._merge_layers(layers)
+    interpolated = configuration.interpolate_config(
+        merged, replace_references, args.env_prefix
+    )
+
+    stages = {
+        "read (cold)": read_cold,
+        "read (cached)": read_warm,
+        "merge": lambda: configuration._merge_layers(layers),
+        "interpolate": lambda: configuration.interpolate_config(
+            merged, replace_references, args.env_prefix
+        ),
+        "validate": lambda: configuration.validate_config(interpolated),
+        "load_configuration": lambda: _load(args, args.paths),
+    }
+    results = {name: _time(stage, args.repeat) for name, stage in stages.items()}
+
+    if args.json:
+        summary = {
+            name: {"min": min(t), "median": statistics.median(t), "max": max(t)}
+            for name, t in results.items()
+        }
+        out.write(json.dumps(summary, indent=2) + "\n")
+    else:
+        out.write(f"{'stage':<20}{'min':>10}{'median':>10}{'max':>10}  (ms)\n")
+        for name, t in results.items():
+            out.write(
+                f"{name:<20}{min(t):>10.2f}{statistics.median(t):>10.2f}"
+                f"{max(t):>10.2f}\n"
+            )
+
+    total = statistics.median(results["load_configuration"])
+    if args.max_ms is not None and total > args.max_ms:
+        out.write(
+            f"load_configuration took {total:.2f} ms (median), "
+            f"over the limit of {args.max_ms} ms\n"
+        )
+        return 1
+    return 0
+
+
+def _parser() -> argparse.ArgumentParser:
+    # Options shared by every command, for loading configurations
+    loading = argparse.ArgumentParser(add_help=False)
+    loading.add_argument(
+        "paths", nargs="+", help="Configuration files, in priority order"
+    )
+    loading.add_argument("--env-prefix", help="Prefix of environment variables to load")
+    loading.add_argument(
+        "--no-references", action="store_true", help="Don't resolve ${} references"
+    )
+    loading.add_argument(
+        "--file-type",
+        default="auto",
+        choices=[file_type.value.lower() for file_type in engine.SupportedFileTypes],
+    )
+
+    parser = argparse.ArgumentParser(prog="python -m dotcfg", description=__doc__)
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    compile_ = commands.add_parser(
+        "compile",
+        parents=[loading],
+        help="Resolve a configuration into a binary (.dcfg) snapshot",
+    )
+    compile_.add_argument("-o", "--output", required=True, help="File to write")
+    compile_.add_argument(
+        "--bytecode",
+        action="store_true",
+        help="Also compile dotcfg's modules to bytecode",
+    )
+    compile_.set_defaults(run=_compile)
+
+    show = commands.add_parser(
+        "show", parents=[loading], help="Print a resolved configuration"
+    )
+    show.add_argument("--path", help="`.` delimited path of a single value to print")
+    show.add_argument("--format", default="json", choices=sorted(_FORMATS))
+    show.add_argument(
+        "--redact",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="Hide values whose path matches a pattern, such as '*.password'",
+    )
+    show.set_defaults(run=_show)
+
+    diff = commands.add_parser(
+        "diff", parents=[loading], help="Compare two sets of configuration files"
+    )
+    diff.add_argument(
+        "--against",
+        nargs="+",
+        required=True,
+        metavar="PATH",
+        help="Configuration files to compare against",
+    )
+    diff.set_defaults(run=_diff)
+
+    bench = commands.add_parser(
+        "bench", parents=[loading], help="Time each stage of loading a configuration"
+    )
+    bench.add_argument("--repeat", type=int, default=10)
+    bench.add_argument("--json", action="store_true", help="Print results as JSON")
+    bench.add_argument(
+        "--max-ms",
+        type=float,
+        help="Exit with 1 if load_configuration's median time exceeds this",
+    )
+    bench.set_defaults(run=_bench)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None, out: Optional[TextIO] = None) -> int:
+    """
+    Runs the command line interface.
+
+    Args:
+        - argv (Optional[Sequence[str]]): Arguments, defaulting to `sys.argv`
+        - out (Optional[TextIO]): Where to write output, defaulting to `sys.stdout`
+
+    Returns:
+        - int: Exit code
+    """
+    parser = _parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.run(args, out or sys.stdout)
+    except (errors.ConfigurationError, FileNotFoundError, KeyError, ValueError) as exc:
+        message = exc.args[0] if isinstance(exc, KeyError) and exc.args else exc
+        sys.stderr.write(f"{parser.prog}: error: {message}\n")
+        return 2
@@ -2,19 +2,776 @@
 Custom data types and functions for manipulating data types
 """
 
+import array
+import functools
+import pickle
+import re
+import threading
+import weakref
+from collections import OrderedDict
 from collections.abc import MutableMapping
-from typing import Any, List, Optional, Tuple, Union
+from collections.abc import Sequence as SequenceABC
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
-from box import Box
+from box import Box, BoxList
+
+from dotcfg import errors
+
+T = TypeVar("T")
 
 DictLike = Union[dict, Box]
 
+_MISSING = object()
+
 
 class CompoundKey(tuple):
     ...
 
 
+# Parts of a path that can be used as list indices. Stricter than `isdigit`,
+# which accepts characters `int` doesn't (such as "²").
+_INDEX_REGEX = re.compile(r"-?[0-9]+")
+
+# Each step of a compiled path is the key to look up in a mapping, along with
+# the list index it represents (if the key could be used as one)
+PathAccessor = Tuple[Tuple[str, Optional[int]], ...]
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_path(path: str) -> PathAccessor:
+    """
+    Compiles a `.` delimited path (such as `"services.database.host"`) into
+    the sequence of lookups required to retrieve its value. Compiled paths
+    are cached, so repeatedly looking up the same path only pays for
+    splitting the string once.
+
+    Args:
+        - path (str): `.` delimited path to a (possibly nested) key. Numeric
+            parts of the path can be used to index into lists.
+
+    Returns:
+        - PathAccessor: The compiled path
+    """
+    return tuple(
+        (part, int(part) if _INDEX_REGEX.fullmatch(part) else None)
+        for part in path.split(".")
+    )
+
+
+def _lookup(root: dict, accessor: PathAccessor) -> Any:
+    # Deliberately uses the underlying `dict` / `list` lookups to skip
+    # Box's attribute and default handling on every level.
+    current: Any = root
+    for key, index in accessor:
+        if isinstance(current, dict):
+            current = dict.__getitem__(current, key)
+        elif index is not None and isinstance(current, list):
+            current = list.__getitem__(current, index)
+        elif (
+            index is not None
+            and isinstance(current, SequenceABC)
+            and not isinstance(current, (str, bytes, bytearray))
+        ):
+            # Such as `CompactArray`s
+            current = current[index]
+        else:
+            raise KeyError(key)
+    return current
+
+
+class _TrieNode:
+
+    __slots__ = ("children", "terminal")
+
+    def __init__(self) -> None:
+        self.children: Dict[Any, "_TrieNode"] = {}
+        # Whether the path ending at this node is a key itself
+        self.terminal = False
+
+
+class PathTrie:
+    """
+    Prefix tree of `CompoundKey` paths. Looking up all of the keys under a
+    prefix, or all of the keys matching a wildcard pattern, only visits the
+    parts of the tree that could possibly match.
+    """
+
+    WILDCARD = "*"
+
+    def __init__(self, keys: Iterable[CompoundKey] = ()) -> None:
+        self._root = _TrieNode()
+        for key in keys:
+            self.insert(key)
+
+    def insert(self, key: CompoundKey) -> None:
+        node = self._root
+        for part in key:
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = _TrieNode()
+            node = child
+        node.terminal = True
+
+    @staticmethod
+    def _walk(node: _TrieNode, prefix: Tuple) -> Iterator[CompoundKey]:
+        stack = [(prefix, node)]
+        while stack:
+            path, current = stack.pop()
+            if current.terminal:
+                yield CompoundKey(path)
+            # Reversed so keys are produced in insertion order
+            for part, child in reversed(list(current.children.items())):
+                stack.append(((*path, part), child))
+
+    def remove(self, prefix: Sequence) -> List[CompoundKey]:
+        """
+        Removes `prefix` and every key under it.
+
+        Returns:
+            - List[CompoundKey]: The keys that were removed
+        """
+        if not prefix:
+            removed = list(self._walk(self._root, ()))
+            self._root = _TrieNode()
+            return removed
+
+        # Tracks the path to the removed node, so branches left empty
+        # afterwards can be pruned.
+        parents = []
+        node = self._root
+        for part in prefix:
+            child = node.children.get(part)
+            if child is None:
+                return []
+            parents.append((node, part))
+            node = child
+
+        removed = list(self._walk(node, tuple(prefix)))
+        for parent, part in reversed(parents):
+            del parent.children[part]
+            if parent.children or parent.terminal:
+                break
+        return removed
+
+    def iter_prefix(self, prefix: Sequence) -> Iterator[CompoundKey]:
+        """Yields every key that starts with `prefix`"""
+        node = self._root
+        for part in prefix:
+            child = node.children.get(part)
+            if child is None:
+                return
+            node = child
+        yield from self._walk(node, tuple(prefix))
+
+    def match(self, pattern: Sequence) -> Iterator[CompoundKey]:
+        """
+        Yields every key matching `pattern`, where a `PathTrie.WILDCARD` part
+        matches any single part of a key.
+        """
+        stack: List[Tuple[Tuple, _TrieNode, int]] = [((), self._root, 0)]
+        while stack:
+            path, node, depth = stack.pop()
+            if depth == len(pattern):
+                if node.terminal:
+                    yield CompoundKey(path)
+                continue
+
+            part = pattern[depth]
+            if part == self.WILDCARD:
+                candidates = list(node.children.items())
+            else:
+                child = node.children.get(part)
+                candidates = [(part, child)] if child is not None else []
+
+            for key, child in reversed(candidates):
+                stack.append(((*path, key), child, depth + 1))
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy() -> Any:
+    # Imported on first use, since importing NumPy is slow
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+_INT64_MIN, _INT64_MAX = -(2**63), 2**63 - 1
+
+
+def _array_typecode(values: Sequence) -> Optional[str]:
+    # `array` typecode that stores every value losslessly, if there is one.
+    # Exact type checks skip bools, which would be read back as ints.
+    if not values:
+        return None
+    kind = type(values[0])
+    if kind is float and all(type(v) is float for v in values):
+        return "d"
+    if (
+        kind is int
+        and all(type(v) is int for v in values)
+        and _INT64_MIN <= min(values)
+        and max(values) <= _INT64_MAX
+    ):
+        return "q"
+    return None
+
+
+class CompactArray(SequenceABC):
+    """
+    Read only sequence of ints or floats, stored in a NumPy array (if NumPy
+    is installed) or an `array.array` rather than as a list of Python objects.
+    Values are read back as Python ints and floats, and `numpy.asarray` uses
+    the stored array without copying it.
+
+    Membership tests are answered by a `frozenset` of the values, which is
+    only built the first time one is made.
+
+    Args:
+        - values (Sequence): Values to store, which must either all be ints
+            (that fit in 64 bits) or all be floats
+
+    Raises:
+        - ValueError: If the values can't be stored compactly
+    """
+
+    __slots__ = ("_data", "_members")
+
+    def __init__(self, values: Sequence) -> None:
+        typecode = _array_typecode(values)
+        if typecode is None:
+            raise ValueError(
+                "Only lists of ints (that fit in 64 bits) or floats can be compacted."
+            )
+        numpy = _numpy()
+        if numpy is None:
+            data: Any = array.array(typecode, values)
+        else:
+            data = numpy.array(values, dtype="int64" if typecode == "q" else "float64")
+            data.flags.writeable = False
+        self._data = data
+        self._members: Optional[frozenset] = None
+
+    @classmethod
+    def _wrap(cls, data: Any) -> "CompactArray":
+        instance = cls.__new__(cls)
+        instance._data = data
+        instance._members = None
+        return instance
+
+    def __reduce__(self) -> Tuple[Any, Tuple[Any]]:
+        # Leaves out the membership index, which can be rebuilt
+        return CompactArray._wrap, (self._data,)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return CompactArray._wrap(self._data[index])
+        if isinstance(self._data, array.array):
+            return self._data[index]
+        # Converts NumPy scalars to Python ints and floats
+        return self._data.item(index)
+
+    def __iter__(self) -> Iterator:
+        if isinstance(self._data, array.array):
+            return iter(self._data)
+        return map(self._data.item, range(len(self._data)))
+
+    def __contains__(self, value: Any) -> bool:
+        if self._members is None:
+            self._members = frozenset(self._data.tolist())
+        return value in self._members
+
+    def __eq__(self, other: Any) -> bool:
+        # Equal to the list it was created from
+        if isinstance(other, CompactArray):
+            other = other.tolist()
+        return isinstance(other, list) and self.tolist() == other
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.tolist()!r})"
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> Any:
+        numpy = _numpy()
+        result = numpy.asarray(self._data, dtype=dtype)
+        if numpy.may_share_memory(result, self._data):
+            # Views of the stored array stay read only
+            result.flags.writeable = False
+        return result
+
+    def tolist(self) -> list:
+        """Converts the array to a list of Python ints or floats"""
+        return self._data.tolist()
+
+
+def compact_lists(dct: dict, min_length: int) -> None:
+    """
+    Replaces every list of at least `min_length` ints or floats in a (nested)
+    dictionary with a `CompactArray`. Lists in lists of sections are
+    replaced as well. Any other list is left as is.
+
+    Args:
+        - dct (dict): The dictionary to update in place
+        - min_length (int): Length of the shortest list to replace
+    """
+    stack: List[Any] = [dct]
+    while stack:
+        container = stack.pop()
+        if isinstance(container, dict):
+            items: Iterable[Tuple[Any, Any]] = list(dict.items(container))
+        else:
+            items = enumerate(container)
+
+        for key, value in items:
+            if isinstance(value, dict):
+                stack.append(value)
+            elif isinstance(value, list):
+                if len(value) >= min_length and _array_typecode(value) is not None:
+                    container[key] = CompactArray(value)
+                else:
+                    stack.append(value)
+
+
+class _ConfigState:
+    """
+    Bookkeeping attached to every `Config` instance. It lives outside of
+    the mapping itself (and outside of Box's attribute handling), so it
+    never shows up as a configuration key.
+    """
+
+    __slots__ = (
+        "parent",
+        "key",
+        "version",
+        "flat",
+        "trie",
+        "environ",
+        "trace",
+        "derived",
+        "provenance",
+    )
+
+    def __init__(self) -> None:
+        # The `Config` containing this one, and the key it's stored under
+        self.parent: Optional["Config"] = None
+        self.key: Any = None
+        # Incremented every time this config (or a nested config) changes
+        self.version = 0
+        # Cached result of `Config.flat_view`
+        self.flat: Optional[Dict[CompoundKey, Any]] = None
+        # Index of the keys in `flat`, only built once it's queried
+        self.trie: Optional[PathTrie] = None
+        # Cached results of `Config.to_environ` (by prefix), each along with
+        # the name and value of every list in it, and the version they were
+        # encoded from
+        self.environ: Optional[
+            Tuple[int, Dict[str, Tuple[Dict[str, str], List[Tuple[str, list]]]]]
+        ] = None
+        # Set by `dotcfg.tracing` while reads of this config are being traced
+        self.trace: Optional[list] = None
+        # Values derived from this config with `Config.derived`
+        self.derived: Optional[weakref.WeakSet] = None
+        # Where each value came from, if the config was loaded with
+        # `track_provenance=True` (only set on the root config)
+        self.provenance: Optional[_ProvenanceTable] = None
+
+
 class Config(Box):
+    def _state(self) -> _ConfigState:
+        try:
+            return self.__dict__["_dotcfg_state"]
+        except KeyError:
+            state = _ConfigState()
+            # Box intercepts `setattr`, so the state is stored directly
+            self.__dict__["_dotcfg_state"] = state
+            return state
+
+    def _adopt(self, key: Any, previous: Any) -> None:
+        # Nested configs keep a reference to their parent, so that
+        # changes deep in the tree can be reported to every level above.
+        value = dict.get(self, key)
+        if isinstance(previous, Config) and previous is not value:
+            previous._state().parent = None
+        if isinstance(value, Config):
+            state = value._state()
+            state.parent = self
+            state.key = key
+
+    def _changed(self, path: CompoundKey) -> None:
+        # Changes made while Box is still populating a new instance aren't
+        # reported, since nothing could have observed the previous state.
+        if not self._box_config["__created"]:
+            return
+
+        node: Optional[Config] = self
+        while node is not None:
+            state = node._state()
+            state.version += 1
+            if state.flat is not None:
+                node._update_flat_view(state.flat, path)
+            if state.derived is not None:
+                for derived in list(state.derived):
+                    derived._changed(path)
+            if state.provenance is not None:
+                state.provenance.changed(path)
+            if state.parent is not None:
+                path = CompoundKey((state.key, *path))
+            node = state.parent
+
+    def _update_flat_view(
+        self, flat: Dict[CompoundKey, Any], path: CompoundKey
+    ) -> None:
+        state = self._state()
+        if not path:
+            state.flat = None
+            state.trie = None
+            return
+
+        # Remove everything previously stored at or below `path`
+        if state.trie is not None:
+            for key in state.trie.remove(path):
+                del flat[key]
+        elif flat.pop(path, _MISSING) is _MISSING:
+            depth = len(path)
+            for key in [key for key in flat if key[:depth] == path]:
+                del flat[key]
+
+        try:
+            value = _lookup(self, tuple((key, None) for key in path))
+        except KeyError:
+            # The key was deleted
+            return
+
+        if isinstance(value, dict):
+            added = dict_to_flatdict(value, parent=path)
+        else:
+            added = {path: value}
+
+        flat.update(added)
+        if state.trie is not None:
+            for key in added:
+                state.trie.insert(key)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        previous = dict.get(self, key)
+        super().__setitem__(key, value)
+        self._adopt(key, previous)
+        self._changed(CompoundKey((key,)))
+
+    def __delitem__(self, key: Any) -> None:
+        previous = dict.get(self, key)
+        super().__delitem__(key)
+        self._adopt(key, previous)
+        self._changed(CompoundKey((key,)))
+
+    def clear(self) -> None:
+        for value in self.values():
+            if isinstance(value, Config):
+                value._state().parent = None
+        super().clear()
+        self._changed(CompoundKey())
+
+    def update(self, __m: Any = None, **kwargs: Any) -> None:
+        # Box stores updated values without going through `__setitem__`,
+        # which would skip tracking the changes.
+        if __m:
+            items = __m.items() if hasattr(__m, "keys") else __m
+            for key, value in items:
+                self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def _pickled(self) -> list:
+        # The configuration as a flat table of `(path, value)` pairs. Built
+        # every time, since changes made to lists in place aren't tracked.
+        return [(tuple(key), _plain(value)) for key, value in _leaves(self)]
+
+    def _digest(self) -> str:
+        # Identifies the current contents of the configuration.
+        # Imported here, since only `ConfigRef`s need it.
+        import hashlib
+
+        data = pickle.dumps(self._pickled(), protocol=pickle.HIGHEST_PROTOCOL)
+        return hashlib.sha256(data).hexdigest()
+
+    def _reduce(self, config_class: Type["Config"]) -> Tuple[Any, tuple]:
+        # Pickles the configuration as an instance of `config_class`. The
+        # class and Box options are only sent if they aren't the defaults.
+        options = _custom_options(self, config_class)
+        if config_class is Config and not options:
+            return _unpickle_config, (self._pickled(),)
+        return _unpickle_config, (self._pickled(), config_class, options)
+
+    def __reduce__(self) -> Tuple[Any, tuple]:
+        # Box would pickle its settings (and Python would pickle the class)
+        # along with every nested config, and rebuild them one at a time.
+        return self._reduce(type(self))
+
+    def flat_view(self) -> Mapping[CompoundKey, Any]:
+        """
+        Returns a read only, flattened view of the configuration, equivalent
+        to `dict_to_flatdict(config)`.
+
+        The view is built on first access and cached. Any later changes
+        to the configuration (including to nested configs) update the cached
+        view in place, only re-flattening the keys that changed.
+
+        Returns:
+            - Mapping[CompoundKey, Any]: Mapping of each `CompoundKey` in the
+                configuration to its value
+        """
+        state = self._state()
+        if state.flat is None:
+            state.flat = dict_to_flatdict(self)
+        return MappingProxyType(state.flat)
+
+    def to_environ(self, prefix: str) -> Mapping[str, str]:
+        """
+        Encodes the configuration as environment variables, which
+        `load_environment_variables(prefix)` (and so
+        `load_configuration(..., env_var_prefix=prefix)`) reads back
+        losslessly. Useful
+        for passing the configuration on to subprocesses:
+
+            ```python
+            subprocess.run(cmd, env={**os.environ, **config.to_environ("MYAPP")})
+            ```
+
+        The result is cached until the configuration (or a nested config)
+        changes, so it's only encoded once no matter how many subprocesses
+        are started. Lists can be changed in place (such as with
+        `config.hosts.append(...)`) without the configuration noticing, so
+        they're encoded again every time to check the cached result.
+
+        Args:
+            - prefix (str): Prefix of the environment variables
+
+        Returns:
+            - Mapping[str, str]: Read only mapping of `PREFIX__SECTION__KEY`
+                names to their encoded values
+
+        Raises:
+            - ValueError: If a key (such as one with upper case letters or `__`)
+                or value (such as a date) can't be represented
+        """
+        state = self._state()
+        if state.environ is None or state.environ[0] != state.version:
+            state.environ = (state.version, {})
+        cache = state.environ[1]
+
+        from dotcfg import serializers
+
+        if prefix in cache:
+            environ, lists = cache[prefix]
+            if all(
+                serializers.encode_env_value(value) == environ[name]
+                for name, value in lists
+            ):
+                return MappingProxyType(environ)
+
+        environ = dict(serializers.environ_items(self, prefix))
+        lists = [
+            (serializers._env_name(prefix, key), value)
+            for key, value in _leaves(self)
+            if isinstance(value, list)
+        ]
+        cache[prefix] = (environ, lists)
+        return MappingProxyType(environ)
+
+    def _path_index(self) -> Tuple[Mapping[CompoundKey, Any], PathTrie]:
+        flat = self.flat_view()
+        state = self._state()
+        if state.trie is None:
+            state.trie = PathTrie(flat)
+        return flat, state.trie
+
+    def find(self, pattern: str) -> Dict[CompoundKey, Any]:
+        """
+        Finds every value whose `.` delimited path matches `pattern`, where a
+        `*` part of the pattern matches any single key.
+
+        The first query builds an index of the configuration's keys, which
+        is kept up to date as the configuration changes. Queries only
+        visit the parts of the index that could match.
+
+        Example:
+
+            ```python
+            config.find("services.*.host")
+            # {CompoundKey(("services", "database", "host")): "0.0.0.0", ...}
+            ```
+
+        Args:
+            - pattern (str): `.` delimited path, where `*` matches any key
+
+        Returns:
+            - Dict[CompoundKey, Any]: Matching keys and their values
+        """
+        flat, trie = self._path_index()
+        return {key: flat[key] for key in trie.match(pattern.split("."))}
+
+    def prefix(self, path: str) -> Dict[CompoundKey, Any]:
+        """
+        Finds every value nested under the `.` delimited `path`
+        (for example, `"feature_flags."` or `"feature_flags"`). See `find`
+        for details on how the queries are indexed.
+
+        Args:
+            - path (str): `.` delimited path. An empty string matches every key.
+
+        Returns:
+            - Dict[CompoundKey, Any]: Keys under `path` and their values
+        """
+        flat, trie = self._path_index()
+        path = path.rstrip(".")
+        parts = path.split(".") if path else []
+        return {key: flat[key] for key in trie.iter_prefix(parts)}
+
+    def get_path(self, path: str, default: Any = None) -> Any:
+        """
+        Retrieves a (possibly nested) value by its `.` delimited path.
+
+        Example:
+
+            ```python
+            config.get_path("services.database.host")
+            # Equivalent to, but faster than
+            config.services.database.host
+            ```
+
+        Args:
+            - path (str): `.` delimited path to the value. Numeric parts of
+                the path index into lists (`"services.0.host"`).
+            - default (Any): Value returned if the path doesn't exist.
+                Defaults to `None`.
+
+        Returns:
+            - Any: The value found at `path`, or `default` if missing
+        """
+        try:
+            return _lookup(self, compile_path(path))
+        except (KeyError, IndexError):
+            return default
+
+    def select(self, paths: Iterable[str], default: Any = None) -> List[Any]:
+        """
+        Retrieves multiple values by their `.` delimited paths in a single call.
+
+        Args:
+            - paths (Iterable[str]): `.` delimited paths to the values
+            - default (Any): Value used for any path that doesn't exist.
+                Defaults to `None`.
+
+        Returns:
+            - List[Any]: Values in the same order as `paths`
+        """
+        values = []
+        for path in paths:
+            try:
+                values.append(_lookup(self, compile_path(path)))
+            except (KeyError, IndexError):
+                values.append(default)
+        return values
+
+    def derived(self, function: Callable[["Config"], T]) -> "Derived[T]":
+        """
+        Caches a value derived from the configuration (such as a DSN, a
+        compiled regex or an `ssl.SSLContext`) until one of the values it
+        was derived from changes. Usable as a decorator:
+
+            ```python
+            @config.derived
+            def dsn(cfg):
+                return f"postgres://{cfg.database.host}:{cfg.database.port}"
+
+            dsn()  # Computed once, until `database.host` or `database.port` change
+            ```
+
+        `function` is passed a read only view of the configuration, which
+        records the paths it reads. Values read any other way (such as
+        through a global) aren't tracked.
+
+        Args:
+            - function (Callable[[Config], T]): Derives the value
+
+        Returns:
+            - Derived[T]: Callable returning the (cached) value
+        """
+        derived = Derived(self, function)
+        state = self._state()
+        if state.derived is None:
+            state.derived = weakref.WeakSet()
+        state.derived.add(derived)
+        return derived
+
+    def explain(self, path: str) -> "Provenance":
+        """
+        Looks up where a value came from, for configurations loaded with
+        `load_configuration(..., track_provenance=True)`.
+
+            ```python
+            config.explain("database.host")
+            # Provenance(key=('database', 'host'), source='prod.toml',
+            #            overridden=('base.toml',), raw='${env:DB_HOST}')
+            ```
+
+        Values inside lists are explained by the list they're in.
+
+        Args:
+            - path (str): `.` delimited path to the value
+
+        Raises:
+            - ProvenanceNotTracked: If provenance wasn't tracked while loading
+            - KeyError: If the path doesn't exist, or is a section that was
+                never set as a whole
+
+        Returns:
+            - Provenance: The layer that set the value, and the layers it overrode
+        """
+        # Paths are recorded relative to the root config
+        prefix: Tuple = ()
+        root = self
+        state = root._state()
+        while state.parent is not None:
+            prefix = (state.key, *prefix)
+            root = state.parent
+            state = root._state()
+        if state.provenance is None:
+            raise errors.ProvenanceNotTracked(
+                "Provenance is only available for configurations loaded "
+                "with `track_provenance=True`."
+            )
+
+        accessor = compile_path(path)
+        value = _lookup(self, accessor)
+        return state.provenance.explain(
+            CompoundKey((*prefix, *(key for key, _ in accessor))), value
+        )
+
     def copy(self) -> "Config":
         """
         Creates a recursive copy of the configuration instance.
@@ -28,14 +785,375 @@ class Config(Box):
             - Config: New (shallow) copy of the configuration
         """
 
-        new_config = Config()
-        for key, value in self.items():
-            if isinstance(value, Config):
-                value = value.copy()
+        # Nested configs are rebuilt by `build_config`, while lists are
+        # shared, the same way assigning them to a new `Config` would
+        return build_config(self)
+
+
+def _leaves(dct: dict) -> Iterator[Tuple[Tuple, Any]]:
+    # Like `dict_to_flatdict`, but empty sections are kept (as empty dict
+    # values) so they survive a round trip.
+    stack: List[Tuple[Tuple, Iterator]] = [((), iter(dict.items(dct)))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            key = (*prefix, k)
+            if isinstance(v, dict):
+                if v:
+                    stack.append((key, iter(dict.items(v))))
+                    break
+                v = {}
+            yield key, v
+        else:
+            stack.pop()
+
+
+def _plain(value: Any) -> Any:
+    # Lists (and sections in them) as plain lists and dicts
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in dict.items(value)}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+# Number of configs (by digest) kept in each process by `cache_config`
+PICKLE_CACHE_SIZE = 16
+
+# Each config cached by `cache_config`, along with its version at the time,
+# so an instance that was modified afterwards isn't reused
+_cached_configs: "OrderedDict[str, Tuple[Config, int]]" = OrderedDict()
+_cached_configs_lock = threading.Lock()
+
+
+def _cached_config(digest: str) -> Optional["Config"]:
+    with _cached_configs_lock:
+        entry = _cached_configs.get(digest)
+        if entry is None or entry[0]._state().version != entry[1]:
+            return None
+        _cached_configs.move_to_end(digest)
+        return entry[0]
+
+
+def _cache(config: "Config", digest: str) -> None:
+    with _cached_configs_lock:
+        _cached_configs[digest] = (config, config._state().version)
+        _cached_configs.move_to_end(digest)
+        while len(_cached_configs) > PICKLE_CACHE_SIZE:
+            _cached_configs.popitem(last=False)
+
+
+def _unpickle_config(
+    table: list,
+    config_class: Optional[Type["Config"]] = None,
+    options: Optional[dict] = None,
+) -> "Config":
+    # Always builds a new instance, since the result can be modified
+    tree: dict = {}
+    for key, value in table:
+        node = tree
+        for part in key[:-1]:
+            node = node.setdefault(part, {})
+        node[key[-1]] = value
+    if options:
+        return (config_class or Config)(tree, **options)
+    return build_config(tree, config_class)
+
+
+def cache_config(config: "Config") -> None:
+    """
+    Caches a configuration in this process, so that `ConfigRef`s to its
+    current version can be resolved. Meant to be used as the `initializer`
+    of a process pool, with the configuration as its argument.
+
+    Every `ConfigRef` to that version resolves to the same (cached) instance,
+    so it should be treated as read only. An instance that's modified isn't
+    resolved anymore, except for changes made to lists in place, which
+    aren't detected.
+
+    Args:
+        - config (Config): Configuration to cache
+    """
+    _cache(config, config._digest())
+
+
+class ConfigRef:
+    """
+    Reference to a version of a configuration, which is pickled as only
+    the digest of that version. Processes that already hold the same version
+    (such as process pool workers started with `cache_config`) resolve it
+    to their copy, so configurations can be sent along with every task
+    without pickling them each time.
+
+    Example:
+
+        ```python
+        def task(ref: ConfigRef, batch):
+            config = ref.config
+            ...
+
+        with ProcessPoolExecutor(initializer=cache_config, initargs=(config,)) as pool:
+            ref = ConfigRef(config)
+            pool.map(task, itertools.repeat(ref), batches)
+        ```
+
+    Args:
+        - config (Config): Configuration to refer to
+    """
+
+    __slots__ = ("digest", "_config")
+
+    def __init__(self, config: "Config") -> None:
+        self.digest = config._digest()
+        self._config: Optional[Config] = config
+
+    def __reduce__(self) -> Tuple[Any, Tuple[str]]:
+        return ConfigRef._from_digest, (self.digest,)
+
+    @classmethod
+    def _from_digest(cls, digest: str) -> "ConfigRef":
+        ref = cls.__new__(cls)
+        ref.digest = digest
+        ref._config = None
+        return ref
+
+    @property
+    def config(self) -> "Config":
+        """
+        The configuration this refers to.
+
+        Raises:
+            - UnknownConfigVersion: If this process doesn't hold the version
+                of the configuration this refers to
+        """
+        if self._config is None:
+            self._config = _cached_config(self.digest)
+            if self._config is None:
+                raise errors.UnknownConfigVersion(
+                    f"Configuration {self.digest} hasn't been received by this "
+                    "process; send it with `cache_config` first."
+                )
+        return self._config
+
+
+def _overlaps(a: Tuple, b: Tuple) -> bool:
+    # Whether one path is a prefix of the other
+    depth = min(len(a), len(b))
+    return a[:depth] == b[:depth]
+
+
+class _RecordingView:
+    """
+    Read only view of a `Config` passed to the functions of `Derived`
+    values, which records the path of every value read through it.
+    Nested configs are returned as views as well. Anything else that
+    reads a config as a whole (such as `items` or `to_dict`) records the
+    config's own path.
+    """
+
+    __slots__ = ("_node", "_path", "_reads")
+
+    def __init__(self, node: "Config", path: Tuple, reads: Set[CompoundKey]) -> None:
+        self._node = node
+        self._path = path
+        self._reads = reads
 
-            new_config[key] = value
+    def _read(self, key: Any, value: Any) -> Any:
+        path = (*self._path, key)
+        if isinstance(value, Config):
+            return _RecordingView(value, path, self._reads)
+        self._reads.add(CompoundKey(path))
+        return value
 
-        return new_config
+    def __getitem__(self, key: Any) -> Any:
+        try:
+            value = self._node[key]
+        except KeyError:
+            # Adding the key later changes the result
+            self._reads.add(CompoundKey((*self._path, key)))
+            raise
+        return self._read(key, value)
+
+    def __getattr__(self, name: str) -> Any:
+        if dict.__contains__(self._node, name):
+            return self._read(name, self._node[name])
+        # Methods of the config, or keys that are missing (or only
+        # available as attributes after Box's conversion), depend on the
+        # entire config
+        self._reads.add(CompoundKey(self._path))
+        return getattr(self._node, name)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if dict.__contains__(self._node, key):
+            return self._read(key, self._node[key])
+        self._reads.add(CompoundKey((*self._path, key)))
+        return default
+
+    def __contains__(self, key: Any) -> bool:
+        self._reads.add(CompoundKey((*self._path, key)))
+        return key in self._node
+
+    def __iter__(self) -> Iterator:
+        self._reads.add(CompoundKey(self._path))
+        return iter(self._node)
+
+    def __len__(self) -> int:
+        self._reads.add(CompoundKey(self._path))
+        return len(self._node)
+
+    def __repr__(self) -> str:
+        return f"<view of {self._node!r}>"
+
+
+class Derived(Generic[T]):
+    """
+    A value derived from a configuration, created by `Config.derived`.
+    Calling it returns the cached value, which is recomputed after one of
+    the paths it was derived from changes.
+    """
+
+    __slots__ = (
+        "config",
+        "function",
+        "_value",
+        "_valid",
+        "_generation",
+        "_dependencies",
+        "_lock",
+        "__weakref__",
+    )
+
+    def __init__(self, config: "Config", function: Callable[["Config"], T]) -> None:
+        self.config = config
+        self.function = function
+        self._value: Optional[T] = None
+        self._valid = False
+        # Incremented on every invalidation, so a value computed while the
+        # configuration was changing isn't kept
+        self._generation = 0
+        self._dependencies: Set[CompoundKey] = set()
+        self._lock = threading.RLock()
+
+    def __repr__(self) -> str:
+        name = getattr(self.function, "__qualname__", repr(self.function))
+        return f"<{type(self).__name__} {name}>"
+
+    def __call__(self) -> T:
+        if self._valid:
+            return self._value  # type: ignore
+        with self._lock:
+            if self._valid:
+                return self._value  # type: ignore
+            generation = self._generation
+            reads: Set[CompoundKey] = set()
+            value = self.function(_RecordingView(self.config, (), reads))  # type: ignore
+            self._value, self._dependencies = value, reads
+            self._valid = generation == self._generation
+            return value
+
+    @property
+    def dependencies(self) -> Set[CompoundKey]:
+        """Paths read by the last computation of the value"""
+        return set(self._dependencies)
+
+    def invalidate(self) -> None:
+        """Discards the cached value"""
+        self._generation += 1
+        self._valid = False
+
+    def _changed(self, path: CompoundKey) -> None:
+        if self._valid and any(_overlaps(path, dep) for dep in self._dependencies):
+            self.invalidate()
+
+
+class Provenance(NamedTuple):
+    """Where a value of a configuration came from, returned by `Config.explain`"""
+
+    # The path the value was set at (the list containing it, for values
+    # inside lists)
+    key: CompoundKey
+    # The file, URL, source or environment variable (such as `$APP__ENV`)
+    # that set the value, or `RUNTIME_SOURCE` if it was changed after loading
+    source: str
+    # Sources that set the same path before it, in the order they were merged
+    overridden: Tuple[str, ...]
+    # The value as it was written, before environment variables were
+    # interpolated and references (such as `${database.host}`) replaced
+    raw: Any
+
+
+# Source of values changed after the configuration was loaded
+RUNTIME_SOURCE = "<runtime>"
+
+
+class _ProvenanceTable:
+    """
+    Side table of the sources of every value of a configuration. Sources
+    are stored once, and each path only holds the indices of the sources
+    that set it.
+    """
+
+    __slots__ = ("sources", "entries")
+
+    def __init__(self) -> None:
+        self.sources: List[str] = []
+        # The indices of the sources that set each path (the last one
+        # winning), along with the value the last one set
+        self.entries: Dict[CompoundKey, Tuple[Tuple[int, ...], Any]] = {}
+
+    def _source(self, name: str) -> int:
+        self.sources.append(name)
+        return len(self.sources) - 1
+
+    def _set(self, key: CompoundKey, index: int, raw: Any) -> None:
+        entry = self.entries.get(key)
+        indices = entry[0] if entry is not None else ()
+        self.entries[key] = ((*indices, index), raw)
+
+    def add_layer(self, name: str, layer: dict) -> None:
+        """Records every value of a layer, which overrides the previous ones"""
+        index = self._source(name)
+        for key, value in _leaves(layer):
+            self._set(CompoundKey(key), index, value)
+
+    def add_value(self, name: str, key: Sequence, value: Any) -> None:
+        """Records a single value (such as an environment variable)"""
+        self._set(CompoundKey(key), self._source(name), value)
+
+    def retain(self, config: "Config") -> None:
+        """Drops the paths that were replaced by sections (or values) as a whole"""
+        leaves = {key for key, _ in _leaves(config)}
+        for key in [key for key in self.entries if key not in leaves]:
+            del self.entries[key]
+
+    def changed(self, path: CompoundKey) -> None:
+        """Records that every value at (or under) `path` was changed at runtime"""
+        if self.sources[-1:] != [RUNTIME_SOURCE]:
+            self._source(RUNTIME_SOURCE)
+        index = len(self.sources) - 1
+        # Changes after loading are rare, so scanning every path is fine
+        for key, (indices, raw) in list(self.entries.items()):
+            if _overlaps(key, path) and indices[-1] != index:
+                self.entries[key] = ((*indices, index), _MISSING)
+        if path not in self.entries:
+            self.entries[path] = ((index,), _MISSING)
+
+    def explain(self, key: CompoundKey, value: Any) -> Provenance:
+        """Returns the provenance of the value at `key` (or the closest parent)"""
+        for depth in range(len(key), 0, -1):
+            entry = self.entries.get(CompoundKey(key[:depth]))
+            if entry is not None:
+                break
+        else:
+            raise KeyError(".".join(map(str, key)))
+
+        indices, raw = entry
+        return Provenance(
+            key=CompoundKey(key[:depth]),
+            source=self.sources[indices[-1]],
+            overridden=tuple(self.sources[index] for index in indices[:-1]),
+            raw=value if raw is _MISSING else raw,
+        )
 
 
 def merge_dicts(d1: DictLike, d2: DictLike) -> DictLike:
@@ -53,6 +1171,10 @@ def merge_dicts(d1: DictLike, d2: DictLike) -> DictLike:
         - A `MutableMapping` with the two dictionary contents merged
     """
 
+    if isinstance(d1, Config):
+        # Merged as plain dictionaries, and converted once at the end
+        return build_config(_merge_plain(d1, d2), type(d1))
+
     new_dict = d1.copy()
 
     for k, v in d2.items():
@@ -65,7 +1187,157 @@ def merge_dicts(d1: DictLike, d2: DictLike) -> DictLike:
     return new_dict
 
 
-def dict_to_flatdict(dct: dict, parent: CompoundKey = None) -> dict:
+def _merge_plain(d1: Mapping, d2: Mapping) -> dict:
+    # `merge_dicts`, creating a plain `dict` for every level that's merged
+    merged = dict(d1.items())
+    for k, v in d2.items():
+        current = merged.get(k)
+        if isinstance(current, MutableMapping) and isinstance(v, MutableMapping):
+            merged[k] = _merge_plain(current, v)
+        else:
+            merged[k] = v
+    return merged
+
+
+# Box options that `build_config` reproduces. Configs with any other
+# options are built by Box, one key at a time.
+_BULK_BOX_OPTIONS = {
+    "default_box": False,
+    "frozen_box": False,
+    "camel_killer_box": False,
+    "conversion_box": True,
+    "modify_tuples_box": False,
+    "box_safe_prefix": "x",
+    "box_duplicates": "ignore",
+    "box_intact_types": (),
+    "box_recast": None,
+    "box_dots": False,
+}
+
+# Box options of each `Config` class, when created without any options
+_class_options: Dict[type, dict] = {}
+
+
+def _default_options(config_class: Type["Config"]) -> dict:
+    try:
+        return _class_options[config_class]
+    except KeyError:
+        pass
+    box_config = config_class()._box_config
+    options = {k: v for k, v in box_config.items() if not k.startswith("__")}
+    _class_options[config_class] = options
+    return options
+
+
+def _bulk_options(config_class: Type["Config"]) -> Optional[dict]:
+    # The options of `config_class`, or None if it can't be built in bulk
+    options = _default_options(config_class)
+    if any(options[k] != v for k, v in _BULK_BOX_OPTIONS.items()):
+        return None
+    return options
+
+
+def _custom_options(config: "Config", config_class: Type["Config"]) -> dict:
+    # The options `config` was created with, which aren't the defaults
+    # of `config_class`
+    defaults = _default_options(config_class)
+    return {
+        k: v
+        for k, v in config._box_config.items()
+        if not k.startswith("__") and defaults.get(k, _MISSING) != v
+    }
+
+
+@functools.lru_cache(maxsize=4096, typed=True)
+def _safe_attr(key: Any) -> str:
+    # Box computes the attribute name of every key it stores, which is far
+    # more expensive than storing the key itself. Most names (such as
+    # "host" or "port") repeat throughout a configuration.
+    return Box._safe_attr(_attr_box(), key)
+
+
+@functools.lru_cache(maxsize=None)
+def _attr_box() -> Box:
+    return Box()
+
+
+def _build_node(config_class: Type["Config"], options: dict, data: Mapping) -> "Config":
+    node = dict.__new__(config_class)
+    safe_keys: Dict[str, Any] = {}
+    # Box intercepts `setattr`, and `Box.__new__` would build its own options
+    object.__setattr__(
+        node, "_box_config", {**options, "__created": False, "__safe_keys": safe_keys}
+    )
+    items = dict.items(data) if isinstance(data, dict) else data.items()
+    for key, value in items:
+        safe_keys[_safe_attr(key)] = key
+        if isinstance(value, dict):
+            value = _build_node(config_class, options, value)
+            state = value._state()
+            state.parent = node
+            state.key = key
+        elif isinstance(value, list):
+            value = _build_list(config_class, options, value)
+        dict.__setitem__(node, key, value)
+    node._box_config["__created"] = True
+    return node
+
+
+def _build_list(config_class: Type["Config"], options: dict, data: list) -> BoxList:
+    if isinstance(data, BoxList):
+        # Stored as is, the same way Box stores them
+        data.box_options.update(options)
+        return data
+
+    items = []
+    for item in data:
+        if isinstance(item, dict):
+            # Configs in lists aren't linked to their parent, as with Box
+            item = _build_node(config_class, options, item)
+        elif isinstance(item, list):
+            item = _build_list(config_class, options, list(item))
+        items.append(item)
+    box_list = BoxList()
+    box_list.box_options = dict(options)
+    box_list.box_org_ref = id(data)
+    list.extend(box_list, items)
+    return box_list
+
+
+def build_config(
+    data: Mapping, config_class: Optional[Type["Config"]] = None
+) -> "Config":
+    """
+    Builds a `Config` from a nested (or flat) mapping in a single pass.
+
+    Creating a `Config` (or assigning to one) converts and stores each value
+    one key at a time, and re-creates every nested config that's assigned,
+    so building a configuration level by level converts the deepest levels
+    once per level above them. This builds each level exactly once, producing
+    the same result as `Config(data)`: nested configs are linked to their
+    parent, lists are converted to `BoxList`s and attribute names are
+    registered with Box.
+
+    Args:
+        - data (Mapping): Configuration to build. Keys that are
+            `CompoundKey`s are nested, as with `flatdict_to_dict`.
+        - config_class (Optional[Type[Config]]): Class of the result (and
+            every nested config); defaults to `Config`
+
+    Returns:
+        - Config: The new configuration
+    """
+    config_class = config_class or Config
+    if any(isinstance(key, CompoundKey) for key in data):
+        data = flatdict_to_dict(cast(dict, data))
+
+    options = _bulk_options(config_class)
+    if options is None:
+        return config_class(data)
+    return _build_node(config_class, options, data)
+
+
+def dict_to_flatdict(dct: dict, parent: Optional[CompoundKey] = None) -> dict:
     """
     Converts a (nested) dictionary to a flattened representation.
     Each key of the flat dict will be a CompoundKey tuple containing the "chain of keys"
@@ -80,15 +1352,22 @@ def dict_to_flatdict(dct: dict, parent: CompoundKey = None) -> dict:
         - dict: A flattened dict
     """
 
-    items: List[Tuple[CompoundKey, Any]] = []
-    parent = parent or CompoundKey()
-    for k, v in dct.items():
-        k_parent = CompoundKey(parent + (k,))
-        if isinstance(v, dict):
-            items.extend(dict_to_flatdict(v, parent=k_parent).items())
+    flat = {}
+    # Walks the nested dictionaries depth first with an explicit stack,
+    # which keeps the same key order as a recursive implementation
+    # without the intermediate results each level of recursion would need.
+    stack = [(parent or CompoundKey(), iter(dct.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            key = CompoundKey((*prefix, k))
+            if isinstance(v, dict):
+                stack.append((key, iter(v.items())))
+                break
+            flat[key] = v
         else:
-            items.append((k_parent, v))
-    return dict(items)
+            stack.pop()
+    return flat
 
 
 def flatdict_to_dict(dct: dict, dct_class: Optional[type] = None) -> MutableMapping:
@@ -104,14 +1383,23 @@ def flatdict_to_dict(dct: dict, dct_class: Optional[type] = None) -> MutableMapp
         - MutableMapping: A `MutableMapping` used to represent a nested dictionary
     """
 
-    result: MutableMapping = (dct_class or dict)()
+    if dct_class is not None and issubclass(dct_class, Config):
+        # Nested as plain dictionaries, and converted once at the end
+        return build_config(flatdict_to_dict(dct), dct_class)
+
+    dct_class = dct_class or dict
+    result = cast(MutableMapping, dct_class())
     for k, v in dct.items():
         if isinstance(k, CompoundKey):
             current_dict = result
             for ki in k[:-1]:
-                current_dict = current_dict.setdefault(  # type: ignore
-                    ki, (dct_class or dict)()
-                )
+                child = current_dict.get(ki, _MISSING)
+                if child is _MISSING:
+                    current_dict[ki] = dct_class()
+                    # Looked up again rather than reusing the new instance,
+                    # since `Box` subclasses store a converted copy of it
+                    child = current_dict[ki]
+                current_dict = child
             current_dict[k[-1]] = v
         else:
             result[k] = v
@@ -2,18 +2,43 @@ import os
 import pathlib
 import re
 from ast import literal_eval
-from typing import Any, Dict, List, Optional, Union, cast
-
-from dotcfg import collections, engine
-from dotcfg.types import StrPath
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
+
+from dotcfg import collections, engine, resolvers
+from dotcfg.types import ConfigPath, StrPath
+
+if TYPE_CHECKING:
+    from dotcfg.sources import ConfigSource
 
 INTERPOLATION_REGEX = re.compile(r"\${(.[^${}]*)}")
+# Captures the top level key of every reference, including references
+# that are only completed by another (nested) reference.
+SECTION_REFERENCE_REGEX = re.compile(r"\${([^.${}:]+)[.}]")
+
+# Paths starting with these are loaded with `dotcfg.remote`
+_URL_SCHEMES = ("http://", "https://")
 
 
 def interpolate_config(
     config: dict,
     replace_references: bool = True,
     env_var_prefix: Optional[str] = None,
+    sections: Optional[Collection[str]] = None,
 ) -> collections.Config:
     """
     Processes the initial input configuration and replaces
@@ -26,46 +51,227 @@ def interpolate_config(
             in the final merged config.
         - env_var_prefix (Optional[str]): Environment variable prefix to
             load from the current environment.
+        - sections (Optional[Collection[str]]): If provided, only environment
+            variables for these top level keys are loaded.
 
     Returns:
         - collections.Config: Configuration object with values populated
             and accessible via dot notation or dictionary notation.
     """
 
-    # Toml & other file formats support nested
-    # dictionaries, so we need to flatten them out
-    # to avoid recursive checking when interpolating
-    flat_config = collections.dict_to_flatdict(config)
+    # Configs are converted back to plain (nested) dictionaries, which are
+    # interpolated in place. Nothing is flattened along the way.
+    if isinstance(config, collections.Config):
+        tree = config.to_dict()
+    else:
+        tree = engine._copy_tree(config)
 
+    env_vars: Dict[collections.CompoundKey, Any] = {}
     if env_var_prefix is not None:
         env_vars = load_environment_variables(env_var_prefix)
-        flat_config = {**flat_config, **env_vars}
+        if sections is not None:
+            env_vars = {k: v for k, v in env_vars.items() if k[0] in sections}
+        for key, value in env_vars.items():
+            _set_path(tree, key, value)
+
+    # Environment variables were already interpolated and cast when they were
+    # read, so they aren't again (which would expand escaped "$" and cast
+    # strings such as "123").
+    _TreeResolver(
+        tree,
+        interpolate=True,
+        replace_references=replace_references,
+        decoded=env_vars,
+    ).run()
+    return collections.build_config(tree)
 
-    # Interpolate any environment variables referenced
-    for key, value in list(flat_config.items()):
-        value = interpolate_env_vars(value)
-        if isinstance(value, str):
-            value = string_to_type(value)
 
-        flat_config[key] = value
+def _set_path(tree: dict, key: Tuple, value: Any) -> None:
+    for part in key[:-1]:
+        child = tree.get(part)
+        if not isinstance(child, dict):
+            child = tree[part] = {}
+        tree = child
+    tree[key[-1]] = value
 
-    if replace_references:
-        flat_config = replace_variable_references(flat_config)
-    return cast(
-        collections.Config,
-        collections.flatdict_to_dict(flat_config, dct_class=collections.Config),
-    )
+
+def resolve_references(
+    tree: dict, context: Optional[resolvers.ResolutionContext] = None
+) -> dict:
+    """
+    Replaces references (with ${} syntax) anywhere in a nested configuration,
+    including inside lists and lists of tables, in place. Unlike
+    `replace_variable_references`, the configuration doesn't need to be
+    flattened first; it's walked once, and referenced values are resolved
+    the first time they're needed.
+
+    Args:
+        - tree (dict): Nested configuration to resolve (modified in place)
+        - context (Optional[resolvers.ResolutionContext]): Remembers
+            resolved namespaced references. A new one is used if not provided.
+
+    Returns:
+        - dict: The same (modified) configuration
+    """
+    _TreeResolver(
+        tree, interpolate=False, replace_references=True, context=context
+    ).run()
+    return tree
+
+
+# Returned for references to a value that's still being resolved
+_CYCLE = object()
+
+
+class _TreeResolver:
+    """
+    Interpolates environment variables and replaces references in a nested
+    configuration, in place.
+
+    The configuration is walked once, interpolating each value and
+    remembering the location of every string containing a reference.
+    Afterwards, only those strings are resolved. A string that's referenced
+    before its own turn comes is resolved on demand.
+    """
+
+    # Bounds how many references are substituted into a single string, so
+    # references that (indirectly) include themselves can't loop forever.
+    MAX_SUBSTITUTIONS = 100
+
+    def __init__(
+        self,
+        root: dict,
+        interpolate: bool,
+        replace_references: bool,
+        context: Optional[resolvers.ResolutionContext] = None,
+        decoded: Collection[Tuple] = (),
+    ) -> None:
+        self.root = root
+        self.interpolate = interpolate
+        # Paths of values (or entire sections) that aren't interpolated
+        self.decoded = decoded
+        self.replace_references = replace_references
+        self.context = context if context is not None else resolvers.ResolutionContext()
+        # Location (container and key) of each unresolved string, by path
+        self._pending: Dict[Tuple, Tuple[Any, Any]] = {}
+        # Paths of the strings currently being resolved
+        self._resolving: List[Tuple] = []
+
+    def run(self) -> None:
+        self._walk()
+        if not self._pending:
+            return
+
+        # Batch resolvers are called once for every reference they're
+        # responsible for, rather than once per reference.
+        self.context.prefetch(
+            _namespaced_references(
+                container[key] for container, key in self._pending.values()
+            )
+        )
+        while self._pending:
+            self._resolve(next(iter(self._pending)))
+
+    def _walk(self) -> None:
+        stack: List[Tuple[Tuple, Any, bool]] = [((), self.root, self.interpolate)]
+        while stack:
+            path, container, interpolate = stack.pop()
+            in_table = isinstance(container, dict)
+            items = container.items() if in_table else enumerate(container)
+            for key, value in items:
+                if isinstance(value, (dict, list)):
+                    child = (*path, key)
+                    stack.append(
+                        (child, value, interpolate and child not in self.decoded)
+                    )
+                    continue
+                # Strings directly inside lists aren't interpolated, since
+                # they'd be converted with `string_to_type`. Tables inside
+                # lists are interpolated like any other table.
+                if in_table and interpolate and (*path, key) not in self.decoded:
+                    value = container[key] = _interpolate_value(value)
+                if self.replace_references and isinstance(value, str) and "${" in value:
+                    self._pending[(*path, key)] = (container, key)
+
+    def _resolve(self, path: Tuple) -> None:
+        container, key = self._pending.pop(path)
+        value = container[key]
+        self._resolving.append(path)
+        for _ in range(self.MAX_SUBSTITUTIONS):
+            match = INTERPOLATION_REGEX.search(value)
+            if not match:
+                break
+            # the matched_string includes "${}"; the matched_key is just the inner value
+            matched_string = match.group(0)
+            ref_value = self._reference(match.group(1))
+            if ref_value is _CYCLE:
+                # Left as is, rather than substituting the reference into itself
+                break
+            # The configuration's value was just a reference and nothing else
+            if value == matched_string:
+                value = ref_value
+                break
+            value = value.replace(matched_string, str(ref_value), 1)
+        self._resolving.pop()
+        container[key] = value
+
+    def _reference(self, matched_key: str) -> Any:
+        namespaced = resolvers.parse_reference(matched_key)
+        if namespaced is not None:
+            return self.context.resolve(*namespaced)
+
+        path = tuple(matched_key.split("."))
+        parent, value = None, self.root
+        for part in path:
+            if not isinstance(value, dict) or part not in value:
+                # Missing references are replaced with an empty string
+                return ""
+            parent, value = value, value[part]
+
+        if any(path == resolving[: len(path)] for resolving in self._resolving):
+            return _CYCLE
+        if path in self._pending:
+            self._resolve(path)
+            value = cast(dict, parent)[path[-1]]
+        elif isinstance(value, list):
+            self._resolve_within(value, path)
+        elif isinstance(value, dict):
+            # Only values can be referenced, not entire sections
+            return ""
+        return value
+
+    def _resolve_within(self, container: Any, path: Tuple) -> None:
+        items = (
+            container.items() if isinstance(container, dict) else enumerate(container)
+        )
+        for key, value in items:
+            if isinstance(value, (dict, list)):
+                self._resolve_within(value, (*path, key))
+            elif (*path, key) in self._pending:
+                self._resolve((*path, key))
+
+
+def _interpolate_value(value: Any) -> Any:
+    value = interpolate_env_vars(value)
+    if isinstance(value, str):
+        value = string_to_type(value)
+    return value
 
 
-def replace_variable_references(flat_config: dict) -> dict:
+def replace_variable_references(
+    flat_config: dict, context: Optional[resolvers.ResolutionContext] = None
+) -> dict:
     """
     Given a dictionary (with CompoundKeys as keys), we replace
     the references to other keys (with ${} syntax) with the
-    actual values
+    actual values. References with a registered namespace
+    (such as `${env:HOME}`) are passed to their resolver instead.
 
     Args:
         - flat_config (dict): A dictionary containing
             collections.CompoundKey values as keys
+        - context (Optional[resolvers.ResolutionContext]): Remembers
+            resolved namespaced references. A new one is used if not provided.
 
     Returns:
         - dict: The updated (modified) dictionary that
@@ -82,10 +288,14 @@ def replace_variable_references(flat_config: dict) -> dict:
         matched_string = match.group(0)
         matched_key = match.group(1)
 
-        # get the referenced key from the config value
-        ref_key = collections.CompoundKey(matched_key.split("."))
-        # get the value corresponding to the referenced key
-        ref_value = flat_config.get(ref_key, "")
+        namespaced = resolvers.parse_reference(matched_key)
+        if namespaced is not None:
+            ref_value = resolution.resolve(*namespaced)
+        else:
+            # get the referenced key from the config value
+            ref_key = collections.CompoundKey(matched_key.split("."))
+            # get the value corresponding to the referenced key
+            ref_value = flat_config.get(ref_key, "")
 
         # The configuration's value was just a reference and nothing else
         if value == matched_string:
@@ -102,6 +312,11 @@ def replace_variable_references(flat_config: dict) -> dict:
         # Ex2) "Bearer ${api_token}"
         return value.replace(matched_string, str(ref_value), 1)
 
+    resolution = context if context is not None else resolvers.ResolutionContext()
+    # Batch resolvers are called once for every reference they're
+    # responsible for, rather than once per reference.
+    resolution.prefetch(_namespaced_references(flat_config.values()))
+
     output = flat_config.copy()
     keys_to_check = set(output.keys())
 
@@ -157,6 +372,17 @@ def replace_variable_references(flat_config: dict) -> dict:
     return output
 
 
+def _namespaced_references(values: Iterable[Any]) -> Iterator[Tuple[str, str]]:
+    for value in values:
+        items = value if isinstance(value, list) else [value]
+        for item in items:
+            if isinstance(item, str) and "${" in item:
+                for reference in INTERPOLATION_REGEX.findall(item):
+                    namespaced = resolvers.parse_reference(reference)
+                    if namespaced is not None:
+                        yield namespaced
+
+
 def load_environment_variables(
     env_var_prefix: str,
 ) -> Dict[collections.CompoundKey, Any]:
@@ -280,21 +506,142 @@ def validate_config(config: collections.Config) -> None:
     check_valid_keys(config)
 
 
+def _referenced_sections(value: Any) -> Set[str]:
+    """
+    Finds the top level keys referenced (with "${}" syntax) anywhere
+    within a (possibly nested) value.
+    """
+    referenced: Set[str] = set()
+    stack = [value]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, str):
+            if "${" in current:
+                referenced.update(SECTION_REFERENCE_REGEX.findall(current))
+        elif isinstance(current, dict):
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+    return referenced
+
+
+def _required_sections(
+    layers: Iterable[dict],
+    env_vars: Dict[collections.CompoundKey, Any],
+    sections: Iterable[str],
+) -> Set[str]:
+    """
+    Expands the requested top level keys to include every other top level key
+    they (transitively) reference, so references can still be resolved.
+    """
+    layers = list(layers)
+    required: Set[str] = set()
+    pending = set(sections)
+    while pending:
+        section = pending.pop()
+        required.add(section)
+
+        referenced: Set[str] = set()
+        for layer in layers:
+            if section in layer:
+                referenced |= _referenced_sections(layer[section])
+        for key, value in env_vars.items():
+            if key[0] == section:
+                referenced |= _referenced_sections(value)
+
+        pending |= referenced - required
+    return required
+
+
+def _is_file(path: ConfigPath) -> bool:
+    if isinstance(path, str):
+        return not path.lower().startswith(_URL_SCHEMES)
+    return isinstance(path, os.PathLike)
+
+
+def _read_layers(
+    paths: Iterable[ConfigPath],
+    file_type: engine.SupportedFileTypes,
+    names: Optional[List[str]] = None,
+) -> List[dict]:
+    # If `names` is provided, the name of each layer (for provenance) is
+    # appended to it
+    paths = list(paths)
+    if not all(_is_file(path) for path in paths):
+        return _read_mixed_layers(paths, file_type, names)
+
+    locations = [pathlib.Path(cast(StrPath, path)) for path in paths]
+    for location in locations:
+        if not location.exists():
+            raise FileNotFoundError(
+                f"Configuration file {location} was specified but does not exist."
+            )
+    # Read together, so files included by more than one path are only read once
+    if names is not None:
+        layers, _ = engine._read_with_includes(locations, file_type, names)
+        return layers
+    return engine.read_configuration_files(locations, file_format=file_type)
+
+
+def _read_mixed_layers(
+    paths: List[ConfigPath],
+    file_type: engine.SupportedFileTypes,
+    names: Optional[List[str]] = None,
+) -> List[dict]:
+    layers: List[dict] = []
+    files: List[ConfigPath] = []
+    for path in paths:
+        if _is_file(path):
+            files.append(path)
+            continue
+
+        # Consecutive files are still read together
+        layers.extend(_read_layers(files, file_type, names))
+        files = []
+        if isinstance(path, str):
+            # Imported here, so that only loading from URLs pays for importing it
+            from dotcfg import remote
+
+            layers.append(remote.load_url(path, file_type))
+            if names is not None:
+                names.append(path)
+        else:
+            layers.append(cast("ConfigSource", path).load())
+            if names is not None:
+                names.append(repr(path))
+    layers.extend(_read_layers(files, file_type, names))
+    return layers
+
+
+def _merge_layers(layers: Sequence[dict]) -> dict:
+    merged = layers[0] if layers else {}
+    for config_chunk in layers[1:]:
+        merged = cast(dict, collections.merge_dicts(merged, config_chunk))
+    return merged
+
+
 def load_configuration(
-    default_path: StrPath,
-    *paths: StrPath,
+    default_path: ConfigPath,
+    *paths: ConfigPath,
     env_var_prefix: Optional[str] = None,
     replace_references: bool = True,
     file_type: engine.SupportedFileTypes = engine.SupportedFileTypes.AUTO,
+    sections: Optional[Sequence[str]] = None,
+    compact_arrays: Optional[int] = None,
+    track_provenance: bool = False,
 ) -> collections.Config:
     """
     Main entrypoint to loading a configuration set.
 
     Args:
-        - default_path (StrPath): Path containing location to configuration
+        - default_path (ConfigPath): Path containing location to configuration
             with default values
-        - *paths (StrPath): Positional paths that contain configuration items
+        - *paths (ConfigPath): Positional paths that contain configuration items
             that overwrite (in priority order) the previous configuration.
+            Files listed under a file's `include` key are merged before it;
+            see `engine.read_configuration_files`. Paths can also be
+            `http://` or `https://` URLs (see `dotcfg.remote`), or any
+            `sources.ConfigSource`.
         - env_var_prefix (Optional[str]): An environment variable prefix
             to read values from. Environment variables with naming convention
             "<prefix>__[<optional section>]__[<optional subsection>]__key"
@@ -304,38 +651,213 @@ def load_configuration(
             to be `False`.
         - file_type (engine.SupportedFileType): Explicitly set the type of the
             file being read. If not provided, attempts to autodiscover will occur.
+        - sections (Optional[Sequence[str]]): Top level keys to load. If provided,
+            merging, environment variables, interpolation and validation are
+            limited to these keys, along with any other top level keys they
+            reference. Only the requested keys are returned.
+        - compact_arrays (Optional[int]): If provided, lists of at least this
+            many ints (or floats) are stored as `collections.CompactArray`s,
+            which take a fraction of the memory but can't be modified.
+        - track_provenance (bool): Whether to record which file, URL, source
+            or environment variable set each value (and which ones it
+            overrode), so it can be looked up with `Config.explain`
 
     Returns:
         - collections.Config: Dictionary supporting dot access
     """
 
-    default_config = engine.read_configuration_file(
-        pathlib.Path(default_path), file_format=file_type
-    )
+    names: Optional[List[str]] = [] if track_provenance else None
+    layers = _read_layers([default_path, *paths], file_type, names)
+
+    required: Optional[Set[str]] = None
+    if sections is not None:
+        env_vars = (
+            load_environment_variables(env_var_prefix)
+            if env_var_prefix is not None
+            else {}
+        )
+        required = _required_sections(layers, env_vars, sections)
+        layers = [{k: v for k, v in layer.items() if k in required} for layer in layers]
 
     # For each specified path, we assume that the later they are in the
     # provided argument list, the higher priority they are, with
     # environment variables having the highest priority.
-
-    for path in paths:
-        try:
-            config_chunk = engine.read_configuration_file(
-                pathlib.Path(path), file_format=file_type
-            )
-        except FileNotFoundError as exc:
-            raise FileNotFoundError(
-                f"Configuration file {path} was specified but does not exist."
-            ) from exc
-
-        default_config = cast(
-            dict, collections.merge_dicts(default_config, config_chunk)
-        )
+    provenance = None
+    if names is not None:
+        provenance = _record_provenance(layers, names, env_var_prefix, required)
+    default_config = _merge_layers(layers)
 
     config = interpolate_config(
         default_config,
         replace_references=replace_references,
         env_var_prefix=env_var_prefix,
+        sections=required,
     )
 
+    if sections is not None:
+        # Sections that were only loaded to resolve references
+        for key in [k for k in config if k not in sections]:
+            del config[key]
+
     validate_config(config)
+    if compact_arrays is not None:
+        collections.compact_lists(config, compact_arrays)
+    if provenance is not None:
+        provenance.retain(config)
+        config._state().provenance = provenance
     return config
+
+
+def _record_provenance(
+    layers: Sequence[dict],
+    names: Sequence[str],
+    env_var_prefix: Optional[str],
+    sections: Optional[Collection[str]],
+) -> collections._ProvenanceTable:
+    # Recorded before the layers are merged, in the order they're merged
+    provenance = collections._ProvenanceTable()
+    for name, layer in zip(names, layers):
+        provenance.add_layer(name, layer)
+    if env_var_prefix is not None:
+        for key, value in load_environment_variables(env_var_prefix).items():
+            if sections is None or key[0] in sections:
+                env_var = "__".join(key).upper()
+                provenance.add_value(f"${env_var_prefix}__{env_var}", key, value)
+    return provenance
+
+
+class _VariantBase:
+    """
+    Everything that's shared by each variant loaded by `load_variants`:
+    the merged base configuration, with environment variables in its values
+    already interpolated, and the environment variables to apply to it.
+    """
+
+    def __init__(
+        self,
+        base: dict,
+        env_vars: Dict[collections.CompoundKey, Any],
+        replace_references: bool,
+    ) -> None:
+        self.tree = _interpolated(base)
+        # Already interpolated and cast when they were read
+        self.env_vars = list(env_vars.items())
+        self.replace_references = replace_references
+
+    def build(self, overrides: dict) -> collections.Config:
+        # Interpolating each value before merging is equivalent to
+        # interpolating the merged tree, since values in tables stay in tables
+        tree = engine._copy_tree(self.tree)
+        _merge_into(tree, _interpolated(overrides))
+        for key, value in self.env_vars:
+            _set_path(tree, key, engine._copy_tree(value))
+
+        if self.replace_references:
+            _TreeResolver(tree, interpolate=False, replace_references=True).run()
+        config = collections.build_config(tree)
+        validate_config(config)
+        return config
+
+
+def _interpolated(tree: dict) -> dict:
+    # A copy of `tree`, with environment variables interpolated
+    tree = engine._copy_tree(tree)
+    _TreeResolver(tree, interpolate=True, replace_references=False).run()
+    return tree
+
+
+def _merge_into(tree: dict, overrides: dict) -> None:
+    # `collections.merge_dicts`, modifying `tree` in place
+    for k, v in overrides.items():
+        current = tree.get(k)
+        if isinstance(current, dict) and isinstance(v, dict):
+            _merge_into(current, v)
+        else:
+            tree[k] = v
+
+
+# Set in each worker process used by `load_variants`
+_worker_base: Optional[_VariantBase] = None
+
+
+def _init_variant_worker(base: _VariantBase) -> None:
+    global _worker_base
+    _worker_base = base
+
+
+def _build_variant(overrides: dict) -> collections.Config:
+    return cast(_VariantBase, _worker_base).build(overrides)
+
+
+def load_variants(
+    base_paths: Sequence[ConfigPath],
+    variants: Mapping[str, Sequence[ConfigPath]],
+    *,
+    env_var_prefix: Optional[str] = None,
+    replace_references: bool = True,
+    file_type: engine.SupportedFileTypes = engine.SupportedFileTypes.AUTO,
+    max_workers: Optional[int] = None,
+) -> Dict[str, collections.Config]:
+    """
+    Loads many variations (environments, tenants, etc.) of the same base
+    configuration. Each variant is equivalent to calling
+    `load_configuration(*base_paths, *variants[name], ...)`, but the base
+    configuration is only read, merged and interpolated once.
+    Afterwards, only each variant's own files are applied on top of it.
+
+    Example:
+
+        ```python
+        configs = load_variants(
+            ["base.toml", "defaults.toml"],
+            {"dev": ["dev.toml"], "prod": ["prod.toml", "prod-secrets.toml"]},
+        )
+        configs["prod"].database.host
+        ```
+
+    Args:
+        - base_paths (Sequence[ConfigPath]): Paths to configuration shared by every
+            variant, in priority order.
+        - variants (Mapping[str, Sequence[ConfigPath]]): Name of each variant,
+            along with the paths that overwrite the base configuration for it.
+        - env_var_prefix (Optional[str]): An environment variable prefix
+            to read values from. Applies to every variant.
+        - replace_references (bool): Whether to resolve variable references
+            (per variant) after loading.
+        - file_type (engine.SupportedFileType): Explicitly set the type of the
+            files being read. If not provided, attempts to autodiscover will occur.
+        - max_workers (Optional[int]): If provided, variants are built in a pool
+            of this many processes.
+
+    Returns:
+        - Dict[str, collections.Config]: Configuration for each variant
+    """
+
+    base = _VariantBase(
+        _merge_layers(_read_layers(base_paths, file_type)),
+        env_vars=(
+            load_environment_variables(env_var_prefix)
+            if env_var_prefix is not None
+            else {}
+        ),
+        replace_references=replace_references,
+    )
+
+    overrides = {
+        name: _merge_layers(_read_layers(paths, file_type))
+        for name, paths in variants.items()
+    }
+
+    if max_workers is None:
+        return {name: base.build(override) for name, override in overrides.items()}
+
+    # Imported here, since it's slow to import and rarely used
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_variant_worker,
+        initargs=(base,),
+    ) as executor:
+        results = executor.map(_build_variant, overrides.values())
+        return dict(zip(overrides, results))
@@ -3,26 +3,140 @@ Code related to reading multiple types
 of supported configuration file formats.
 """
 import enum
-import json
 import pathlib
-from typing import Any, Callable, Dict, cast
-
-import toml
+import threading
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    cast,
+)
 
 from dotcfg import errors
 
 
+# Top level key of a configuration file listing other files
+# (relative to the file itself) to include
+INCLUDE_KEY = "include"
+
+
 class SupportedFileTypes(enum.Enum):
 
     JSON = "JSON"
     TOML = "TOML"
+    # dotcfg's random access binary format, see `dotcfg.binary`
+    DCFG = "DCFG"
 
     # Will be assigned based on the provided file's extension
     AUTO = "AUTO"
 
 
+class CacheInfo(NamedTuple):
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class ParseCache:
+    """
+    Thread safe, least recently used cache of parsed configuration files.
+
+    Entries are keyed by a file's location, size, modification time and
+    format, so changes to a file on disk are picked up on the next read.
+    Cached trees are never handed out directly; each read receives its own
+    copy, so changes made by one caller can't leak into another.
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Any:
+        with self._lock:
+            try:
+                tree = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return _copy_tree(tree)
+
+    def put(self, key: Tuple, tree: dict) -> None:
+        if self.maxsize <= 0:
+            return
+        tree = _copy_tree(tree)
+        with self._lock:
+            self._entries[key] = tree
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+_PARSE_CACHE = ParseCache()
+
+
+def configure_parse_cache(maxsize: int) -> None:
+    """
+    Sets the maximum number of parsed files kept in memory by
+    `read_configuration_file`. Setting it to `0` disables caching.
+    """
+    _PARSE_CACHE.resize(maxsize)
+
+
+def parse_cache_info() -> CacheInfo:
+    """Returns hit / miss statistics and the size of the parse cache"""
+    return _PARSE_CACHE.info()
+
+
+def clear_parse_cache() -> None:
+    """Removes every cached file and resets the cache's statistics"""
+    _PARSE_CACHE.clear()
+
+
+def _copy_tree(tree: Any) -> Any:
+    # Only the containers are copied. Every other value that can be
+    # parsed from a configuration file is immutable, so it can be shared.
+    if isinstance(tree, dict):
+        return {k: _copy_tree(v) for k, v in tree.items()}
+    if isinstance(tree, list):
+        return [_copy_tree(v) for v in tree]
+    return tree
+
+
 def read_configuration_file(
-    location: pathlib.Path, *, file_format: SupportedFileTypes = SupportedFileTypes.AUTO
+    location: pathlib.Path,
+    *,
+    file_format: SupportedFileTypes = SupportedFileTypes.AUTO,
+    use_cache: bool = True,
 ) -> dict:
     """Reads a configuration file from disk
 
@@ -31,6 +145,8 @@ def read_configuration_file(
         - file_format (SupportedFileTypes): Enum member of the supported file types.
             Defaults to `AUTO`, which attempts to discover the file type based
             on the file's extension.
+        - use_cache (bool): Whether to use (and populate) the in process cache
+            of parsed files. See `configure_parse_cache`.
 
     Raises:
         - UnsupportedFileType: If a provided file has an unsupported extension
@@ -46,14 +162,170 @@ def read_configuration_file(
     loaders: Dict[SupportedFileTypes, Callable[[pathlib.Path], Dict[str, Any]]] = {
         SupportedFileTypes.JSON: _load_json,
         SupportedFileTypes.TOML: _load_toml,
+        SupportedFileTypes.DCFG: _load_dcfg,
     }
     try:
-        return loaders[file_format](location)
+        loader = loaders[file_format]
     except KeyError as exc:
         raise errors.UnsupportedFileType(
             f"Unsupported file format {file_format}."
         ) from exc
 
+    if not use_cache or _PARSE_CACHE.maxsize <= 0:
+        return loader(location)
+
+    stat = location.stat()
+    key = (str(location.resolve()), stat.st_size, stat.st_mtime_ns, file_format)
+    tree = _PARSE_CACHE.get(key)
+    if tree is None:
+        tree = loader(location)
+        _PARSE_CACHE.put(key, tree)
+    return cast(dict, tree)
+
+
+def read_configuration_files(
+    locations: Iterable[pathlib.Path],
+    *,
+    file_format: SupportedFileTypes = SupportedFileTypes.AUTO,
+) -> List[dict]:
+    """Reads configuration files from disk, along with every file they include
+
+    A configuration file can include other files by listing their paths
+    (relative to the file itself) under the top level `include` key:
+
+        ```toml
+        include = ["common/database.toml", "common/logging.toml"]
+        ```
+
+    Included files come before the file including them, in the order they are
+    listed, so the including file overwrites anything it includes. A file
+    that's included more than once (for example, a file shared by two other
+    included files) is only read and merged the first time it's encountered.
+
+    Args:
+        - locations (Iterable[pathlib.Path]): Locations of files on disk
+        - file_format (SupportedFileTypes): Enum member of the supported file types
+            for `locations`. Included files always have their type discovered
+            based on their extension.
+
+    Raises:
+        - CircularInclude: If a file (directly or indirectly) includes itself
+        - UnsupportedConfiguration: If the `include` key isn't a path or list of paths
+
+    Returns:
+        List[dict]: Contents of each file, in the order they should be merged.
+            The `include` key is removed from the contents.
+    """
+    layers, _ = _read_with_includes(locations, file_format)
+    return layers
+
+
+def _read_with_includes(
+    locations: Iterable[pathlib.Path],
+    file_format: SupportedFileTypes,
+    names: Optional[List[str]] = None,
+) -> Tuple[List[dict], List[pathlib.Path]]:
+    # `read_configuration_files`, which also returns every file that was read.
+    # If `names` is provided, the location of each layer is appended to it.
+    layers: List[dict] = []
+    parsed: Dict[pathlib.Path, dict] = {}
+    merged: Set[pathlib.Path] = set()
+
+    def visit(
+        location: pathlib.Path,
+        format_: SupportedFileTypes,
+        including: Tuple[pathlib.Path, ...],
+    ) -> None:
+        resolved = location.resolve()
+        if resolved in including:
+            chain = " -> ".join(str(path) for path in (*including, resolved))
+            raise errors.CircularInclude(f"Circular include: {chain}")
+
+        if resolved not in parsed:
+            parsed[resolved] = read_configuration_file(location, file_format=format_)
+        contents = parsed[resolved]
+
+        includes = contents.pop(INCLUDE_KEY, [])
+        if isinstance(includes, str):
+            includes = [includes]
+        if not isinstance(includes, list) or not all(
+            isinstance(include, str) for include in includes
+        ):
+            raise errors.UnsupportedConfiguration(
+                f'"{INCLUDE_KEY}" in {location} must be a path or a list of paths.'
+            )
+
+        for include in includes:
+            included = resolved.parent / include
+            if not included.exists():
+                raise FileNotFoundError(
+                    f"Configuration file {included} was included by {location} "
+                    "but does not exist."
+                )
+            if included.resolve() not in merged:
+                visit(included, SupportedFileTypes.AUTO, (*including, resolved))
+
+        merged.add(resolved)
+        layers.append(contents)
+        if names is not None:
+            names.append(str(location))
+
+    for location in locations:
+        visit(location, file_format, ())
+    return layers, list(parsed)
+
+
+def write_configuration_file(
+    data: dict,
+    location: pathlib.Path,
+    *,
+    file_format: SupportedFileTypes = SupportedFileTypes.AUTO,
+) -> None:
+    """Writes a configuration to disk
+
+    Args:
+        - data (dict): (Nested) configuration to write
+        - location (pathlib.Path): Location of the file to write
+        - file_format (SupportedFileTypes): Enum member of the supported file types.
+            Defaults to `AUTO`, which attempts to discover the file type based
+            on the file's extension.
+
+    Raises:
+        - UnsupportedFileType: If a provided file has an unsupported extension
+    """
+    if file_format == file_format.AUTO:
+        file_format = _infer_file_format(location)
+
+    writers: Dict[SupportedFileTypes, Callable[[dict, pathlib.Path], None]] = {
+        SupportedFileTypes.JSON: _dump_json,
+        SupportedFileTypes.TOML: _dump_toml,
+        SupportedFileTypes.DCFG: _dump_dcfg,
+    }
+    try:
+        writer = writers[file_format]
+    except KeyError as exc:
+        raise errors.UnsupportedFileType(
+            f"Unsupported file format {file_format}."
+        ) from exc
+    writer(data, location)
+
+
+def convert_configuration_file(source: pathlib.Path, destination: pathlib.Path) -> None:
+    """
+    Converts a configuration file between any of the supported file types,
+    based on the extensions of `source` and `destination`. For example, to
+    convert a TOML file to the binary format:
+
+        ```python
+        convert_configuration_file(Path("flags.toml"), Path("flags.dcfg"))
+        ```
+
+    Args:
+        - source (pathlib.Path): Location of the file to read
+        - destination (pathlib.Path): Location of the file to write
+    """
+    write_configuration_file(read_configuration_file(source), destination)
+
 
 def _infer_file_format(location: pathlib.Path) -> SupportedFileTypes:
 
@@ -67,12 +339,33 @@ def _infer_file_format(location: pathlib.Path) -> SupportedFileTypes:
         ) from exc
 
 
+# Parsers and serializers are imported the first time they're used, so
+# processes that never read (or write) a given format don't import them
+
+
 def _load_toml(location: pathlib.Path) -> dict:
+    import toml
 
     return cast(dict, toml.load(location))
 
 
+def _dump_toml(data: dict, location: pathlib.Path) -> None:
+    from dotcfg import serializers
+
+    with open(location, "w") as f:
+        serializers.dump_toml(data, f)
+
+
+def _dump_json(data: dict, location: pathlib.Path) -> None:
+    from dotcfg import serializers
+
+    with open(location, "w") as f:
+        serializers.dump_json(data, f)
+
+
 def _load_json(location: pathlib.Path) -> dict:
+    import json
+
     with open(location) as f:
         data = json.load(f)
 
@@ -82,3 +375,15 @@ def _load_json(location: pathlib.Path) -> dict:
         )
 
     return data
+
+
+def _load_dcfg(location: pathlib.Path) -> dict:
+    from dotcfg import binary
+
+    return binary.load(location)
+
+
+def _dump_dcfg(data: dict, location: pathlib.Path) -> None:
+    from dotcfg import binary
+
+    binary.dump(data, location)
@@ -14,3 +14,38 @@ class UnsupportedConfiguration(ConfigurationError):
     Raised if the contents of a configuration file
     are unsupported in some way
     """
+
+
+class CircularInclude(ConfigurationError):
+    """
+    Raised if configuration files (directly or indirectly)
+    include themselves
+    """
+
+
+class ResolverError(ConfigurationError):
+    """
+    Raised if a namespaced reference (such as `${file:...}`)
+    can't be resolved
+    """
+
+
+class UnknownConfigVersion(ConfigurationError):
+    """
+    Raised if a `ConfigRef` is resolved in a process that doesn't
+    hold the version of the configuration it refers to
+    """
+
+
+class RemoteSourceError(ConfigurationError):
+    """
+    Raised if a configuration can't be loaded from a URL,
+    and there's no cached copy of it to fall back on
+    """
+
+
+class ProvenanceNotTracked(ConfigurationError):
+    """
+    Raised if `Config.explain` is called on a configuration that
+    wasn't loaded with `track_provenance=True`
+    """
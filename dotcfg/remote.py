@@ -0,0 +1,458 @@
+"""
+HTTP(S) configuration sources, such as a central configuration service.
+`load_configuration` accepts `http://` and `https://` URLs alongside paths.
+
+Responses are cached on disk along with their `ETag` and `Last-Modified`
+headers. Later loads (including after a restart) make a conditional request,
+so an unchanged configuration only costs a `304 Not Modified`. If the service
+can't be reached, the cached copy is used instead.
+
+To avoid stampeding the service when many processes start at once:
+
+- Connections are kept open and reused for later requests to the same host.
+- Processes on the same machine loading the same URL at the same time share
+  a single request; the others wait for it and use its result.
+- Failed requests are retried with jittered exponential backoff, and
+  `Retry-After` is honored.
+"""
+import email.utils
+import hashlib
+import http.client
+import json
+import os
+import pathlib
+import random
+import tempfile
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple, Union, cast
+
+from dotcfg import engine, errors
+from dotcfg.sources import ConfigSource
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
+URL_SCHEMES = ("http://", "https://")
+
+# Overrides where responses are cached
+CACHE_DIR_ENV_VAR = "DOTCFG_HTTP_CACHE_DIR"
+
+_CONTENT_TYPES = {
+    "application/json": engine.SupportedFileTypes.JSON,
+    "application/toml": engine.SupportedFileTypes.TOML,
+    "text/x-toml": engine.SupportedFileTypes.TOML,
+}
+
+
+def is_url(path: Any) -> bool:
+    """Whether `path` is an HTTP(S) URL, rather than a path on disk"""
+    return isinstance(path, str) and path.lower().startswith(URL_SCHEMES)
+
+
+def default_cache_dir() -> pathlib.Path:
+    """
+    Directory HTTP responses are cached in: `$DOTCFG_HTTP_CACHE_DIR` if it's
+    set, otherwise `dotcfg/http` in the user's cache directory.
+    """
+    if os.environ.get(CACHE_DIR_ENV_VAR):
+        return pathlib.Path(os.environ[CACHE_DIR_ENV_VAR])
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join("~", ".cache")
+    return pathlib.Path(base).expanduser() / "dotcfg" / "http"
+
+
+class _ConnectionPool:
+    """Idle connections, by scheme, host and port"""
+
+    def __init__(self) -> None:
+        self._idle: Dict[Tuple[str, str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme: str, host: str, port: int, timeout: float) -> Any:
+        """Returns an idle connection (and whether it was reused), or a new one"""
+        with self._lock:
+            idle = self._idle.get((scheme, host, port))
+            if idle:
+                connection = idle.pop()
+                connection.timeout = timeout
+                return connection, True
+        cls = (
+            http.client.HTTPSConnection
+            if scheme == "https"
+            else http.client.HTTPConnection
+        )
+        return cls(host, port, timeout=timeout), False
+
+    def put(self, scheme: str, host: str, port: int, connection: Any) -> None:
+        with self._lock:
+            self._idle.setdefault((scheme, host, port), []).append(connection)
+
+    def clear(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                for connection in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+_POOL = _ConnectionPool()
+
+
+class _Response:
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    # Either a number of seconds, or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+class HttpSource(ConfigSource):
+    """
+    A configuration file served over HTTP(S).
+
+    Example:
+
+        ```python
+        source = HttpSource("https://config.internal/services/api.json")
+        contents = source.load()
+        source.from_cache  # Whether the service was unreachable
+        ```
+
+    Args:
+        - url (str): URL of the configuration
+        - cache_dir (Optional[Union[str, pathlib.Path]]): Directory to cache
+            responses in. Defaults to `default_cache_dir()`.
+        - file_type (engine.SupportedFileTypes): Type of the configuration.
+            If not provided, it's inferred from the response's `Content-Type`
+            or the URL's extension.
+        - timeout (float): Seconds to wait to connect, and for each read
+        - max_attempts (int): Number of requests made before giving up (and
+            using the cached copy, if there is one)
+        - backoff (float): Seconds to wait (at most) before the first retry,
+            doubled for every retry after it
+        - max_backoff (float): Longest wait between retries
+        - share_window (float): Seconds for which a response fetched by another
+            process on this machine is used instead of making another request
+        - headers (Optional[Dict[str, str]]): Extra headers sent with every
+            request, such as `Authorization`
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        cache_dir: Optional[Union[str, pathlib.Path]] = None,
+        file_type: engine.SupportedFileTypes = engine.SupportedFileTypes.AUTO,
+        timeout: float = 5.0,
+        max_attempts: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        share_window: float = 1.0,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"{url!r} isn't an HTTP(S) URL")
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.url = url
+        self.cache_dir = pathlib.Path(cache_dir or default_cache_dir())
+        self.file_type = file_type
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.share_window = share_window
+        self.headers = dict(headers or {})
+
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port or (443 if parts.scheme == "https" else 80)
+        self._target = urllib.parse.urlunsplit(
+            ("", "", parts.path or "/", parts.query, "")
+        )
+
+        name = hashlib.sha256(url.encode()).hexdigest()
+        self._body_path = self.cache_dir / f"{name}.body"
+        self._meta_path = self.cache_dir / f"{name}.json"
+        self._lock_path = self.cache_dir / f"{name}.lock"
+        self._lock = threading.Lock()
+        # The last parsed configuration, along with the validator (ETag or
+        # Last-Modified) of the response it was parsed from
+        self._parsed: Optional[Tuple[str, dict]] = None
+
+        # Whether the last load used the cached copy because the service
+        # couldn't be reached, and why
+        self.from_cache = False
+        self.last_error: Optional[Exception] = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.url!r})"
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        # Held by one thread (and, where supported, one process) at a time
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._lock_path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != self.url or not self._body_path.exists():
+            return None
+        return meta
+
+    def _write(self, body: Optional[bytes], meta: dict) -> None:
+        # Written to temporary files and moved into place, so that other
+        # processes never see a partially written copy. The body is written
+        # first, since the metadata is what marks it as valid.
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        files = [(self._meta_path, json.dumps(meta).encode())]
+        if body is not None:
+            files.insert(0, (self._body_path, body))
+        for path, data in files:
+            fd, temporary = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temporary, path)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+
+    def _request(self, headers: Dict[str, str]) -> _Response:
+        # Retries once on a new connection if a reused one turns out to
+        # have been closed by the server
+        while True:
+            connection, reused = _POOL.get(
+                self._scheme, self._host, self._port, self.timeout
+            )
+            try:
+                connection.request("GET", self._target, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as exc:
+                connection.close()
+                if reused and isinstance(
+                    exc, (http.client.RemoteDisconnected, ConnectionError)
+                ):
+                    continue
+                raise _RetryableError(f"Request to {self.url} failed: {exc}") from exc
+
+            if response.will_close:
+                connection.close()
+            else:
+                _POOL.put(self._scheme, self._host, self._port, connection)
+            return _Response(
+                response.status,
+                {k.lower(): v for k, v in response.getheaders()},
+                body,
+            )
+
+    def _fetch(self, meta: Optional[dict]) -> _Response:
+        headers = {"Accept": "application/json, application/toml;q=0.9, */*;q=0.1"}
+        headers.update(self.headers)
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        attempt = 0
+        while True:
+            try:
+                response = self._request(headers)
+                if response.status in (408, 429) or response.status >= 500:
+                    raise _RetryableError(
+                        f"{self.url} responded with {response.status}",
+                        _retry_after(response.headers.get("retry-after")),
+                    )
+                return response
+            except _RetryableError as exc:
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                # Full jitter, so retries from many processes are spread out
+                delay = random.uniform(
+                    0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                )
+                if exc.retry_after is not None:
+                    delay = max(delay, min(exc.retry_after, self.max_backoff))
+                time.sleep(delay)
+
+    def _file_type(self, content_type: Optional[str]) -> engine.SupportedFileTypes:
+        if self.file_type != engine.SupportedFileTypes.AUTO:
+            return self.file_type
+        media_type = (content_type or "").split(";")[0].strip().lower()
+        if media_type in _CONTENT_TYPES:
+            return _CONTENT_TYPES[media_type]
+        path = urllib.parse.urlsplit(self.url).path
+        try:
+            return engine._infer_file_format(pathlib.Path(path))
+        except errors.UnsupportedFileType:
+            # Most configuration services serve JSON
+            return engine.SupportedFileTypes.JSON
+
+    def _parse(self, body: bytes, meta: dict) -> dict:
+        validator = f"{meta.get('etag')}|{meta.get('last_modified')}|{meta['sha256']}"
+        if self._parsed is not None and self._parsed[0] == validator:
+            return engine._copy_tree(self._parsed[1])
+
+        file_type = self._file_type(meta.get("content_type"))
+        text = body.decode("utf-8")
+        if file_type == engine.SupportedFileTypes.JSON:
+            contents = json.loads(text)
+        elif file_type == engine.SupportedFileTypes.TOML:
+            import toml
+
+            contents = toml.loads(text)
+        else:
+            raise errors.UnsupportedFileType(
+                f"Can't read {file_type.value} configuration from {self.url}."
+            )
+        if not isinstance(contents, dict):
+            raise errors.UnsupportedConfiguration(
+                f"Configuration read from {self.url} must be a dict."
+            )
+        if engine.INCLUDE_KEY in contents:
+            raise errors.UnsupportedConfiguration(
+                f'"{engine.INCLUDE_KEY}" isn\'t supported in configuration '
+                f"read from {self.url}."
+            )
+
+        self._parsed = (validator, contents)
+        return engine._copy_tree(contents)
+
+    def load(self) -> dict:
+        """
+        Loads the configuration, revalidating the cached copy (if there is one).
+
+        Raises:
+            - RemoteSourceError: If the configuration couldn't be fetched and
+                there's no cached copy of it, or if the service responded with
+                an error that retrying won't fix (such as `404 Not Found`)
+            - UnsupportedConfiguration: If the response isn't a dictionary
+
+        Returns:
+            - dict: Contents of the configuration
+        """
+        with self._exclusive():
+            meta = self._read_meta()
+            if (
+                meta is not None
+                and time.time() - meta["fetched_at"] < self.share_window
+            ):
+                # Just fetched (or revalidated) by another process
+                self.from_cache, self.last_error = False, None
+                return self._parse(self._body_path.read_bytes(), meta)
+
+            try:
+                response = self._fetch(meta)
+            except _RetryableError as exc:
+                if meta is None:
+                    raise errors.RemoteSourceError(
+                        f"Couldn't load configuration from {self.url}, and "
+                        f"there's no cached copy of it: {exc}"
+                    ) from exc
+                self.from_cache, self.last_error = True, exc
+                return self._parse(self._body_path.read_bytes(), meta)
+
+            self.from_cache, self.last_error = False, None
+            if response.status == 304 and meta is not None:
+                meta["fetched_at"] = time.time()
+                self._write(None, meta)
+                return self._parse(self._body_path.read_bytes(), meta)
+            if response.status != 200:
+                raise errors.RemoteSourceError(
+                    f"{self.url} responded with {response.status}."
+                )
+
+            meta = {
+                "url": self.url,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "content_type": response.headers.get("content-type"),
+                "sha256": hashlib.sha256(response.body).hexdigest(),
+                "fetched_at": time.time(),
+            }
+            contents = self._parse(response.body, meta)
+            self._write(response.body, meta)
+            return contents
+
+    def version(self) -> Hashable:
+        """
+        Revalidates the cached copy (which costs a conditional request, unless
+        it was fetched within `share_window`), and returns its validators
+        along with a digest of it.
+        """
+        return self.load_with_version()[0]
+
+    def load_with_version(self) -> Tuple[Hashable, dict]:
+        contents = self.load()
+        return cast(Tuple[str, dict], self._parsed)[0], contents
+
+
+# Sources created for URLs passed to `load_configuration`, so that each URL's
+# last parsed configuration is kept between loads
+_SOURCES: Dict[Tuple[str, pathlib.Path, engine.SupportedFileTypes], HttpSource] = {}
+_SOURCES_LOCK = threading.Lock()
+
+
+def load_url(
+    url: str, file_type: engine.SupportedFileTypes = engine.SupportedFileTypes.AUTO
+) -> dict:
+    """
+    Loads a configuration from a URL with the default settings of
+    `HttpSource`. Used by `load_configuration` for URLs.
+
+    Args:
+        - url (str): URL of the configuration
+        - file_type (engine.SupportedFileTypes): Type of the configuration
+
+    Returns:
+        - dict: Contents of the configuration
+    """
+    key = (url, default_cache_dir(), file_type)
+    with _SOURCES_LOCK:
+        source = _SOURCES.get(key)
+        if source is None:
+            source = _SOURCES[key] = HttpSource(
+                url, cache_dir=key[1], file_type=file_type
+            )
+    return source.load()
@@ -0,0 +1,179 @@
+"""
+Resolvers for namespaced references, such as `${env:HOME}` or
+`${file:/run/secrets/db_password}`.
+
+References without a (registered) namespace are looked up elsewhere in the
+configuration. Namespaced references are instead passed to the function
+registered for that namespace, with everything after the `:` as its
+argument.
+"""
+import os
+import re
+import shlex
+import subprocess
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from dotcfg import errors
+
+NAMESPACE_REGEX = re.compile(r"^([A-Za-z_][\w-]*):(.*)$", re.DOTALL)
+
+
+class Resolver(NamedTuple):
+
+    function: Callable[..., Any]
+    # Batch resolvers are called once with every argument referenced during
+    # a load, and return a mapping of each argument to its value.
+    batch: bool
+    # Whether results are reused for the rest of a load
+    memoize: bool
+
+
+_RESOLVERS: Dict[str, Resolver] = {}
+
+
+def register_resolver(
+    namespace: str,
+    function: Callable[..., Any],
+    *,
+    batch: bool = False,
+    memoize: bool = True,
+) -> None:
+    """
+    Registers a function to resolve references in a namespace. For example,
+    after registering a function for the `vault` namespace, the reference
+    `${vault:database/password}` will be replaced with the result of calling
+    it with `"database/password"`.
+
+    Args:
+        - namespace (str): Namespace of the references to resolve. Replaces
+            any resolver already registered for the namespace.
+        - function (Callable): Function taking the reference's argument (everything
+            after the `:`) and returning its value. If `batch` is set, the function
+            takes a list of arguments instead, and returns a mapping of each
+            argument to its value.
+        - batch (bool): Whether the function resolves every reference in a
+            namespace at once, rather than one at a time.
+        - memoize (bool): Whether results are reused when the same reference
+            appears more than once while loading a configuration.
+    """
+    if not NAMESPACE_REGEX.match(f"{namespace}:"):
+        raise ValueError(f"Invalid resolver namespace: {namespace!r}")
+    _RESOLVERS[namespace] = Resolver(function, batch=batch, memoize=memoize)
+
+
+def unregister_resolver(namespace: str) -> None:
+    """Removes the resolver registered for a namespace, if there is one"""
+    _RESOLVERS.pop(namespace, None)
+
+
+def parse_reference(reference: str) -> Optional[Tuple[str, str]]:
+    """
+    Splits the inside of a reference (without the `${}`) into its
+    namespace and argument.
+
+    Returns:
+        - Optional[Tuple[str, str]]: Namespace and argument, or `None` if
+            the reference doesn't use a registered namespace
+    """
+    match = NAMESPACE_REGEX.match(reference)
+    if match is None or match.group(1) not in _RESOLVERS:
+        return None
+    return match.group(1), match.group(2)
+
+
+class ResolutionContext:
+    """
+    Resolves namespaced references for a single load of a configuration,
+    remembering the results so a reference that's used many times is only
+    resolved once.
+    """
+
+    def __init__(self) -> None:
+        self._results: Dict[Tuple[str, str], Any] = {}
+
+    def prefetch(self, references: Iterable[Tuple[str, str]]) -> None:
+        """
+        Resolves every (namespace, argument) pair that belongs to a batch
+        resolver, calling each batch resolver only once.
+        """
+        pending: Dict[str, Set[str]] = {}
+        for namespace, argument in references:
+            resolver = _RESOLVERS.get(namespace)
+            if (
+                resolver is not None
+                and resolver.batch
+                and (namespace, argument) not in self._results
+            ):
+                pending.setdefault(namespace, set()).add(argument)
+
+        for namespace, arguments in pending.items():
+            results = self._call(namespace, sorted(arguments))
+            for argument in arguments:
+                self._results[(namespace, argument)] = results.get(argument, "")
+
+    def resolve(self, namespace: str, argument: str) -> Any:
+        """Resolves a single reference"""
+        key = (namespace, argument)
+        if key in self._results:
+            return self._results[key]
+
+        resolver = _RESOLVERS[namespace]
+        if resolver.batch:
+            value = self._call(namespace, [argument]).get(argument, "")
+        else:
+            value = self._call(namespace, argument)
+
+        if resolver.memoize:
+            self._results[key] = value
+        return value
+
+    @staticmethod
+    def _call(namespace: str, argument: Any) -> Any:
+        try:
+            return _RESOLVERS[namespace].function(argument)
+        except Exception as exc:
+            raise errors.ResolverError(
+                f'Failed to resolve "{namespace}" reference {argument!r}: {exc}'
+            ) from exc
+
+
+def resolve_env(name: str) -> str:
+    """
+    Resolves `${env:NAME}` to the value of an environment variable, or an
+    empty string if it isn't set.
+    """
+    return os.environ.get(name, "")
+
+
+def resolve_file(path: str) -> str:
+    """
+    Resolves `${file:/path/to/file}` to the contents of a file, without any
+    trailing newlines (such as mounted secrets).
+    """
+    with open(os.path.expanduser(path)) as f:
+        return f.read().rstrip("\r\n")
+
+
+def resolve_cmd(command: str) -> str:
+    """
+    Resolves `${cmd:command --with args}` to the output of running a command,
+    without any trailing newlines.
+
+    Since it runs arbitrary commands found in the configuration, this
+    resolver isn't registered by default. To enable it:
+
+        ```python
+        register_resolver("cmd", resolve_cmd)
+        ```
+    """
+    result = subprocess.run(
+        shlex.split(command),
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    return result.stdout.rstrip("\r\n")
+
+
+register_resolver("env", resolve_env)
+register_resolver("file", resolve_file)
@@ -0,0 +1,225 @@
+"""
+Secret providers, used to resolve `${secret:name}` references.
+
+Every secret referenced by a configuration is fetched in a single batched
+call per load. Wrapping a provider in a `CachedSecretProvider` keeps secrets
+in memory for a TTL, and refreshes them in the background before they
+expire so loads (and reloads) don't wait on the backing store.
+
+Secrets are stored in a configuration as plain values when it's loaded, so
+refreshed secrets are only seen by configurations loaded afterwards.
+"""
+import abc
+import pathlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from dotcfg import resolvers
+
+SECRET_NAMESPACE = "secret"
+
+
+class SecretProvider(abc.ABC):
+    """
+    Fetches secrets by name. Implementations only need to provide
+    `fetch_many`, which should retrieve all of the requested secrets
+    in as few round trips to the backing store as possible.
+    """
+
+    @abc.abstractmethod
+    def fetch_many(self, names: Sequence[str]) -> Dict[str, str]:
+        """
+        Fetches several secrets at once.
+
+        Args:
+            - names (Sequence[str]): Names of the secrets to fetch
+
+        Returns:
+            - Dict[str, str]: Value of each secret that exists. Missing
+                secrets are left out.
+        """
+
+    def fetch(self, name: str) -> Optional[str]:
+        """Fetches a single secret, returning `None` if it doesn't exist"""
+        return self.fetch_many([name]).get(name)
+
+
+class FileSecretProvider(SecretProvider):
+    """
+    Reads each secret from a file of the same name in `directory`, the way
+    Docker and Kubernetes mount secrets. Mostly useful for local development
+    and tests.
+    """
+
+    def __init__(self, directory: Union[str, pathlib.Path]) -> None:
+        self.directory = pathlib.Path(directory).resolve()
+
+    def _path(self, name: str) -> pathlib.Path:
+        path = (self.directory / name).resolve()
+        if self.directory not in path.parents:
+            raise ValueError(f"Secret name {name!r} is outside of {self.directory}")
+        return path
+
+    def fetch_many(self, names: Sequence[str]) -> Dict[str, str]:
+        secrets = {}
+        for name in names:
+            path = self._path(name)
+            if path.is_file():
+                secrets[name] = path.read_text().rstrip("\r\n")
+        return secrets
+
+
+class CachedSecretProvider(SecretProvider):
+    """
+    Caches the secrets fetched from another provider for `ttl` seconds.
+
+    Once started, a background thread refreshes every cached secret that is
+    within `refresh_before` seconds of expiring (in one batched call), so
+    secrets in use are always served from memory. Only secrets requested
+    within the last `ttl` seconds are refreshed; others are dropped once
+    they expire. If a refresh fails, the cached values are kept until they
+    expire and `last_error` is set.
+
+    Refreshing only updates the cache. Configurations loaded before a secret
+    was rotated keep its old value until they're loaded again (with
+    `load_configuration`, rather than a `ConfigLoader` whose sources didn't
+    change).
+
+    Example:
+
+        ```python
+        provider = CachedSecretProvider(FileSecretProvider("/run/secrets"), ttl=300)
+        provider.start()
+        register_secret_provider(provider)
+        ```
+    """
+
+    def __init__(
+        self,
+        provider: SecretProvider,
+        ttl: float = 300,
+        refresh_before: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.provider = provider
+        self.ttl = ttl
+        # Defaults to refreshing once 80% of the TTL has passed
+        self.refresh_before = ttl * 0.2 if refresh_before is None else refresh_before
+        self.last_error: Optional[BaseException] = None
+        self._clock = clock
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        # When each secret was last requested
+        self._requested: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def fetch_many(self, names: Sequence[str]) -> Dict[str, str]:
+        now = self._clock()
+        secrets = {}
+        missing = []
+        with self._lock:
+            for name in names:
+                self._requested[name] = now
+                entry = self._entries.get(name)
+                if entry is not None and entry[1] > now:
+                    secrets[name] = entry[0]
+                else:
+                    missing.append(name)
+
+        if missing:
+            fetched = self.provider.fetch_many(missing)
+            self._store(fetched)
+            secrets.update(fetched)
+        return secrets
+
+    def get(self, name: str) -> Optional[str]:
+        """
+        Returns a cached secret without ever fetching it, even if it has
+        expired. Returns `None` if the secret was never fetched.
+        """
+        entry = self._entries.get(name)
+        return None if entry is None else entry[0]
+
+    def _store(self, secrets: Dict[str, str]) -> None:
+        expires = self._clock() + self.ttl
+        with self._lock:
+            for name, value in secrets.items():
+                self._entries[name] = (value, expires)
+
+    def _expiring(self) -> List[str]:
+        now = self._clock()
+        deadline = now + self.refresh_before
+        cutoff = now - self.ttl
+        expiring = []
+        with self._lock:
+            for name, (_, expires) in list(self._entries.items()):
+                if self._requested.get(name, cutoff) <= cutoff:
+                    # No longer in use, so it's dropped rather than refreshed
+                    if expires <= now:
+                        del self._entries[name]
+                elif expires <= deadline:
+                    expiring.append(name)
+            # Forgets older requests, including those for secrets that
+            # didn't exist
+            self._requested = {
+                name: requested
+                for name, requested in self._requested.items()
+                if requested > cutoff or name in self._entries
+            }
+        return expiring
+
+    def refresh(self, names: Optional[Iterable[str]] = None) -> None:
+        """
+        Refetches secrets (by default, those about to expire that were
+        requested within the last `ttl` seconds) in a single batched call.
+        """
+        names = self._expiring() if names is None else list(names)
+        if not names:
+            return
+        try:
+            self._store(self.provider.fetch_many(names))
+            self.last_error = None
+        except Exception as exc:
+            self.last_error = exc
+
+    def invalidate(self) -> None:
+        """Drops every cached secret"""
+        with self._lock:
+            self._entries.clear()
+            self._requested.clear()
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """
+        Starts refreshing secrets in a background (daemon) thread, checking
+        for secrets that are about to expire every `interval` seconds.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if interval is None:
+            interval = max(min(self.refresh_before, self.ttl) / 2, 0.01)
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name="dotcfg-secrets", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background refresh thread"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, interval: float) -> None:
+        while not self._stopped.wait(interval):
+            self.refresh()
+
+
+def register_secret_provider(provider: SecretProvider) -> None:
+    """
+    Resolves `${secret:name}` references with `provider`. Every secret
+    referenced while loading a configuration is fetched in a single call.
+    """
+    resolvers.register_resolver(SECRET_NAMESPACE, provider.fetch_many, batch=True)
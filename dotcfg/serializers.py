@@ -0,0 +1,390 @@
+"""
+Streaming serializers for (resolved) configurations.
+
+Each serializer walks a configuration and writes it to a file object in
+chunks, without converting it to plain dictionaries (or a string) first.
+Values can be redacted by matching their dotted paths against shell style
+patterns, such as `"*.password"` or `"secrets"`.
+"""
+import datetime
+import fnmatch
+import json
+import math
+import re
+from ast import literal_eval
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+REDACTED = "**********"
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Keys that can be written without quotes in TOML
+_BARE_TOML_KEY = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def _is_array(value: Any) -> bool:
+    # Lists, along with read only sequences such as `collections.CompactArray`
+    return isinstance(value, list) or (
+        isinstance(value, Sequence) and not isinstance(value, (str, bytes, tuple))
+    )
+
+
+def _json_default(value: Any) -> Any:
+    if _is_array(value):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_JSON_ENCODER = json.JSONEncoder(
+    ensure_ascii=False, allow_nan=True, default=_json_default
+)
+
+
+class _ChunkedWriter:
+    """Buffers small writes, and writes them to a file object in chunks"""
+
+    def __init__(self, fp: TextIO, chunk_size: int) -> None:
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self._parts: List[str] = []
+        self._size = 0
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._parts:
+            self.fp.write("".join(self._parts))
+            self._parts.clear()
+            self._size = 0
+
+
+class _Redactor:
+    """Decides which paths of a configuration are redacted"""
+
+    def __init__(self, patterns: Optional[Iterable[str]]) -> None:
+        self.patterns = list(patterns or ())
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def matches(self, path: Tuple) -> bool:
+        dotted = ".".join(str(part) for part in path)
+        return any(fnmatch.fnmatchcase(dotted, pattern) for pattern in self.patterns)
+
+
+def _items(mapping: Mapping) -> Iterator[Tuple[Any, Any]]:
+    # `dict.items` skips the per-key conversion done by `Box.__getitem__`
+    if isinstance(mapping, dict):
+        return iter(dict.items(mapping))
+    return iter(mapping.items())
+
+
+def _json_scalar(value: Any) -> str:
+    if isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    return _JSON_ENCODER.encode(value)
+
+
+def dump_json(
+    config: Mapping,
+    fp: TextIO,
+    *,
+    redact: Optional[Iterable[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """
+    Writes a configuration to a file object as (compact) JSON. Dates and
+    times are written as ISO 8601 strings.
+
+    Args:
+        - config (Mapping): Configuration to write
+        - fp (TextIO): File object to write to
+        - redact (Optional[Iterable[str]]): Patterns matching the dotted paths
+            of values (or entire sections) to replace with `REDACTED`
+        - chunk_size (int): Number of characters buffered between writes
+    """
+    out = _ChunkedWriter(fp, chunk_size)
+    redactor = _Redactor(redact)
+
+    out.write("{")
+    # Each entry is the path of a container, an iterator over its items,
+    # and whether it's a mapping (rather than a list)
+    stack: List[Tuple[Tuple, Iterator, bool]] = [((), _items(config), True)]
+    first = True
+    while stack:
+        path, items, is_mapping = stack[-1]
+        for k, v in items:
+            if not first:
+                out.write(",")
+            first = False
+
+            if is_mapping:
+                out.write(_JSON_ENCODER.encode(str(k)) + ":")
+            key = (*path, k)
+            if redactor and redactor.matches(key):
+                out.write(_json_scalar(REDACTED))
+            elif isinstance(v, Mapping):
+                out.write("{")
+                stack.append((key, _items(v), True))
+                first = True
+                break
+            elif _is_array(v):
+                out.write("[")
+                stack.append((key, enumerate(v), False))
+                first = True
+                break
+            else:
+                out.write(_json_scalar(v))
+        else:
+            stack.pop()
+            out.write("}" if is_mapping else "]")
+            first = False
+
+    out.flush()
+
+
+def _toml_key(key: Any) -> str:
+    key = str(key)
+    return key if _BARE_TOML_KEY.match(key) else _JSON_ENCODER.encode(key)
+
+
+def _toml_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "nan"
+        if math.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return repr(value)
+    if isinstance(value, (int, str)):
+        return _JSON_ENCODER.encode(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Mapping):
+        pairs = ", ".join(
+            f"{_toml_key(k)} = {_toml_value(v)}"
+            for k, v in _items(value)
+            if v is not None
+        )
+        return "{ " + pairs + " }" if pairs else "{}"
+    if isinstance(value, tuple) or _is_array(value):
+        return "[" + ", ".join(_toml_value(v) for v in value) + "]"
+    raise TypeError(f"Can't write value {value!r} of type {type(value).__name__}")
+
+
+# The path of a table (including the index of tables in arrays), its name,
+# the table, and the header to write before it (`None` for the root table)
+_TomlTable = Tuple[Tuple, str, Mapping, Optional[str]]
+
+
+def _is_table_array(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and bool(value)
+        and all(isinstance(item, Mapping) for item in value)
+    )
+
+
+def dump_toml(
+    config: Mapping,
+    fp: TextIO,
+    *,
+    redact: Optional[Iterable[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """
+    Writes a configuration to a file object as TOML. Sections are written
+    as tables, and lists of sections as arrays of tables. Like the `toml`
+    library, `None` values are left out since TOML can't represent them.
+
+    Args:
+        - config (Mapping): Configuration to write
+        - fp (TextIO): File object to write to
+        - redact (Optional[Iterable[str]]): Patterns matching the dotted paths
+            of values (or entire sections) to replace with `REDACTED`
+        - chunk_size (int): Number of characters buffered between writes
+    """
+    out = _ChunkedWriter(fp, chunk_size)
+    redactor = _Redactor(redact)
+
+    stack: List[_TomlTable] = [((), "", config, None)]
+    while stack:
+        path, name, table, header = stack.pop()
+        if header is not None:
+            out.write(header)
+
+        # TOML requires the values of a table to come before any nested tables
+        subtables: List[_TomlTable] = []
+        for k, v in _items(table):
+            key = (*path, k)
+            if v is None:
+                continue
+            if redactor and redactor.matches(key):
+                out.write(f"{_toml_key(k)} = {_toml_value(REDACTED)}\n")
+            elif isinstance(v, Mapping):
+                child = f"{name}.{_toml_key(k)}" if name else _toml_key(k)
+                subtables.append((key, child, v, f"\n[{child}]\n"))
+            elif _is_table_array(v):
+                child = f"{name}.{_toml_key(k)}" if name else _toml_key(k)
+                subtables.extend(
+                    ((*key, i), child, item, f"\n[[{child}]]\n")
+                    for i, item in enumerate(v)
+                )
+            else:
+                out.write(f"{_toml_key(k)} = {_toml_value(v)}\n")
+
+        stack.extend(reversed(subtables))
+
+    out.flush()
+
+
+def _env_name(prefix: Optional[str], path: Tuple) -> str:
+    # `load_environment_variables` lower cases names and splits them on "__",
+    # so only keys that survive both can be written.
+    for part in path:
+        if (
+            not isinstance(part, str)
+            or not part
+            or "__" in part
+            or part.startswith("_")
+            or part.endswith("_")
+            or "=" in part
+            or part.upper().lower() != part
+        ):
+            raise ValueError(
+                f"Key {part!r} of {'.'.join(map(str, path))} can't be represented "
+                "as an environment variable."
+            )
+    name = "__".join(path).upper()
+    return f"{prefix}__{name}" if prefix else name
+
+
+def _literal(value: Any) -> str:
+    # Like `repr`, but for Box's containers (whose `repr` can't be read back
+    # with `literal_eval`), and for infinite floats.
+    if isinstance(value, float):
+        if math.isnan(value):
+            raise ValueError("NaN can't be represented as an environment variable.")
+        if math.isinf(value):
+            return "1e999" if value > 0 else "-1e999"
+        return repr(value)
+    if value is None or isinstance(value, (str, bytes, int, complex)):
+        return repr(value)
+    if isinstance(value, Mapping):
+        pairs = (f"{_literal(k)}: {_literal(v)}" for k, v in _items(value))
+        return "{" + ", ".join(pairs) + "}"
+    if _is_array(value):
+        return "[" + ", ".join(_literal(v) for v in value) + "]"
+    if isinstance(value, tuple):
+        return "(" + "".join(f"{_literal(v)}, " for v in value) + ")"
+    raise ValueError(
+        f"Value {value!r} of type {type(value).__name__} can't be represented "
+        "as an environment variable."
+    )
+
+
+def _reads_back_unchanged(value: str) -> bool:
+    # Whether `string_to_type` (after environment variables and "~" are
+    # expanded) would return the string as is
+    if "$" in value or value.startswith("~") or value.upper() in ("TRUE", "FALSE"):
+        return False
+    try:
+        literal_eval(value)
+    except Exception:
+        return True
+    return False
+
+
+def encode_env_value(value: Any) -> str:
+    """
+    Encodes a value as the contents of an environment variable, such that
+    `load_environment_variables` reads back an equal value (of the same type).
+
+    Strings are written as is whenever possible. Anything else, including
+    strings that would otherwise be read back as another type, is written as
+    a Python literal. Dollar signs inside literals are escaped, so they can't
+    be expanded as references to other environment variables.
+
+    Raises:
+        - ValueError: If the value can't be represented (such as dates or NaN)
+    """
+    if isinstance(value, str) and _reads_back_unchanged(value):
+        text = value
+    else:
+        text = _literal(value).replace("$", "\\x24")
+    # Escape sequences are decoded when environment variables are read
+    return text.encode("unicode_escape").decode("ascii")
+
+
+def environ_items(
+    config: Mapping,
+    prefix: Optional[str] = None,
+    redact: Optional[Iterable[str]] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yields the name and encoded value of the environment variable for every
+    value of a configuration. Empty sections are written as `{}`.
+
+    Raises:
+        - ValueError: If a key or value can't be represented
+    """
+    redactor = _Redactor(redact)
+
+    stack: List[Tuple[Tuple, Iterator]] = [((), _items(config))]
+    while stack:
+        path, items = stack[-1]
+        for k, v in items:
+            key = (*path, k)
+            if redactor and redactor.matches(key):
+                v = REDACTED
+            elif isinstance(v, Mapping) and v:
+                stack.append((key, _items(v)))
+                break
+            yield _env_name(prefix, key), encode_env_value(v)
+        else:
+            stack.pop()
+
+
+def dump_env(
+    config: Mapping,
+    fp: TextIO,
+    *,
+    prefix: Optional[str] = None,
+    redact: Optional[Iterable[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """
+    Writes a configuration to a file object as `KEY=VALUE` lines, named
+    the way `load_environment_variables` expects (`PREFIX__SECTION__KEY`).
+    Values are encoded with `encode_env_value`.
+
+    Args:
+        - config (Mapping): Configuration to write
+        - fp (TextIO): File object to write to
+        - prefix (Optional[str]): Prefix of every variable's name
+        - redact (Optional[Iterable[str]]): Patterns matching the dotted paths
+            of values (or entire sections) to replace with `REDACTED`
+        - chunk_size (int): Number of characters buffered between writes
+
+    Raises:
+        - ValueError: If a key or value can't be represented
+    """
+    out = _ChunkedWriter(fp, chunk_size)
+    for name, value in environ_items(config, prefix, redact):
+        out.write(f"{name}={value}\n")
+    out.flush()
@@ -0,0 +1,354 @@
+"""
+Sources of configuration layers, each of which can report a cheap version
+token, so that reloads can skip the sources that haven't changed.
+
+    loader = ConfigLoader(
+        DirectorySource("conf.d"),
+        FileSource("overrides.toml"),
+        EnvSource("MYAPP"),
+    )
+    config = loader.load()
+    ...
+    config = loader.load()  # Only re-reads the sources that changed
+
+`load_configuration` accepts sources alongside paths as well.
+"""
+import abc
+import itertools
+import os
+import pathlib
+import threading
+from typing import Callable, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from dotcfg import collections, configuration, engine, errors
+from dotcfg.types import ConfigPath, StrPath
+
+
+class ConfigSource(abc.ABC):
+    """
+    A layer of configuration, such as a file or the environment.
+    Implementations provide `load` and `version`.
+    """
+
+    @abc.abstractmethod
+    def load(self) -> dict:
+        """
+        Reads the layer.
+
+        Returns:
+            - dict: Nested configuration, which callers don't modify
+        """
+
+    @abc.abstractmethod
+    def version(self) -> Hashable:
+        """
+        Returns a token that changes whenever the layer does, which should
+        be much cheaper to compute than loading the layer.
+        """
+
+    def changed_since(self, version: Hashable) -> bool:
+        """Whether the layer changed since `version` was returned by `version`"""
+        return self.version() != version
+
+    def load_with_version(self) -> Tuple[Hashable, dict]:
+        """
+        Reads the layer along with its version. The version is taken first,
+        so a change made while loading is picked up by the next check.
+        Sources that learn the version while loading can override this.
+        """
+        version = self.version()
+        return version, self.load()
+
+
+def _stat_token(paths: Iterable[pathlib.Path]) -> Tuple:
+    # Each path is only listed once, in sorted order, so the token doesn't
+    # depend on the order files were found or read in
+    token: List[Tuple] = []
+    for path in sorted(set(paths)):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            token.append((str(path), None))
+        else:
+            token.append((str(path), (stat.st_mtime_ns, stat.st_size, stat.st_ino)))
+    return tuple(token)
+
+
+class _FilesSource(ConfigSource):
+    """
+    A layer read from files, whose version is based on the modification time
+    and size of each of them. Some of the files (such as included files)
+    are only known once the layer has been loaded.
+    """
+
+    @abc.abstractmethod
+    def _paths(self) -> Iterable[pathlib.Path]:
+        """The (resolved) paths the version is based on"""
+
+    def version(self) -> Hashable:
+        return _stat_token(self._paths())
+
+    def load_with_version(self) -> Tuple[Hashable, dict]:
+        # Files that were known before loading keep the state they had then,
+        # so a change made while loading is picked up by the next check.
+        # Files only found while loading are added afterwards, so the
+        # version matches the one the next check takes.
+        before = dict(_stat_token(self._paths()))
+        layer = self.load()
+        after = _stat_token(self._paths())
+        version = tuple((path, before.get(path, stat)) for path, stat in after)
+        return version, layer
+
+
+class FileSource(_FilesSource):
+    """
+    A configuration file, along with any files it includes. Its version is
+    based on the modification time and size of each of those files.
+
+    Args:
+        - path (StrPath): Location of the file
+        - file_type (engine.SupportedFileTypes): Type of the file. If not
+            provided, it's inferred from the file's extension.
+    """
+
+    def __init__(
+        self,
+        path: StrPath,
+        file_type: engine.SupportedFileTypes = engine.SupportedFileTypes.AUTO,
+    ) -> None:
+        # Resolved the same way as the files `load` reads
+        self.path = pathlib.Path(path).resolve()
+        self.file_type = file_type
+        # Files read by the last load (including included files)
+        self._files = [self.path]
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.path)!r})"
+
+    def load(self) -> dict:
+        if not self.path.exists():
+            raise FileNotFoundError(
+                f"Configuration file {self.path} was specified but does not exist."
+            )
+        layers, self._files = engine._read_with_includes([self.path], self.file_type)
+        return configuration._merge_layers(layers)
+
+    def _paths(self) -> Iterable[pathlib.Path]:
+        return self._files
+
+
+class DirectorySource(_FilesSource):
+    """
+    Every configuration file in a directory (such as `conf.d`), merged in
+    order of their names. Files with unsupported extensions are skipped.
+
+    Args:
+        - directory (StrPath): Location of the directory
+        - pattern (str): Glob pattern the names of files must match
+    """
+
+    def __init__(self, directory: StrPath, pattern: str = "*") -> None:
+        # Resolved the same way as the files `load` reads
+        self.directory = pathlib.Path(directory).resolve()
+        self.pattern = pattern
+        # Files read by the last load (including included files), if any
+        self._included: Optional[List[pathlib.Path]] = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({str(self.directory)!r})"
+
+    def _files(self) -> List[pathlib.Path]:
+        files = []
+        for path in sorted(self.directory.glob(self.pattern)):
+            try:
+                engine._infer_file_format(path)
+            except errors.UnsupportedFileType:
+                continue
+            if path.is_file():
+                files.append(path)
+        return files
+
+    def load(self) -> dict:
+        if not self.directory.is_dir():
+            raise FileNotFoundError(
+                f"Configuration directory {self.directory} was specified but "
+                "does not exist."
+            )
+        layers, self._included = engine._read_with_includes(
+            self._files(), engine.SupportedFileTypes.AUTO
+        )
+        return configuration._merge_layers(layers)
+
+    def _paths(self) -> Iterable[pathlib.Path]:
+        # Includes the directory's own modification time, which changes
+        # whenever a file is added, removed or renamed. Files in it are
+        # only listed until they've been read.
+        if self._included is None:
+            files = [path.resolve() for path in self._files()]
+        else:
+            files = self._included
+        return [self.directory, *files]
+
+
+class EnvSource(ConfigSource):
+    """
+    Environment variables with a prefix, named the way
+    `configuration.load_environment_variables` expects. Its version is the
+    variables themselves, so only changes to variables with the prefix are
+    detected (not to other variables their values expand).
+
+    Args:
+        - prefix (str): Prefix of the environment variables
+    """
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.prefix!r})"
+
+    def load(self) -> dict:
+        flat = configuration.load_environment_variables(self.prefix)
+        return dict(collections.flatdict_to_dict(flat))
+
+    def version(self) -> Hashable:
+        start = self.prefix + "__"
+        return tuple(
+            sorted(item for item in os.environ.items() if item[0].startswith(start))
+        )
+
+
+class DictSource(ConfigSource):
+    """
+    An in memory configuration. Changes are made with `replace`; changes
+    made to the dictionary in place aren't detected.
+
+    Args:
+        - data (dict): Nested configuration
+    """
+
+    def __init__(self, data: dict) -> None:
+        self._data = data
+        self._version = 0
+
+    def load(self) -> dict:
+        return self._data
+
+    def version(self) -> Hashable:
+        return self._version
+
+    def replace(self, data: dict) -> None:
+        """Replaces the configuration"""
+        self._data = data
+        self._version += 1
+
+
+class CallableSource(ConfigSource):
+    """
+    A configuration returned by a function, such as one fetching it from
+    a database.
+
+    Args:
+        - function (Callable[[], dict]): Returns the configuration
+        - version (Optional[Callable[[], Hashable]]): Returns the version of
+            the configuration. If not provided, the source is assumed to have
+            changed every time it's checked.
+    """
+
+    _unversioned = itertools.count()
+
+    def __init__(
+        self,
+        function: Callable[[], dict],
+        version: Optional[Callable[[], Hashable]] = None,
+    ) -> None:
+        self.function = function
+        self._version = version
+
+    def load(self) -> dict:
+        return self.function()
+
+    def version(self) -> Hashable:
+        if self._version is None:
+            return next(self._unversioned)
+        return self._version()
+
+
+def as_source(
+    path: ConfigPath,
+    file_type: engine.SupportedFileTypes = engine.SupportedFileTypes.AUTO,
+) -> ConfigSource:
+    """
+    Converts a path (or URL) accepted by `load_configuration` to a source.
+    Sources are returned as is.
+    """
+    if isinstance(path, ConfigSource):
+        return path
+    if isinstance(path, str) and path.lower().startswith(configuration._URL_SCHEMES):
+        from dotcfg import remote
+
+        return remote.HttpSource(path, file_type=file_type)
+    return FileSource(path, file_type)
+
+
+class ConfigLoader:
+    """
+    Loads a configuration from several sources, in priority order, the same
+    way `load_configuration` does. Loading it again only re-reads the
+    sources that changed since the last load, and if none of them did, the
+    previously loaded configuration is returned (unless it was modified).
+
+    Args:
+        - *sources (ConfigPath): Sources (or paths and URLs) of each layer of
+            the configuration, in priority order
+        - replace_references (bool): Whether to resolve variable references
+        - file_type (engine.SupportedFileTypes): Type of the files given as paths
+    """
+
+    def __init__(
+        self,
+        *sources: ConfigPath,
+        replace_references: bool = True,
+        file_type: engine.SupportedFileTypes = engine.SupportedFileTypes.AUTO,
+    ) -> None:
+        self.sources = [as_source(source, file_type) for source in sources]
+        self.replace_references = replace_references
+        # The version and contents of each source, as of the last load
+        self._layers: List[Optional[Tuple[Hashable, dict]]] = [None] * len(self.sources)
+        # The last configuration loaded, along with its version at the time
+        self._config: Optional[Tuple[collections.Config, int]] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> bool:
+        # Re-reads the sources that changed, returning whether any did
+        changed = False
+        for i, source in enumerate(self.sources):
+            layer = self._layers[i]
+            if layer is not None and not source.changed_since(layer[0]):
+                continue
+            self._layers[i] = source.load_with_version()
+            changed = True
+        return changed
+
+    def load(self) -> collections.Config:
+        """
+        Loads the configuration, re-reading only the sources that changed.
+
+        Returns:
+            - collections.Config: The configuration
+        """
+        with self._lock:
+            changed = self._refresh()
+            if not changed and self._config is not None:
+                config, version = self._config
+                if config._state().version == version:
+                    return config
+
+            layers = [layer for _, layer in self._layers]  # type: ignore
+            config = configuration.interpolate_config(
+                configuration._merge_layers(layers),
+                replace_references=self.replace_references,
+            )
+            configuration.validate_config(config)
+            self._config = (config, config._state().version)
+            return config
@@ -0,0 +1,285 @@
+"""
+Lazily built configurations for many tenants (customers, sites, etc.) built
+from one base configuration, each with its own overlay applied to it.
+
+    tenants = TenantConfigCache(
+        ["base.toml", "defaults.toml"],
+        "tenants/{tenant}.toml",
+        max_bytes=512 * 2**20,
+    )
+    tenants.get("acme").database.host
+
+The base is only read, merged and interpolated once (see
+`configuration.load_variants`). Each tenant's configuration is built the
+first time it's requested, and the least recently used ones are evicted once
+the configurations kept exceed a memory budget. Every tenant gets its own
+copy of each section of the base (only values are shared), so a tenant
+costs nearly as much memory as a complete configuration.
+"""
+import os
+import pathlib
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from dotcfg import collections, configuration, engine
+from dotcfg.types import ConfigPath
+
+# Returns the (nested) overlay of a tenant, or None if it doesn't have one
+OverlayLoader = Callable[[str], Optional[dict]]
+
+
+class TenantCacheInfo(NamedTuple):
+
+    hits: int
+    misses: int
+    evictions: int
+    currsize: int
+    nbytes: int
+    max_bytes: int
+
+
+def config_size(config: collections.Config, shared: Optional[Set[int]] = None) -> int:
+    """
+    Estimates the memory held by a configuration: every nested config (along
+    with the options Box keeps for it), list, key and value, each counted
+    once. Objects whose `id` is in `shared` (such as values shared with a
+    base configuration) aren't counted.
+
+    Args:
+        - config (collections.Config): Configuration to measure
+        - shared (Optional[Set[int]]): Ids of objects that aren't counted
+
+    Returns:
+        - int: Estimated size in bytes
+    """
+    seen: Set[int] = set(shared or ())
+    total = 0
+    stack: list = [config]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        total += sys.getsizeof(value)
+        if isinstance(value, dict):
+            if isinstance(value, collections.Config):
+                box_config = value._box_config
+                total += sys.getsizeof(box_config)
+                total += sys.getsizeof(box_config["__safe_keys"])
+            stack.extend(dict.keys(value))
+            stack.extend(dict.values(value))
+        elif isinstance(value, list):
+            stack.extend(value)
+    return total
+
+
+class TenantConfigCache:
+    """
+    Builds the configuration of each tenant the first time it's requested,
+    by applying its overlay to a shared base configuration, and keeps the
+    most recently used ones within a memory budget.
+
+    Concurrent requests for a tenant that isn't cached yet wait for a single
+    build rather than each building it. Configurations are shared by every
+    caller and should be treated as read only; one that's modified anyway is
+    rebuilt the next time it's requested.
+
+    Args:
+        - base_paths (Sequence[ConfigPath]): Paths to configuration shared by
+            every tenant, in priority order
+        - overlays (Union[str, OverlayLoader]): Either the path of each
+            tenant's overlay, with `{tenant}` in place of the tenant (tenants
+            without a file only get the base configuration), or a function
+            returning the (nested) overlay of a tenant, or None
+        - max_bytes (int): Estimated memory (see `config_size`) the cached
+            configurations are kept within. Values shared with the base
+            configuration aren't counted, but each configuration's sections
+            (copies of the base's, even if the overlay didn't change them)
+            are.
+        - env_var_prefix (Optional[str]): An environment variable prefix
+            to read values from. Applies to every tenant.
+        - replace_references (bool): Whether to resolve variable references
+            (per tenant) after loading.
+        - file_type (engine.SupportedFileType): Explicitly set the type of the
+            files being read. If not provided, attempts to autodiscover will occur.
+    """
+
+    def __init__(
+        self,
+        base_paths: Sequence[ConfigPath],
+        overlays: Union[str, OverlayLoader],
+        *,
+        max_bytes: int = 256 * 2**20,
+        env_var_prefix: Optional[str] = None,
+        replace_references: bool = True,
+        file_type: engine.SupportedFileTypes = engine.SupportedFileTypes.AUTO,
+    ) -> None:
+        self.overlays = overlays
+        self.max_bytes = max_bytes
+        self.file_type = file_type
+        self._base = configuration._VariantBase(
+            configuration._merge_layers(
+                configuration._read_layers(base_paths, file_type)
+            ),
+            env_vars=(
+                configuration.load_environment_variables(env_var_prefix)
+                if env_var_prefix is not None
+                else {}
+            ),
+            replace_references=replace_references,
+        )
+        # Keys and values of the base, which every tenant's config shares
+        self._shared: Set[int] = set()
+        for key, value in collections._leaves(self._base.tree):
+            self._shared.update(map(id, key))
+            self._shared.add(id(value))
+
+        # Each cached config, along with its size and version when cached
+        self._entries: "OrderedDict[str, Tuple[collections.Config, int, int]]" = (
+            OrderedDict()
+        )
+        self._nbytes = 0
+        # Builds in progress, which other requests for the tenant wait on
+        self._building: Dict[str, Future] = {}
+        # Incremented by `invalidate`, so builds started before it aren't cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _overlay(self, tenant: str) -> dict:
+        if not isinstance(self.overlays, str):
+            return self.overlays(tenant) or {}
+
+        if tenant in ("", ".", "..") or "/" in tenant or os.sep in tenant:
+            raise ValueError(f"Invalid tenant {tenant!r}")
+        location = pathlib.Path(self.overlays.format(tenant=tenant))
+        if not location.exists():
+            return {}
+        return configuration._merge_layers(
+            configuration._read_layers([location], self.file_type)
+        )
+
+    def build(self, tenant: str) -> collections.Config:
+        """
+        Builds the configuration of a tenant, without caching it.
+
+        Args:
+            - tenant (str): The tenant
+
+        Returns:
+            - collections.Config: The tenant's configuration
+        """
+        return self._base.build(self._overlay(tenant))
+
+    def get(self, tenant: str) -> collections.Config:
+        """
+        Returns the configuration of a tenant, building it if it isn't cached.
+
+        Args:
+            - tenant (str): The tenant
+
+        Returns:
+            - collections.Config: The tenant's (shared) configuration
+        """
+        with self._lock:
+            entry = self._entries.get(tenant)
+            if entry is not None:
+                config, size, version = entry
+                if config._state().version == version:
+                    self._entries.move_to_end(tenant)
+                    self.hits += 1
+                    return config
+                # Modified since it was cached
+                del self._entries[tenant]
+                self._nbytes -= size
+
+            future = self._building.get(tenant)
+            building = future is None
+            if future is None:
+                self.misses += 1
+                future = self._building[tenant] = Future()
+                generation = self._generation
+            else:
+                # Waiting on another request's build counts as a hit
+                self.hits += 1
+        if not building:
+            return future.result()
+
+        try:
+            config = self.build(tenant)
+            size = config_size(config, self._shared)
+        except BaseException as exc:
+            with self._lock:
+                del self._building[tenant]
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._building[tenant]
+            if generation == self._generation:
+                self._store(tenant, config, size)
+        future.set_result(config)
+        return config
+
+    def _store(self, tenant: str, config: collections.Config, size: int) -> None:
+        if size > self.max_bytes:
+            # Would evict everything else, and itself
+            return
+        self._entries[tenant] = (config, size, config._state().version)
+        self._nbytes += size
+        while self._nbytes > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._nbytes -= evicted
+            self.evictions += 1
+
+    def invalidate(self, tenant: Optional[str] = None) -> None:
+        """
+        Discards the cached configuration of a tenant (or of every tenant),
+        such as after its overlay changed.
+
+        Args:
+            - tenant (Optional[str]): The tenant. If not provided, every
+                tenant's configuration is discarded.
+        """
+        with self._lock:
+            self._generation += 1
+            if tenant is None:
+                self._entries.clear()
+                self._nbytes = 0
+                return
+            entry = self._entries.pop(tenant, None)
+            if entry is not None:
+                self._nbytes -= entry[1]
+
+    def info(self) -> TenantCacheInfo:
+        """Returns hit / miss / eviction statistics and the size of the cache"""
+        with self._lock:
+            return TenantCacheInfo(
+                self.hits,
+                self.misses,
+                self.evictions,
+                len(self._entries),
+                self._nbytes,
+                self.max_bytes,
+            )
+
+    def __contains__(self, tenant: Any) -> bool:
+        return tenant in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
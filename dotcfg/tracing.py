@@ -0,0 +1,313 @@
+"""
+Opt-in tracing of which configuration keys are read, how often, and from
+where, to find hot keys (worth preloading or freezing) and keys that are
+never read at all (worth removing).
+
+Tracing is implemented by switching the class of traced `Config` nodes to
+`TracedConfig`, so configs that aren't being traced don't pay anything.
+
+Every `interval` seconds, every node is traced for a short sampling window
+(`sample_rate` of the time). Reads during the window are counted, along
+with where they came from, and scaled up to estimate the total number of
+reads. Keys that weren't read during any window are reported as dead.
+
+Since a rarely read key can fall between windows, `exact_dead_keys` also
+traces each node outside of the windows until every one of its keys has
+been read once, after which it's switched back to a plain `Config`. This is
+exact, but nodes with keys that are never read stay traced.
+
+Reads that bypass `Config.__getitem__` (such as `get_path`, `flat_view`
+or copying a section with `dict(...)`) aren't traced.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import box
+
+from dotcfg import collections
+
+# Frames from these files are skipped when looking for the code that read a key
+_INTERNAL_FILES = (
+    os.path.dirname(box.__file__) + os.sep,
+    collections.__file__,
+    __file__,
+)
+
+
+class KeyStats(NamedTuple):
+
+    path: collections.CompoundKey
+    # Reads counted during sampling windows
+    sampled_reads: int
+    # `sampled_reads` scaled up to the entire time spent tracing
+    estimated_reads: float
+    # Most common locations ("file:line") the key was read from
+    callers: List[Tuple[str, int]]
+
+
+class AccessReport(NamedTuple):
+
+    # Most read keys first
+    hot: List[KeyStats]
+    # Values that haven't been read since tracing started
+    dead: List[collections.CompoundKey]
+    # Where each key that has been read was first read from
+    first_reads: Dict[collections.CompoundKey, str]
+
+
+_getitem = box.Box.__getitem__
+
+# Where a key was read from is only looked up for one in this many of its
+# sampled reads, since it's by far the most expensive part of a sample
+CALLER_SAMPLE_RATE = 8
+
+
+class TracedConfig(collections.Config):
+    """A `Config` that reports its reads to an `AccessTracer`"""
+
+    def __getitem__(self, item: Any, _ignore_default: bool = False) -> Any:
+        value = _getitem(self, item, _ignore_default)
+        # Kept as cheap as possible, since nodes with keys that are never
+        # read stay traced: only first reads and reads during sampling
+        # windows are recorded.
+        trace = self.__dict__["_dotcfg_state"].trace
+        if trace is not None and (trace[0]._sampling or item in trace[2]):
+            trace[0]._record(self, trace, item)
+        return value
+
+    def __reduce__(self) -> Tuple[Any, tuple]:
+        # Pickled as the (untraced) `Config` it was before tracing started
+        return self._reduce(collections.Config)
+
+
+def _set_class(node: collections.Config, cls: type) -> None:
+    # Box would store `__class__` as a key
+    object.__setattr__(node, "__class__", cls)
+
+
+class AccessTracer:
+    """
+    Traces reads of a configuration (and every config nested in it).
+
+    Example:
+
+        ```python
+        with AccessTracer(config, sample_rate=0.01) as tracer:
+            serve_requests()
+            report = tracer.report()
+
+        report.dead  # Keys nobody read
+        report.hot[:10]  # Most read keys, with where they were read from
+        ```
+
+    Args:
+        - config (collections.Config): Configuration to trace
+        - sample_rate (float): Fraction of the time that reads are counted
+        - interval (float): Seconds between the start of each sampling window
+        - exact_dead_keys (bool): Whether to keep tracing configs until each of
+            their keys has been read, so that keys read outside of sampling
+            windows aren't reported as dead. Configs containing keys that are
+            never read then pay the cost of tracing for every read.
+    """
+
+    def __init__(
+        self,
+        config: collections.Config,
+        sample_rate: float = 0.01,
+        interval: float = 1.0,
+        exact_dead_keys: bool = False,
+    ) -> None:
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be greater than 0 and at most 1")
+        self.config = config
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.exact_dead_keys = exact_dead_keys
+
+        self._seen: Set[collections.CompoundKey] = set()
+        self._first_reads: Dict[collections.CompoundKey, str] = {}
+        self._counts: Counter = Counter()
+        self._callers: Dict[collections.CompoundKey, Counter] = {}
+        # Keys of each config (by path) that haven't been read
+        self._unread: Dict[Tuple, Set] = {}
+        self._walked: List[Tuple[collections.Config, Tuple]] = []
+        self._walked_version: Optional[int] = None
+
+        self._sampling = False
+        self._sampled_time = 0.0
+        self._window_start = 0.0
+        self._started: Optional[float] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "AccessTracer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    @staticmethod
+    def _caller() -> str:
+        frame = sys._getframe(2)
+        while frame is not None and frame.f_code.co_filename.startswith(
+            _INTERNAL_FILES
+        ):
+            frame = frame.f_back  # type: ignore
+        if frame is None:
+            return "<unknown>"
+        return f"{frame.f_code.co_filename}:{frame.f_lineno}"
+
+    def _record(self, node: TracedConfig, trace: list, key: Any) -> None:
+        # `trace` is [tracer, path of `node`, keys of `node` that haven't been read]
+        path = collections.CompoundKey((*trace[1], key))
+        unread = trace[2]
+        if key in unread:
+            unread.discard(key)
+            self._seen.add(path)
+            self._first_reads[path] = self._caller()
+            if not unread and not self._sampling and self.exact_dead_keys:
+                # Every key has been read, so there's nothing left to learn
+                # about this node until the next sampling window
+                _set_class(node, collections.Config)
+
+        if self._sampling:
+            count = self._counts[path] = self._counts[path] + 1
+            if count % CALLER_SAMPLE_RATE == 1:
+                callers = self._callers.get(path)
+                if callers is None:
+                    callers = self._callers[path] = Counter()
+                callers[self._caller()] += 1
+
+    def _nodes(self) -> List[Tuple[collections.Config, Tuple]]:
+        # Every config in the tree along with its path, only walked again
+        # once the configuration has changed
+        version = self.config._state().version
+        if self._walked_version == version:
+            return self._walked
+
+        nodes = []
+        stack: List[Tuple[Tuple, Any]] = [((), self.config)]
+        while stack:
+            path, node = stack.pop()
+            if isinstance(node, collections.Config):
+                if type(node) in (collections.Config, TracedConfig):
+                    nodes.append((node, path))
+                    self._unread[path] = {
+                        key for key in dict.keys(node) if (*path, key) not in self._seen
+                    }
+                children: Any = dict.items(node)
+            else:
+                children = enumerate(node)
+
+            for key, value in children:
+                if isinstance(value, (dict, list)):
+                    stack.append(((*path, key), value))
+
+        self._walked, self._walked_version = nodes, version
+        return nodes
+
+    def _attach(self, trace_all: bool) -> None:
+        # Traces every node (if `trace_all`) or every node with unread keys
+        # (if dead keys are tracked exactly), and stops tracing the rest.
+        for node, path in self._nodes():
+            unread = self._unread[path]
+            if trace_all or (self.exact_dead_keys and unread):
+                node._state().trace = [self, path, unread]
+                _set_class(node, TracedConfig)
+            else:
+                self._detach_node(node)
+
+    @staticmethod
+    def _detach_node(node: collections.Config) -> None:
+        node._state().trace = None
+        if type(node) is TracedConfig:
+            _set_class(node, collections.Config)
+
+    def _detach(self) -> None:
+        stack: List[Any] = [self.config]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, collections.Config):
+                self._detach_node(node)
+                children: Any = dict.values(node)
+            else:
+                children = node
+            stack.extend(v for v in children if isinstance(v, (dict, list)))
+
+    def _begin_window(self) -> None:
+        self._window_start = time.monotonic()
+        self._sampling = True
+        self._attach(trace_all=True)
+
+    def _end_window(self) -> None:
+        self._sampling = False
+        self._sampled_time += time.monotonic() - self._window_start
+        self._attach(trace_all=False)
+
+    def _run(self) -> None:
+        window = self.interval * self.sample_rate
+        while not self._stopped.wait(self.interval - window):
+            self._begin_window()
+            self._stopped.wait(window)
+            self._end_window()
+
+    def start(self) -> None:
+        """Starts tracing, sampling read counts from a background thread"""
+        if self._thread is not None:
+            return
+        self._started = time.monotonic()
+        self._stopped.clear()
+        self._attach(trace_all=False)
+        self._thread = threading.Thread(
+            target=self._run, name="dotcfg-tracing", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops tracing; everything gathered so far is kept for `report`"""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        if self._sampling:
+            self._end_window()
+        self._detach()
+
+    def report(self, top: int = 20, callers: int = 5) -> AccessReport:
+        """
+        Summarizes the reads traced so far.
+
+        Args:
+            - top (int): Number of hot keys to include
+            - callers (int): Number of read locations to include per hot key
+
+        Returns:
+            - AccessReport: Hot keys, dead keys, and where each key was first read
+        """
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        sampled = self._sampled_time
+        if self._sampling:
+            sampled += time.monotonic() - self._window_start
+        scale = elapsed / sampled if sampled else 0.0
+
+        hot = [
+            KeyStats(
+                path=path,
+                sampled_reads=count,
+                estimated_reads=count * scale,
+                callers=self._callers[path].most_common(callers),
+            )
+            for path, count in self._counts.most_common(top)
+        ]
+        dead = [
+            path
+            for path in collections.dict_to_flatdict(self.config)
+            if path not in self._seen
+        ]
+        return AccessReport(hot=hot, dead=dead, first_reads=dict(self._first_reads))
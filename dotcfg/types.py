@@ -1,4 +1,10 @@
 from pathlib import Path
-from typing import Union
+from typing import TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from dotcfg.sources import ConfigSource
 
 StrPath = Union[str, Path]
+# Anything `load_configuration` can read a layer of configuration from:
+# a path, an HTTP(S) URL, or a source
+ConfigPath = Union[str, Path, "ConfigSource"]
@@ -1,8 +1,15 @@
+import gc
+import math
+import sys
 from contextlib import contextmanager
 from typing import Any, Dict, Iterator
 
+from box import BoxList
+
 from dotcfg.collections import Config
 
+_MISSING = object()
+
 
 @contextmanager
 def set_temporary_config(
@@ -56,6 +63,76 @@ def set_temporary_config(
 
     finally:
         cfg = getattr(set_location, set_name)
-        cfg.clear()
-        cfg.update(old_config)
+        _restore(cfg, old_config)
         setattr(set_location, set_name, cfg)
+
+
+def _restore(cfg: Config, old_config: Config) -> None:
+    # Reverts `cfg` to `old_config` by only replacing the keys that differ,
+    # so nested configs keep their identity and `Config.derived` values
+    # that don't depend on the temporary values stay cached
+    for key in [key for key in cfg if key not in old_config]:
+        del cfg[key]
+    for key, old_value in old_config.items():
+        value = cfg.get(key, _MISSING)
+        if isinstance(value, Config) and isinstance(old_value, Config):
+            _restore(value, old_value)
+        elif type(value) is not type(old_value) or value != old_value:
+            cfg[key] = old_value
+
+
+def freeze_for_fork(config: Config) -> Config:
+    """
+    Prepares a loaded configuration to be shared with forked child processes
+    (pre-fork servers such as gunicorn or uwsgi).
+
+    Duplicate keys and immutable values are collapsed into single shared
+    objects (strings are interned), which shrinks the number of objects
+    the configuration is made of. Afterwards, a full garbage collection is
+    run and every surviving object is moved into the permanent generation
+    with `gc.freeze`, so collections in the children never touch (and
+    therefore never copy) the pages holding the configuration.
+
+    This should be called in the parent process as the last step before
+    forking, after the application has finished importing and loading.
+
+    Args:
+        - config (Config): Loaded configuration to compact and freeze
+
+    Returns:
+        - Config: The same (compacted in place) configuration instance
+    """
+
+    memo: Dict[Any, Any] = {}
+
+    def compact_value(value: Any) -> Any:
+        if isinstance(value, str):
+            return sys.intern(value)
+        if isinstance(value, float):
+            # Keyed by sign as well, since `0.0 == -0.0`
+            return memo.setdefault((float, value, math.copysign(1.0, value)), value)
+        if value is None or isinstance(value, (bool, int, bytes)):
+            # Keyed by type so that `1`, `1.0` and `True` stay distinct
+            return memo.setdefault((type(value), value), value)
+        if isinstance(value, Config):
+            compact_config(value)
+        elif isinstance(value, BoxList):
+            for i, item in enumerate(value):
+                list.__setitem__(value, i, compact_value(item))
+        return value
+
+    def compact_config(cfg: Config) -> None:
+        items = list(dict.items(cfg))
+        # Bypasses Box's conversion logic since keys and values are
+        # only ever replaced with equal (already converted) objects
+        dict.clear(cfg)
+        for key, value in items:
+            if isinstance(key, str):
+                key = sys.intern(key)
+            dict.__setitem__(cfg, key, compact_value(value))
+
+    compact_config(config)
+
+    gc.collect()
+    gc.freeze()
+    return config
@@ -5,6 +5,7 @@ from nox_poetry import Session, session
 BLACK_PATHS = [
     "dotcfg",
     "tests",
+    "benchmarks",
     "noxfile.py",
 ]
 
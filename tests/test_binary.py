@@ -0,0 +1,100 @@
+import datetime
+import pathlib
+import tempfile
+
+import pytest
+
+from dotcfg import binary, errors
+from dotcfg.collections import CompoundKey
+
+
+@pytest.fixture
+def temp_dir():
+    with tempfile.TemporaryDirectory() as td:
+        yield pathlib.Path(td)
+
+
+@pytest.fixture
+def contents():
+    return {
+        "env": "testing",
+        "empty": {},
+        "feature_flags": {f"flag_{i}": i % 2 == 0 for i in range(100)},
+        "services": {
+            "database": {"host": "localhost", "port": 5432, "ratio": 0.5},
+            "database_replica": {"host": "replica"},
+            "hosts": ["a", "b"],
+        },
+        "dates": {
+            "datetime": datetime.datetime(2020, 1, 2, 3, 4, 5),
+            "date": datetime.date(2020, 1, 2),
+            "time": datetime.time(3, 4, 5),
+        },
+    }
+
+
+@pytest.fixture
+def location(temp_dir: pathlib.Path, contents: dict):
+    location = temp_dir / "config.dcfg"
+    binary.dump(contents, location)
+    return location
+
+
+def test_round_trip(location: pathlib.Path, contents: dict):
+    assert binary.load(location) == contents
+
+
+def test_get_value(location: pathlib.Path):
+    with binary.BinaryConfig(location) as config:
+        assert config.get("env") == "testing"
+        assert config.get("services.database.port") == 5432
+        assert config.get(("feature_flags", "flag_2")) is True
+        assert config.get("services.hosts") == ["a", "b"]
+        assert config.get("dates.date") == datetime.date(2020, 1, 2)
+
+
+def test_get_missing_value(location: pathlib.Path):
+    with binary.BinaryConfig(location) as config:
+        assert config.get("missing") is None
+        assert config.get("services.missing", "default") == "default"
+        # Prefix of a key, but not a section
+        assert config.get("services.data") is None
+
+
+def test_section_doesnt_include_similarly_named_sections(location: pathlib.Path):
+    with binary.BinaryConfig(location) as config:
+        assert config.section("services.database") == {
+            "host": "localhost",
+            "port": 5432,
+            "ratio": 0.5,
+        }
+        assert config.get("services.database_replica") == {"host": "replica"}
+
+        with pytest.raises(KeyError):
+            config.section("missing")
+
+
+def test_keys_are_sorted(location: pathlib.Path, contents: dict):
+    with binary.BinaryConfig(location) as config:
+        keys = list(config.keys())
+
+    assert len(keys) == 110
+    assert CompoundKey(["services", "database", "host"]) in keys
+    assert keys == sorted(keys)
+
+
+@pytest.mark.parametrize(
+    "contents", [{1: "not a string"}, {"a\x1fb": 1}, {"value": object()}]
+)
+def test_unsupported_contents(temp_dir: pathlib.Path, contents: dict):
+    with pytest.raises(errors.UnsupportedConfiguration):
+        binary.dump(contents, temp_dir / "config.dcfg")
+
+
+@pytest.mark.parametrize("data", [b"", b"not a dcfg file at all", b"DCFG"])
+def test_rejects_other_files(temp_dir: pathlib.Path, data: bytes):
+    location = temp_dir / "config.dcfg"
+    location.write_bytes(data)
+
+    with pytest.raises(errors.UnsupportedConfiguration):
+        binary.BinaryConfig(location)
@@ -0,0 +1,122 @@
+import json
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+import pytest
+import toml
+
+from dotcfg import binary
+from dotcfg.cli import main
+
+
+@pytest.fixture
+def temp_dir():
+    with tempfile.TemporaryDirectory() as td:
+        yield pathlib.Path(td)
+
+
+@pytest.fixture
+def paths(temp_dir: pathlib.Path):
+    base = temp_dir / "base.toml"
+    base.write_text(
+        toml.dumps(
+            {
+                "env": "base",
+                "database": {"host": "localhost", "port": 5432, "password": "hunter2"},
+                "url": "postgres://${database.host}:${database.port}",
+            }
+        )
+    )
+    prod = temp_dir / "prod.toml"
+    prod.write_text(
+        toml.dumps({"env": "prod", "database": {"host": "db.internal"}, "new": 1})
+    )
+    return str(base), str(prod)
+
+
+def run(capsys, *argv):
+    code = main(list(argv))
+    return code, capsys.readouterr().out
+
+
+def test_compile(capsys, paths, temp_dir: pathlib.Path):
+    output = temp_dir / "config.dcfg"
+    code, out = run(capsys, "compile", *paths, "-o", str(output))
+    assert code == 0
+    assert str(output) in out
+    with binary.BinaryConfig(output) as config:
+        assert config.get("url") == "postgres://db.internal:5432"
+
+
+class TestShow:
+    def test_json(self, capsys, paths):
+        code, out = run(capsys, "show", *paths, "--redact", "*.password")
+        assert code == 0
+        data = json.loads(out)
+        assert data["env"] == "prod"
+        assert data["database"]["password"] == "**********"
+
+    def test_path(self, capsys, paths):
+        assert run(capsys, "show", *paths, "--path", "database.port") == (0, "5432\n")
+        assert run(capsys, "show", *paths, "--path", "env") == (0, "prod\n")
+
+    def test_section_as_toml(self, capsys, paths):
+        code, out = run(
+            capsys, "show", *paths, "--path", "database", "--format", "toml"
+        )
+        assert toml.loads(out)["host"] == "db.internal"
+
+    def test_env(self, capsys, paths):
+        code, out = run(
+            capsys, "show", *paths, "--format", "env", "--env-prefix", "APP"
+        )
+        assert "APP__DATABASE__HOST=db.internal" in out.splitlines()
+
+    def test_missing_path(self, capsys, paths):
+        assert main(["show", *paths, "--path", "missing"]) == 2
+        assert "missing" in capsys.readouterr().err
+
+    def test_missing_file(self, capsys, temp_dir: pathlib.Path):
+        assert main(["show", str(temp_dir / "missing.toml")]) == 2
+
+
+def test_diff(capsys, paths):
+    base, prod = paths
+    code, out = run(capsys, "diff", base, "--against", base, prod)
+    assert code == 1
+    assert out.splitlines() == [
+        "~ database.host: 'localhost' -> 'db.internal'",
+        "~ env: 'base' -> 'prod'",
+        "+ new = 1",
+        "~ url: 'postgres://localhost:5432' -> 'postgres://db.internal:5432'",
+    ]
+    assert run(capsys, "diff", base, "--against", base) == (0, "")
+
+
+def test_bench(capsys, paths):
+    code, out = run(capsys, "bench", *paths, "--repeat", "2", "--json")
+    assert code == 0
+    assert set(json.loads(out)) == {
+        "read (cold)",
+        "read (cached)",
+        "merge",
+        "interpolate",
+        "validate",
+        "load_configuration",
+    }
+
+    code, out = run(capsys, "bench", *paths, "--repeat", "1", "--max-ms", "0")
+    assert code == 1
+    assert "over the limit" in out
+
+
+def test_module_entry_point():
+    result = subprocess.run(
+        [sys.executable, "-m", "dotcfg", "--help"],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert result.returncode == 0
+    assert "compile" in result.stdout
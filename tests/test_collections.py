@@ -1,9 +1,12 @@
+import datetime
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 from typing import cast
 
 import pytest
 from box import Box
 
-from dotcfg import collections
+from dotcfg import collections, errors, serializers
 from dotcfg.collections import merge_dicts
 
 
@@ -93,3 +96,613 @@ def test_merge_nested_dicts_with_empty_section(dct_class):
     assert merge_dicts(a, b) == a
     # merge a into b
     assert merge_dicts(b, a) == a
+
+
+class TestPathLookups:
+    @pytest.fixture
+    def config(self):
+        return collections.Config(
+            {
+                "env": "testing",
+                "services": {
+                    "database": {"host": "localhost", "port": 5432},
+                    "replicas": [{"host": "replica-1"}, {"host": "replica-2"}],
+                },
+            }
+        )
+
+    def test_get_root_path(self, config):
+        assert config.get_path("env") == "testing"
+
+    def test_get_nested_path(self, config):
+        assert config.get_path("services.database.host") == "localhost"
+        assert config.get_path("services.database") == config.services.database
+
+    def test_get_path_through_list(self, config):
+        assert config.get_path("services.replicas.1.host") == "replica-2"
+        assert config.get_path("services.replicas.-1.host") == "replica-2"
+
+    @pytest.mark.parametrize(
+        "path",
+        [
+            "missing",
+            "services.missing",
+            "services.database.host.missing",
+            "services.replicas.5.host",
+            "services.replicas.host",
+            "services.replicas.--1",
+            "services.replicas.²",
+        ],
+    )
+    def test_missing_path_returns_default(self, config, path):
+        assert config.get_path(path) is None
+        assert config.get_path(path, "default") == "default"
+
+    def test_compiled_paths_are_cached(self):
+        assert collections.compile_path("a.b.0") is collections.compile_path("a.b.0")
+        assert collections.compile_path("a.b.0") == (("a", None), ("b", None), ("0", 0))
+
+    def test_select(self, config):
+        values = config.select(
+            ["env", "services.database.port", "services.missing"], default=-1
+        )
+        assert values == ["testing", 5432, -1]
+
+
+class TestFlatView:
+    @pytest.fixture
+    def config(self):
+        return collections.Config(
+            {"env": "testing", "database": {"host": "localhost", "port": 5432}}
+        )
+
+    def assert_view_is_current(self, config):
+        assert dict(config.flat_view()) == collections.dict_to_flatdict(config)
+
+    def test_matches_flatdict(self, config):
+        self.assert_view_is_current(config)
+
+    def test_is_read_only(self, config):
+        with pytest.raises(TypeError):
+            config.flat_view()[collections.CompoundKey(["env"])] = "x"
+
+    def test_is_cached(self, config):
+        first = config.flat_view()
+        assert config.flat_view() == first
+        assert config._state().flat is not None
+
+    def test_updates_on_nested_set(self, config):
+        config.flat_view()
+        config.database.host = "remote"
+        assert config.flat_view()[collections.CompoundKey(["database", "host"])] == (
+            "remote"
+        )
+        self.assert_view_is_current(config)
+
+    def test_updates_on_new_section(self, config):
+        config.flat_view()
+        config.cache = {"ttl": 10, "nested": {"size": 1}}
+        config.database.replica = {"host": "replica"}
+        self.assert_view_is_current(config)
+
+    def test_updates_when_replacing_section_with_value(self, config):
+        config.flat_view()
+        config.database = "sqlite://"
+        self.assert_view_is_current(config)
+
+        config.database = {"host": "again"}
+        self.assert_view_is_current(config)
+
+    def test_updates_on_delete(self, config):
+        config.flat_view()
+        del config.database.port
+        self.assert_view_is_current(config)
+
+        del config["database"]
+        self.assert_view_is_current(config)
+
+    def test_updates_on_bulk_changes(self, config):
+        config.flat_view()
+        config.database.update({"host": "remote"}, user="admin")
+        self.assert_view_is_current(config)
+
+        config.database.setdefault("password", "secret")
+        self.assert_view_is_current(config)
+
+        config.clear()
+        assert config.flat_view() == {}
+
+    def test_nested_view(self, config):
+        view = config.database.flat_view()
+        config.database.host = "remote"
+        assert view == {
+            collections.CompoundKey(["host"]): "remote",
+            collections.CompoundKey(["port"]): 5432,
+        }
+
+    def test_detached_sections_dont_update_parent(self, config):
+        database = config.database
+        config.database = {"host": "replacement"}
+        config.flat_view()
+
+        database.host = "detached"
+        assert config.database.host == "replacement"
+        self.assert_view_is_current(config)
+
+    def test_copies_track_changes_separately(self, config):
+        copy = config.copy()
+        config.flat_view()
+        copy.flat_view()
+
+        copy.database.host = "copy"
+        self.assert_view_is_current(config)
+        self.assert_view_is_current(copy)
+        assert config.database.host == "localhost"
+
+    def test_pickle_round_trip(self, config):
+        config.flat_view()
+        restored = pickle.loads(pickle.dumps(config.database))
+
+        assert restored == config.database
+        restored.host = "changed"
+        self.assert_view_is_current(restored)
+        assert config.database.host == "localhost"
+
+
+class TestPathTrie:
+    @pytest.fixture
+    def trie(self):
+        return collections.PathTrie(
+            [
+                collections.CompoundKey(["a", "x"]),
+                collections.CompoundKey(["a", "y"]),
+                collections.CompoundKey(["b", "x"]),
+                collections.CompoundKey(["b", "z", "x"]),
+                collections.CompoundKey(["c"]),
+            ]
+        )
+
+    def test_iter_prefix(self, trie):
+        assert list(trie.iter_prefix(["a"])) == [("a", "x"), ("a", "y")]
+        assert list(trie.iter_prefix(["c"])) == [("c",)]
+        assert list(trie.iter_prefix(["missing"])) == []
+        assert len(list(trie.iter_prefix([]))) == 5
+
+    def test_match(self, trie):
+        assert list(trie.match(["*", "x"])) == [("a", "x"), ("b", "x")]
+        assert list(trie.match(["b", "*", "x"])) == [("b", "z", "x")]
+        assert list(trie.match(["*"])) == [("c",)]
+        assert list(trie.match(["a", "missing"])) == []
+
+    def test_remove(self, trie):
+        assert trie.remove(["b"]) == [("b", "x"), ("b", "z", "x")]
+        assert list(trie.match(["*", "x"])) == [("a", "x")]
+        assert trie.remove(["b"]) == []
+
+    def test_remove_prunes_empty_branches(self, trie):
+        trie.remove(["b", "z", "x"])
+        assert list(trie.iter_prefix(["b"])) == [("b", "x")]
+        assert "z" not in trie._root.children["b"].children
+
+
+class TestPathQueries:
+    @pytest.fixture
+    def config(self):
+        return collections.Config(
+            {
+                "services": {
+                    "database": {"host": "db", "port": 5432},
+                    "cache": {"host": "cache", "port": 6379},
+                    "queue": {"url": "amqp://"},
+                },
+                "feature_flags": {"beta": True, "dark_mode": False},
+            }
+        )
+
+    def test_find(self, config):
+        assert config.find("services.*.host") == {
+            ("services", "database", "host"): "db",
+            ("services", "cache", "host"): "cache",
+        }
+        assert config.find("*.beta") == {("feature_flags", "beta"): True}
+        assert config.find("services.*") == {}
+
+    @pytest.mark.parametrize("path", ["feature_flags.", "feature_flags"])
+    def test_prefix(self, config, path):
+        assert config.prefix(path) == {
+            ("feature_flags", "beta"): True,
+            ("feature_flags", "dark_mode"): False,
+        }
+
+    def test_empty_prefix_matches_everything(self, config):
+        assert config.prefix("") == dict(config.flat_view())
+
+    def test_index_tracks_changes(self, config):
+        config.find("services.*.host")
+
+        config.services.queue.host = "queue"
+        del config.services.cache
+        config.services.database = "sqlite://"
+        config.feature_flags.update(new_flag=True)
+
+        assert config.find("services.*.host") == {
+            ("services", "queue", "host"): "queue"
+        }
+        assert config.prefix("feature_flags") == {
+            ("feature_flags", "beta"): True,
+            ("feature_flags", "dark_mode"): False,
+            ("feature_flags", "new_flag"): True,
+        }
+        assert dict(config.flat_view()) == collections.dict_to_flatdict(config)
+
+    def test_index_rebuilt_after_clear(self, config):
+        config.find("services.*.host")
+        config.clear()
+        config.services = {"web": {"host": "web"}}
+
+        assert config.find("services.*.host") == {("services", "web", "host"): "web"}
+
+
+class TestToEnviron:
+    @pytest.fixture
+    def config(self):
+        return collections.Config(
+            {
+                "name": "api",
+                "port": "8080",
+                "debug": True,
+                "ratio": float("inf"),
+                "cost": "$5",
+                "home": "~",
+                "database": {"hosts": ["a", "b"], "options": {}, "password": None},
+                "multiline": "line one\nline two\\n",
+            }
+        )
+
+    def test_round_trip(self, config, monkeypatch):
+        from dotcfg.configuration import load_environment_variables
+
+        monkeypatch.setenv("HOME", "/home/dotcfg")
+        for name, value in config.to_environ("DOTCFG").items():
+            monkeypatch.setenv(name, value)
+
+        loaded = collections.flatdict_to_dict(load_environment_variables("DOTCFG"))
+        assert loaded == config.to_dict()
+        assert loaded["port"] == "8080"
+
+    def test_round_trip_through_load_configuration(self, config, monkeypatch, tmp_path):
+        from dotcfg.configuration import load_configuration
+
+        config.app = {"code": "123", "flag": "true", "path": "$HOME/x"}
+        monkeypatch.setenv("HOME", "/home/dotcfg")
+        for name, value in config.to_environ("DOTCFG").items():
+            monkeypatch.setenv(name, value)
+        location = tmp_path / "config.toml"
+        location.write_text('port = 1\napp = { code = "0" }\n')
+
+        loaded = load_configuration(location, env_var_prefix="DOTCFG")
+        assert loaded == config
+        assert loaded.app == {"code": "123", "flag": "true", "path": "$HOME/x"}
+
+    def test_names(self, config):
+        environ = config.to_environ("DOTCFG")
+        assert environ["DOTCFG__NAME"] == "api"
+        assert environ["DOTCFG__DATABASE__OPTIONS"] == "{}"
+        assert "DOTCFG__DATABASE__HOSTS" in environ
+
+    def test_cached_per_version(self, config, monkeypatch):
+        calls = []
+        environ_items = serializers.environ_items
+
+        def counting(*args):
+            calls.append(args)
+            return environ_items(*args)
+
+        monkeypatch.setattr(serializers, "environ_items", counting)
+        first = config.to_environ("DOTCFG")
+        for _ in range(100):
+            assert config.to_environ("DOTCFG") == first
+        assert len(calls) == 1
+
+        config.database.password = "hunter2"
+        assert config.to_environ("DOTCFG")["DOTCFG__DATABASE__PASSWORD"] == "hunter2"
+        assert len(calls) == 2
+
+        config.to_environ("OTHER")
+        config.to_environ("DOTCFG")
+        assert len(calls) == 3
+
+    def test_list_changes_in_place(self, config, monkeypatch):
+        calls = []
+        environ_items = serializers.environ_items
+
+        def counting(*args):
+            calls.append(args)
+            return environ_items(*args)
+
+        monkeypatch.setattr(serializers, "environ_items", counting)
+        name = "DOTCFG__DATABASE__HOSTS"
+        config.to_environ("DOTCFG")
+        config.database.hosts.append("c")
+        assert config.to_environ("DOTCFG")[name] == "['a', 'b', 'c']"
+        assert config.to_environ("DOTCFG")[name] == "['a', 'b', 'c']"
+        assert len(calls) == 2
+
+    def test_read_only(self, config):
+        with pytest.raises(TypeError):
+            config.to_environ("DOTCFG")["DOTCFG__NAME"] = "other"  # type: ignore
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            {"Upper": 1},
+            {"double__underscore": 1},
+            {"_leading": 1},
+            {"date": datetime.date(2020, 1, 1)},
+            {"nan": float("nan")},
+        ],
+    )
+    def test_unrepresentable(self, data):
+        with pytest.raises(ValueError):
+            collections.Config(data).to_environ("DOTCFG")
+
+
+class TestCompactArray:
+    def test_reads_like_a_list(self):
+        array = collections.CompactArray([3, 1, 2])
+        assert len(array) == 3
+        assert array[0] == 3 and type(array[0]) is int
+        assert array[-1] == 2
+        assert list(array) == [3, 1, 2]
+        assert array[1:] == [1, 2]
+        assert array == [3, 1, 2]
+        assert array.index(2) == 2
+        assert 1 in array and 4 not in array
+
+    def test_floats(self):
+        array = collections.CompactArray([0.5, 1.5])
+        assert type(array[0]) is float
+        assert array.tolist() == [0.5, 1.5]
+
+    @pytest.mark.parametrize(
+        "values", [[], [1, 2.0], [True, False], [1, "a"], [2**63], [[1]]]
+    )
+    def test_rejects_other_lists(self, values):
+        with pytest.raises(ValueError):
+            collections.CompactArray(values)
+
+    def test_path_lookups(self):
+        config = collections.Config({"weights": [0.5, 1.5, 2.5], "name": "abc"})
+        collections.compact_lists(config, 2)
+        assert isinstance(config.weights, collections.CompactArray)
+        assert config.get_path("weights.2") == 2.5
+        assert config.get_path("weights.-1") == 2.5
+        assert config.select(["weights.0", "weights.5", "name.0"]) == [0.5, None, None]
+
+    def test_read_only(self):
+        array = collections.CompactArray([1, 2])
+        with pytest.raises(TypeError):
+            array[0] = 3  # type: ignore
+
+    def test_pickle(self):
+        array = collections.CompactArray(list(range(100)))
+        assert 5 in array
+        assert pickle.loads(pickle.dumps(array)) == list(range(100))
+
+    def test_compact_lists(self):
+        config = collections.Config(
+            {
+                "buckets": [1, 2, 3],
+                "short": [1],
+                "names": ["a", "b"],
+                "nested": {"weights": [0.1, 0.2]},
+                "tables": [{"ids": [4, 5]}],
+            }
+        )
+        collections.compact_lists(config, min_length=2)
+
+        assert isinstance(config.buckets, collections.CompactArray)
+        assert isinstance(config.nested.weights, collections.CompactArray)
+        assert isinstance(config.tables[0].ids, collections.CompactArray)
+        assert type(config.short) is not collections.CompactArray
+        assert type(config.names) is not collections.CompactArray
+        assert config.flat_view()[("buckets",)] == [1, 2, 3]
+
+
+class AppConfig(collections.Config):
+    pass
+
+
+def _worker_config(ref: collections.ConfigRef) -> dict:
+    return ref.config.to_dict()
+
+
+class TestPickling:
+    @pytest.fixture
+    def config(self):
+        return collections.Config(
+            {
+                "database": {"host": "localhost", "port": 5432},
+                "empty": {},
+                "services": [{"name": "web"}],
+            }
+        )
+
+    def test_round_trip(self, config):
+        collections._cached_configs.clear()
+        restored = pickle.loads(pickle.dumps(config))
+
+        assert restored == config
+        assert isinstance(restored.empty, collections.Config)
+        assert restored.services[0].name == "web"
+
+    def test_unpickling_builds_new_instances(self, config):
+        data = pickle.dumps(config)
+        first, second = pickle.loads(data), pickle.loads(data)
+        assert first is not second
+
+        first.services.append({"name": "worker"})
+        first.database.port = 1
+        assert len(second.services) == 1
+        assert second.database.port == 5432
+
+    def test_changes_are_pickled(self, config):
+        before = pickle.dumps(config)
+        config.database.port = 1
+        assert pickle.dumps(config) != before
+        assert pickle.loads(pickle.dumps(config)).database.port == 1
+
+        # Including changes made to lists in place, which aren't versioned
+        config.services.append({"name": "worker"})
+        assert len(pickle.loads(pickle.dumps(config)).services) == 2
+
+    def test_subclasses_and_options(self):
+        config = AppConfig({"database": {"host": "localhost"}})
+        restored = pickle.loads(pickle.dumps(config))
+        assert type(restored) is AppConfig
+        assert type(restored.database) is AppConfig
+
+        config = collections.Config({"database": {}}, default_box=True)
+        restored = pickle.loads(pickle.dumps(config))
+        assert restored.missing.key == {}
+        assert restored.database.missing == {}
+
+    def test_config_ref(self, config):
+        ref = collections.ConfigRef(config)
+        assert ref.config is config
+        assert b"localhost" not in pickle.dumps(ref)
+
+        collections._cached_configs.clear()
+        with pytest.raises(errors.UnknownConfigVersion):
+            pickle.loads(pickle.dumps(ref)).config
+
+        collections.cache_config(config)
+        assert pickle.loads(pickle.dumps(ref)).config is config
+
+    def test_process_pool(self, config):
+        with ProcessPoolExecutor(
+            max_workers=1,
+            initializer=collections.cache_config,
+            initargs=(config,),
+        ) as executor:
+            ref = collections.ConfigRef(config)
+            results = list(executor.map(_worker_config, [ref, ref]))
+
+        assert results == [config.to_dict(), config.to_dict()]
+
+
+class TestDerived:
+    @pytest.fixture
+    def config(self):
+        return collections.Config(
+            {"database": {"host": "localhost", "port": 5432}, "env": "dev"}
+        )
+
+    def test_cached_until_dependency_changes(self, config):
+        calls = []
+
+        @config.derived
+        def dsn(cfg):
+            calls.append(1)
+            return f"{cfg.database.host}:{cfg.database['port']}"
+
+        assert dsn() == dsn() == "localhost:5432"
+        assert len(calls) == 1
+        assert dsn.dependencies == {("database", "host"), ("database", "port")}
+        assert "dsn" in repr(dsn)
+
+        config.env = "prod"
+        config.database.user = "admin"
+        assert dsn() == "localhost:5432"
+        assert len(calls) == 1
+
+        config.database.port = 15432
+        assert dsn() == "localhost:15432"
+        assert len(calls) == 2
+
+    def test_replaced_sections(self, config):
+        host = config.derived(lambda cfg: cfg.database.host)
+        assert host() == "localhost"
+        config.database = {"host": "remote"}
+        assert host() == "remote"
+        config.clear()
+        with pytest.raises(AttributeError):
+            host()
+
+    def test_missing_keys_and_whole_sections(self, config):
+        user = config.derived(lambda cfg: cfg.database.get("user", "postgres"))
+        section = config.derived(lambda cfg: dict(cfg.database.items()))
+        assert user() == "postgres"
+        assert section() == {"host": "localhost", "port": 5432}
+
+        config.database.user = "admin"
+        assert user() == "admin"
+        assert section()["user"] == "admin"
+
+    def test_nested_configs(self, config):
+        port = config.database.derived(lambda cfg: cfg.port)
+        assert port() == 5432
+        config.database.port = 1
+        assert port() == 1
+
+    def test_invalidate(self, config):
+        calls = []
+        env = config.derived(lambda cfg: calls.append(1) or cfg.env)
+        env()
+        env.invalidate()
+        env()
+        assert len(calls) == 2
+
+
+class TestBuildConfig:
+    @pytest.fixture
+    def data(self):
+        return {
+            "database": {"host": "localhost", "options": {"1st": 1, "class": "x"}},
+            "servers": [{"name": "a"}, ["nested"], 1],
+            "empty": {},
+            "missing": None,
+        }
+
+    def assert_same(self, built, expected):
+        assert type(built) is type(expected)
+        if isinstance(expected, dict):
+            assert built._box_config == expected._box_config
+            assert list(dict.keys(built)) == list(dict.keys(expected))
+            for key in expected:
+                self.assert_same(dict.__getitem__(built, key), expected[key])
+        elif isinstance(expected, list):
+            assert built.box_options == expected.box_options
+            for built_item, item in zip(built, expected):
+                self.assert_same(built_item, item)
+        else:
+            assert built == expected
+
+    def test_same_as_box(self, data):
+        config = collections.build_config(data)
+        self.assert_same(config, collections.Config(data))
+        assert config.database.options.x1st == 1
+        assert config.database.options.xclass == "x"
+
+        # Nested configs are linked to their parent
+        version = config._state().version
+        config.database.options["1st"] = 2
+        assert config._state().version == version + 1
+
+    def test_flat_keys(self, data):
+        flat = collections.dict_to_flatdict(data)
+        config = collections.build_config(flat)
+        assert config == collections.flatdict_to_dict(flat)
+        assert isinstance(config.database, collections.Config)
+
+    def test_copy_and_merge(self, data):
+        config = collections.Config(data)
+        copy = config.copy()
+        self.assert_same(copy, config)
+        assert copy.database is not config.database
+        assert copy.servers is config.servers
+
+        merged = merge_dicts(config, {"database": {"port": 5432}})
+        assert isinstance(merged.database, collections.Config)
+        assert merged.database == {**data["database"], "port": 5432}
+        assert "port" not in config.database
@@ -7,12 +7,14 @@ from typing import Type, cast
 import pytest
 import toml
 
-from dotcfg import collections
+from dotcfg import collections, errors
 from dotcfg.configuration import (
     interpolate_config,
     interpolate_env_vars,
     load_configuration,
+    load_variants,
     replace_variable_references,
+    resolve_references,
     string_to_type,
     validate_config,
 )
@@ -241,6 +243,54 @@ class TestReplaceVariableReferences:
         ]
 
 
+class TestResolveReferences:
+    def test_resolves_in_place(self):
+        config = {"a": {"b": "foo"}, "c": "${a.b}-bar"}
+        assert resolve_references(config) is config
+        assert config == {"a": {"b": "foo"}, "c": "foo-bar"}
+
+    def test_lists_of_tables(self):
+        config = {
+            "domain": "example.com",
+            "services": [
+                {"name": "api", "host": "api.${domain}"},
+                {"name": "web", "host": "web.${domain}", "tags": ["${domain}"]},
+            ],
+        }
+        resolve_references(config)
+        assert config["services"][0]["host"] == "api.example.com"
+        assert config["services"][1]["host"] == "web.example.com"
+        assert config["services"][1]["tags"] == ["example.com"]
+
+    def test_nested_lists(self):
+        config = {"a": 1, "matrix": [["${a}", 2], [3, ["${a}"]]]}
+        resolve_references(config)
+        assert config["matrix"] == [[1, 2], [3, [1]]]
+
+    def test_chained_references_resolved_on_demand(self):
+        config = {"a": "${b.c}", "b": {"c": "${d}"}, "d": "bar"}
+        resolve_references(config)
+        assert config == {"a": "bar", "b": {"c": "bar"}, "d": "bar"}
+
+    def test_reference_to_list_resolves_its_items(self):
+        config = {"hosts": ["${primary}", "replica"], "all": "${hosts}", "primary": "p"}
+        resolve_references(config)
+        assert config["all"] == ["p", "replica"]
+
+    def test_missing_references_and_sections(self):
+        config = {"a": "${missing}", "b": "${section}", "section": {"c": 1}}
+        resolve_references(config)
+        assert config["a"] == ""
+        assert config["b"] == ""
+
+    def test_cycles_are_left_unresolved(self):
+        config = {"a": "${a}", "b": "x-${c}", "c": "y-${b}"}
+        resolve_references(config)
+        assert config["a"] == "${a}"
+        assert config["b"] == "x-y-${b}"
+        assert config["c"] == "y-${b}"
+
+
 class TestStringToType:
     @pytest.mark.parametrize(
         "string,expected",
@@ -403,6 +453,18 @@ class TestInterpolateConfig:
         assert second.x == 1
         assert second.y == second.x
 
+    def test_resolves_references_in_lists_of_tables(self, monkeypatch):
+        monkeypatch.setenv("DOTCFG_TEST_PORT", "8080")
+        config = {
+            "domain": "example.com",
+            "services": [{"host": "api.${domain}", "port": "$DOTCFG_TEST_PORT"}],
+        }
+        cfg = interpolate_config(config)
+        assert cfg.services[0].host == "api.example.com"
+        assert cfg.services[0].port == 8080
+        # The input isn't modified
+        assert config["services"][0]["host"] == "api.${domain}"
+
 
 class TestLoadConfiguration:
     def test_prefers_env_vars(self, monkeypatch, testing_config: str):
@@ -426,3 +488,251 @@ class TestLoadConfiguration:
             json.dump(testing_config_contents, f)
 
         config = load_configuration(location)
+
+    def test_compact_arrays(self, temp_dir: str):
+        location = os.path.join(temp_dir, "config.toml")
+        with open(location, "w") as f:
+            toml.dump({"buckets": list(range(10)), "ports": [80, 443]}, f)
+
+        config = load_configuration(location, compact_arrays=5)
+        assert isinstance(config.buckets, collections.CompactArray)
+        assert config.buckets == list(range(10))
+        assert config.ports == [80, 443]
+        assert not isinstance(config.ports, collections.CompactArray)
+
+
+class TestLoadSections:
+    @pytest.fixture
+    def config_path(self, temp_dir: str):
+        location = os.path.join(temp_dir, "sections.toml")
+        with open(location, "w") as f:
+            toml.dump(
+                {
+                    "env": "TESTING",
+                    "database": {
+                        "host": "${network.host}",
+                        "url": "postgres://${credentials.${database.user_key}}@db",
+                        "user_key": "user",
+                    },
+                    "logging": {"level": "INFO", "items": "shadows a Config method"},
+                    "network": {"host": "${env}-host"},
+                    "credentials": {"user": "admin"},
+                    "unrelated": {"keys": "also shadows a Config method"},
+                },
+                f,
+            )
+        return location
+
+    def test_only_loads_requested_sections(self, config_path: str):
+        config = load_configuration(config_path, sections=["database"])
+        assert list(config.keys()) == ["database"]
+
+    def test_follows_references_into_other_sections(self, config_path: str):
+        config = load_configuration(config_path, sections=["database"])
+        assert config.database.host == "TESTING-host"
+        assert config.database.url == "postgres://admin@db"
+
+    def test_merges_requested_sections(self, config_path: str, temp_dir: str):
+        override = os.path.join(temp_dir, "override.toml")
+        with open(override, "w") as f:
+            toml.dump({"env": "PRODUCTION", "database": {"port": 5432}}, f)
+
+        config = load_configuration(config_path, override, sections=["database"])
+        assert config.database.port == 5432
+        assert config.database.host == "PRODUCTION-host"
+
+    def test_only_validates_requested_sections(self, config_path: str):
+        load_configuration(config_path, sections=["database"])
+
+        with pytest.raises(ValueError):
+            load_configuration(config_path, sections=["logging"])
+
+    def test_env_vars_for_other_sections_are_ignored(
+        self, monkeypatch, config_path: str
+    ):
+        monkeypatch.setenv("DOTCFG__NETWORK__HOST", "env-host")
+        monkeypatch.setenv("DOTCFG__OTHER__KEY", "value")
+
+        config = load_configuration(
+            config_path, env_var_prefix="DOTCFG", sections=["database", "other"]
+        )
+        assert config.database.host == "env-host"
+        assert config.other.key == "value"
+        assert "network" not in config
+
+
+class TestLoadVariants:
+    @pytest.fixture
+    def write(self, temp_dir: str):
+        def write(name: str, contents: dict) -> str:
+            location = os.path.join(temp_dir, name)
+            with open(location, "w") as f:
+                toml.dump(contents, f)
+            return location
+
+        return write
+
+    @pytest.fixture
+    def base_paths(self, write):
+        return [
+            write(
+                "base.toml",
+                {
+                    "env": "BASE",
+                    "url": "https://${env}.example.com",
+                    "database": {"host": "localhost", "port": 5432},
+                    "cache": "memory",
+                    "features": ["a", "${env}"],
+                },
+            ),
+            write("defaults.toml", {"database": {"user": "admin"}}),
+        ]
+
+    @pytest.fixture
+    def variants(self, write):
+        return {
+            "empty": [],
+            "dev": [write("dev.toml", {"env": "DEV", "database": {"port": 1}})],
+            "prod": [
+                write(
+                    "prod.toml",
+                    {
+                        "env": "PROD",
+                        "database": "postgres://prod",
+                        "cache": {"host": "redis"},
+                    },
+                ),
+                write("prod_extra.toml", {"cache": {"port": "${database}"}}),
+            ],
+        }
+
+    def test_matches_load_configuration(self, base_paths, variants):
+        configs = load_variants(base_paths, variants)
+
+        assert list(configs) == ["empty", "dev", "prod"]
+        for name, paths in variants.items():
+            assert configs[name] == load_configuration(*base_paths, *paths)
+
+    def test_resolves_references_per_variant(self, base_paths, variants):
+        configs = load_variants(base_paths, variants)
+
+        assert configs["dev"].url == "https://DEV.example.com"
+        assert configs["prod"].features == ["a", "PROD"]
+        assert configs["prod"].cache.port == "postgres://prod"
+
+    def test_arrays_of_tables(self, write):
+        base = write(
+            "services.toml",
+            {"host": "h", "services": [{"url": "${host}:1", "port": "8080"}]},
+        )
+        variants = {"base": [], "other": [write("other.toml", {"host": "o"})]}
+        configs = load_variants([base], variants)
+
+        assert configs["base"].services == [{"url": "h:1", "port": 8080}]
+        assert configs["other"].services[0].url == "o:1"
+        for name, paths in variants.items():
+            assert configs[name] == load_configuration(base, *paths)
+
+    def test_env_vars_apply_to_every_variant(self, monkeypatch, base_paths, variants):
+        monkeypatch.setenv("DOTCFG__ENV", "OVERRIDE")
+        configs = load_variants(base_paths, variants, env_var_prefix="DOTCFG")
+        assert configs["dev"].url == "https://OVERRIDE.example.com"
+
+        for name, paths in variants.items():
+            assert configs[name] == load_configuration(
+                *base_paths, *paths, env_var_prefix="DOTCFG"
+            )
+
+    def test_process_pool(self, base_paths, variants):
+        configs = load_variants(base_paths, variants, max_workers=2)
+
+        for name, paths in variants.items():
+            assert configs[name] == load_configuration(*base_paths, *paths)
+
+    def test_identical_variants_in_process_pool(self, base_paths):
+        configs = load_variants(base_paths, {"a": [], "b": []}, max_workers=2)
+        assert configs["a"] == configs["b"]
+        assert configs["a"] is not configs["b"]
+
+        configs["a"].env = "CHANGED"
+        configs["a"].features.append("c")
+        assert configs["b"].env == "BASE"
+        assert configs["b"].features == ["a", "BASE"]
+
+
+def test_load_configuration_with_includes(temp_dir: str):
+    os.makedirs(os.path.join(temp_dir, "common"))
+    with open(os.path.join(temp_dir, "common", "db.toml"), "w") as f:
+        toml.dump({"database": {"host": "common", "port": 5432}}, f)
+
+    location = os.path.join(temp_dir, "config.toml")
+    with open(location, "w") as f:
+        toml.dump({"include": ["common/db.toml"], "database": {"host": "main"}}, f)
+
+    config = load_configuration(location)
+    assert config == {"database": {"host": "main", "port": 5432}}
+
+
+class TestProvenance:
+    @pytest.fixture
+    def paths(self, temp_dir: str):
+        os.makedirs(os.path.join(temp_dir, "common"))
+        common = os.path.join(temp_dir, "common", "db.toml")
+        base = os.path.join(temp_dir, "base.toml")
+        prod = os.path.join(temp_dir, "prod.toml")
+        with open(common, "w") as f:
+            toml.dump({"database": {"host": "common", "port": 5432}}, f)
+        with open(base, "w") as f:
+            toml.dump(
+                {
+                    "include": "common/db.toml",
+                    "database": {"host": "base", "url": "${database.host}"},
+                    "servers": [{"name": "a"}],
+                },
+                f,
+            )
+        with open(prod, "w") as f:
+            toml.dump({"database": {"host": "prod"}}, f)
+        return common, base, prod
+
+    def test_explain(self, monkeypatch, paths):
+        common, base, prod = paths
+        monkeypatch.setenv("DOTCFG__DATABASE__PORT", "6432")
+        config = load_configuration(
+            base, prod, env_var_prefix="DOTCFG", track_provenance=True
+        )
+
+        host = config.explain("database.host")
+        assert host == (("database", "host"), prod, (common, base), "prod")
+
+        port = config.database.explain("port")
+        assert port.source == "$DOTCFG__DATABASE__PORT"
+        assert port.overridden == (common,)
+
+        url = config.explain("database.url")
+        assert (url.source, url.raw) == (base, "${database.host}")
+        assert config.explain("servers.0.name").key == ("servers",)
+
+        with pytest.raises(KeyError):
+            config.explain("database.missing")
+        with pytest.raises(KeyError):
+            config.explain("database")
+
+    def test_runtime_changes(self, paths):
+        _, base, _ = paths
+        config = load_configuration(base, track_provenance=True)
+        config.database.host = "changed"
+        config.cache = {"ttl": 60}
+
+        host = config.explain("database.host")
+        assert host.source == collections.RUNTIME_SOURCE
+        assert host.overridden[-1] == base
+        assert host.raw == "changed"
+        assert config.explain("cache.ttl").source == collections.RUNTIME_SOURCE
+        assert config.explain("database.port").source != collections.RUNTIME_SOURCE
+
+    def test_disabled(self, paths):
+        config = load_configuration(paths[1])
+        assert config._state().provenance is None
+        with pytest.raises(errors.ProvenanceNotTracked):
+            config.explain("database.host")
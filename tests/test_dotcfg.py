@@ -1,7 +1,12 @@
 import os
 import subprocess
+import sys
+
+import pytest
 
 import dotcfg
+from dotcfg.collections import Config
+from dotcfg.configuration import load_configuration
 
 
 def test_version():
@@ -18,3 +23,51 @@ def test_version():
     package_version = poetry_version.replace("dotcfg ", "")
 
     assert package_version == current_version
+
+
+# Generous, since CI machines are slower (and noisier) than development ones.
+# Importing everything eagerly took over 100ms.
+IMPORT_BUDGET_MS = 25
+
+
+def _import_times(statement: str) -> dict:
+    # Cumulative import time (in microseconds) of each module imported
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = {}
+    for line in output.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_time():
+    # The fastest of a few runs, to ignore one off delays
+    fastest = min(_import_times("import dotcfg")["dotcfg"] for _ in range(3))
+    assert fastest / 1000 < IMPORT_BUDGET_MS
+
+
+def test_import_is_lazy():
+    times = _import_times("import dotcfg")
+    for module in ("box", "toml", "concurrent.futures", "dotcfg.collections"):
+        assert module not in times
+
+
+def test_engine_imports_parsers_lazily():
+    times = _import_times("import dotcfg.engine")
+    for module in ("dotcfg.binary", "json", "mmap", "toml"):
+        assert module not in times
+
+
+def test_lazy_exports():
+    assert dotcfg.Config is Config
+    assert dotcfg.load_configuration is load_configuration
+    assert "set_temporary_config" in dir(dotcfg)
+    assert dotcfg.engine.SupportedFileTypes
+
+    with pytest.raises(AttributeError):
+        dotcfg.missing
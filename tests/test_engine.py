@@ -5,8 +5,14 @@ import tempfile
 import pytest
 import toml
 
-from dotcfg import errors
-from dotcfg.engine import SupportedFileTypes, read_configuration_file
+from dotcfg import engine, errors
+from dotcfg.engine import (
+    SupportedFileTypes,
+    convert_configuration_file,
+    read_configuration_file,
+    read_configuration_files,
+    write_configuration_file,
+)
 
 
 @pytest.fixture
@@ -68,6 +74,35 @@ class TestJsonReader(BaseMixin):
         yield location
 
 
+class TestDcfgReader(BaseMixin):
+
+    file_format = SupportedFileTypes.DCFG
+
+    @pytest.fixture
+    def config(self, cfg: dict, temp_dir: pathlib.Path):
+        location = temp_dir / "dcfg_config.dcfg"
+        write_configuration_file(cfg, location)
+
+        yield location
+
+
+@pytest.mark.parametrize("source_extension", ["toml", "json", "dcfg"])
+@pytest.mark.parametrize("destination_extension", ["toml", "json", "dcfg"])
+def test_convert_between_formats(
+    cfg: dict,
+    temp_dir: pathlib.Path,
+    source_extension: str,
+    destination_extension: str,
+):
+    source = temp_dir / f"source.{source_extension}"
+    destination = temp_dir / f"destination.{destination_extension}"
+    write_configuration_file(cfg, source)
+
+    convert_configuration_file(source, destination)
+
+    assert read_configuration_file(destination) == cfg
+
+
 @pytest.mark.parametrize(
     "bad_file_name", ["test", "test.invalid_extension", "test.yaml"]
 )
@@ -81,3 +116,177 @@ def test_raises_error_on_unexpected_file_type(
 
     with pytest.raises(errors.UnsupportedFileType):
         read_configuration_file(location)
+
+
+class TestParseCache:
+    @pytest.fixture(autouse=True)
+    def parse_cache(self):
+        engine.clear_parse_cache()
+        yield
+        engine.configure_parse_cache(128)
+        engine.clear_parse_cache()
+
+    @pytest.fixture
+    def config(self, cfg: dict, temp_dir: pathlib.Path):
+        location = temp_dir / "config.toml"
+        write_configuration_file(cfg, location)
+        return location
+
+    def test_counts_hits_and_misses(self, cfg: dict, config: pathlib.Path):
+        assert read_configuration_file(config) == cfg
+        assert read_configuration_file(config) == cfg
+
+        info = engine.parse_cache_info()
+        assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+    def test_changes_dont_leak_between_reads(self, cfg: dict, config: pathlib.Path):
+        first = read_configuration_file(config)
+        first["nested"]["foo"] = "changed"
+        first["new"] = True
+
+        assert read_configuration_file(config) == cfg
+
+    def test_rereads_modified_file(self, config: pathlib.Path):
+        read_configuration_file(config)
+        write_configuration_file({"root": False, "nested": {"bar": 10}}, config)
+
+        assert read_configuration_file(config) == {
+            "root": False,
+            "nested": {"bar": 10},
+        }
+        assert engine.parse_cache_info().hits == 0
+
+    def test_bypass_cache(self, config: pathlib.Path):
+        read_configuration_file(config, use_cache=False)
+        assert engine.parse_cache_info() == engine.CacheInfo(0, 0, 128, 0)
+
+    def test_disable_cache(self, config: pathlib.Path):
+        engine.configure_parse_cache(0)
+        read_configuration_file(config)
+        read_configuration_file(config)
+
+        assert engine.parse_cache_info() == engine.CacheInfo(0, 0, 0, 0)
+
+    def test_evicts_least_recently_used(self, cfg: dict, temp_dir: pathlib.Path):
+        engine.configure_parse_cache(2)
+        locations = [temp_dir / f"config_{i}.json" for i in range(3)]
+        for location in locations:
+            write_configuration_file(cfg, location)
+
+        read_configuration_file(locations[0])
+        read_configuration_file(locations[1])
+        read_configuration_file(locations[0])
+        read_configuration_file(locations[2])
+        assert engine.parse_cache_info().currsize == 2
+
+        # The first file was used more recently than the second
+        read_configuration_file(locations[0])
+        read_configuration_file(locations[1])
+        info = engine.parse_cache_info()
+        assert (info.hits, info.misses) == (2, 4)
+
+
+class TestIncludes:
+    @pytest.fixture
+    def write(self, temp_dir: pathlib.Path):
+        def write(name: str, contents: dict) -> pathlib.Path:
+            location = temp_dir / name
+            location.parent.mkdir(parents=True, exist_ok=True)
+            write_configuration_file(contents, location)
+            return location
+
+        return write
+
+    @pytest.fixture
+    def reads(self, monkeypatch):
+        reads = []
+        read = engine.read_configuration_file
+
+        def counting_read(location, **kwargs):
+            reads.append(location.name)
+            return read(location, **kwargs)
+
+        monkeypatch.setattr(engine, "read_configuration_file", counting_read)
+        return reads
+
+    def test_no_includes(self, write):
+        location = write("config.toml", {"a": 1})
+        assert read_configuration_files([location]) == [{"a": 1}]
+
+    def test_includes_come_first(self, write):
+        write("common/db.toml", {"db": "common"})
+        write("common/logging.json", {"logging": "common"})
+        location = write(
+            "config.toml",
+            {"include": ["common/db.toml", "common/logging.json"], "db": "main"},
+        )
+
+        assert read_configuration_files([location]) == [
+            {"db": "common"},
+            {"logging": "common"},
+            {"db": "main"},
+        ]
+
+    def test_include_single_path(self, write):
+        write("common.toml", {"a": 1})
+        location = write("config.toml", {"include": "common.toml"})
+
+        assert read_configuration_files([location]) == [{"a": 1}, {}]
+
+    def test_nested_includes_are_relative(self, write):
+        write("common/shared/base.toml", {"base": True})
+        write("common/db.toml", {"include": ["shared/base.toml"], "db": True})
+        location = write("config.toml", {"include": ["common/db.toml"]})
+
+        assert read_configuration_files([location]) == [
+            {"base": True},
+            {"db": True},
+            {},
+        ]
+
+    def test_diamond_reads_shared_include_once(self, write, reads):
+        write("shared.toml", {"shared": True})
+        write("left.toml", {"include": ["shared.toml"], "left": True})
+        write("right.toml", {"include": ["shared.toml"], "right": True})
+        location = write("top.toml", {"include": ["left.toml", "right.toml"]})
+        other = write("other.toml", {"include": ["shared.toml"]})
+
+        layers = read_configuration_files([location, other])
+
+        assert layers == [
+            {"shared": True},
+            {"left": True},
+            {"right": True},
+            {},
+            {},
+        ]
+        assert sorted(reads) == sorted(
+            ["top.toml", "left.toml", "right.toml", "shared.toml", "other.toml"]
+        )
+
+    def test_cycle(self, write):
+        write("a.toml", {"include": ["b.toml"]})
+        write("b.toml", {"include": ["c.toml"]})
+        location = write("c.toml", {"include": ["a.toml"]})
+
+        with pytest.raises(errors.CircularInclude, match="b.toml -> .*c.toml"):
+            read_configuration_files([location])
+
+    def test_self_include(self, write):
+        location = write("a.toml", {"include": ["a.toml"]})
+
+        with pytest.raises(errors.CircularInclude):
+            read_configuration_files([location])
+
+    def test_missing_include(self, write):
+        location = write("config.toml", {"include": ["missing.toml"]})
+
+        with pytest.raises(FileNotFoundError, match="missing.toml"):
+            read_configuration_files([location])
+
+    @pytest.mark.parametrize("include", [1, [1], {"a": "b.toml"}])
+    def test_invalid_include(self, write, include):
+        location = write("config.json", {"include": include})
+
+        with pytest.raises(errors.UnsupportedConfiguration):
+            read_configuration_files([location])
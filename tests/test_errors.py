@@ -3,13 +3,29 @@ from typing import Type
 import pytest
 
 from dotcfg.errors import (
+    CircularInclude,
     ConfigurationError,
+    ProvenanceNotTracked,
+    RemoteSourceError,
+    ResolverError,
+    UnknownConfigVersion,
     UnsupportedConfiguration,
     UnsupportedFileType,
 )
 
 
-@pytest.mark.parametrize("err", [UnsupportedFileType, UnsupportedConfiguration])
+@pytest.mark.parametrize(
+    "err",
+    [
+        UnsupportedFileType,
+        UnsupportedConfiguration,
+        CircularInclude,
+        ResolverError,
+        UnknownConfigVersion,
+        RemoteSourceError,
+        ProvenanceNotTracked,
+    ],
+)
 def test_subclass_of_project_error(err: Type[Exception]):
 
     with pytest.raises(ConfigurationError):
@@ -0,0 +1,179 @@
+import http.server
+import json
+import os
+import pathlib
+import tempfile
+import threading
+
+import pytest
+import toml
+
+from dotcfg import errors, remote
+from dotcfg.configuration import load_configuration
+from dotcfg.remote import HttpSource
+from dotcfg.sources import ConfigLoader
+
+
+class ConfigService(http.server.ThreadingHTTPServer):
+    """Stand in for a configuration service, serving a single document"""
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), ConfigHandler)
+        self.document = {"database": {"host": "remote"}}
+        self.etag = '"1"'
+        # Statuses to respond with (before serving the document), such as 503
+        self.failures = []
+        self.requests = []
+        self.connections = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/config.json"
+
+
+class ConfigHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: ConfigService
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        self.server.connections.add(self.client_address)
+
+        if self.server.failures:
+            self.send_response(self.server.failures.pop(0))
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path != "/config.json":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.server.etag)
+            self.end_headers()
+            return
+
+        body = json.dumps(self.server.document).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def service():
+    server = ConfigService()
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    remote._POOL.clear()
+
+
+@pytest.fixture
+def cache_dir(monkeypatch):
+    with tempfile.TemporaryDirectory() as td:
+        monkeypatch.setenv(remote.CACHE_DIR_ENV_VAR, td)
+        yield pathlib.Path(td)
+
+
+def source(url: str, cache_dir: pathlib.Path, **kwargs) -> HttpSource:
+    kwargs.setdefault("share_window", 0)
+    kwargs.setdefault("backoff", 0.01)
+    return HttpSource(url, cache_dir=cache_dir, **kwargs)
+
+
+def test_revalidates_with_etag(service, cache_dir):
+    assert source(service.url, cache_dir).load() == service.document
+    assert "If-None-Match" not in service.requests[0]
+
+    # As if the process restarted, with only the on disk cache
+    restarted = source(service.url, cache_dir)
+    assert restarted.load() == service.document
+    assert service.requests[1]["If-None-Match"] == '"1"'
+
+    service.document = {"database": {"host": "changed"}}
+    service.etag = '"2"'
+    assert restarted.load() == {"database": {"host": "changed"}}
+
+
+def test_reuses_connections(service, cache_dir):
+    config = source(service.url, cache_dir)
+    for _ in range(3):
+        config.load()
+    assert len(service.requests) == 3
+    assert len(service.connections) == 1
+
+
+def test_falls_back_to_cache(service, cache_dir):
+    url = service.url
+    source(url, cache_dir).load()
+    service.shutdown()
+    service.server_close()
+    remote._POOL.clear()
+
+    offline = source(url, cache_dir, max_attempts=2, timeout=1)
+    assert offline.load() == {"database": {"host": "remote"}}
+    assert offline.from_cache
+    assert offline.last_error is not None
+
+    with pytest.raises(errors.RemoteSourceError):
+        source(url, cache_dir / "empty", max_attempts=1, timeout=1).load()
+
+
+def test_retries_unavailable_service(service, cache_dir):
+    service.failures = [503, 429]
+    config = source(service.url, cache_dir)
+    assert config.load() == service.document
+    assert len(service.requests) == 3
+    assert not config.from_cache
+
+
+def test_missing_configuration(service, cache_dir):
+    with pytest.raises(errors.RemoteSourceError):
+        source(service.url.replace("config", "missing"), cache_dir).load()
+    assert len(service.requests) == 1
+
+
+def test_shares_recent_responses(service, cache_dir):
+    source(service.url, cache_dir).load()
+    # Another process starting at the same time uses the response just fetched
+    assert source(service.url, cache_dir, share_window=60).load() == service.document
+    assert len(service.requests) == 1
+
+
+def test_load_configuration(service, cache_dir):
+    location = cache_dir / "local.toml"
+    location.write_text(toml.dumps({"database": {"port": 5432}}))
+
+    config = load_configuration(str(location), service.url)
+    assert config.database == {"host": "remote", "port": 5432}
+
+    os.remove(location)
+    with pytest.raises(FileNotFoundError):
+        load_configuration(service.url, str(location))
+
+
+def test_config_loader(service, cache_dir):
+    loader = ConfigLoader(source(service.url, cache_dir))
+    config = loader.load()
+    # Revalidated with a 304, so the configuration isn't rebuilt
+    assert loader.load() is config
+    assert len(service.requests) == 2
+
+    service.document = {"database": {"host": "changed"}}
+    service.etag = '"2"'
+    assert loader.load().database.host == "changed"
@@ -0,0 +1,147 @@
+import pathlib
+import sys
+import tempfile
+
+import pytest
+import toml
+
+from dotcfg import errors, resolvers
+from dotcfg.configuration import load_configuration, replace_variable_references
+from dotcfg.collections import CompoundKey
+
+
+@pytest.fixture
+def temp_dir():
+    with tempfile.TemporaryDirectory() as td:
+        yield pathlib.Path(td)
+
+
+@pytest.fixture
+def calls():
+    """Registers counting resolvers for the duration of a test"""
+    calls = {"upper": [], "batch": []}
+
+    def upper(argument):
+        calls["upper"].append(argument)
+        return argument.upper()
+
+    def batch(arguments):
+        calls["batch"].append(arguments)
+        return {argument: f"batched-{argument}" for argument in arguments}
+
+    resolvers.register_resolver("upper", upper)
+    resolvers.register_resolver("batch", batch, batch=True)
+    yield calls
+    resolvers.unregister_resolver("upper")
+    resolvers.unregister_resolver("batch")
+
+
+def test_env_resolver(monkeypatch):
+    monkeypatch.setenv("DOTCFG_TEST_USER", "alice")
+    flat = {
+        CompoundKey(["user"]): "${env:DOTCFG_TEST_USER}",
+        CompoundKey(["greeting"]): "hi ${env:DOTCFG_TEST_USER}",
+        CompoundKey(["missing"]): "${env:DOTCFG_TEST_NOT_SET}",
+    }
+    output = replace_variable_references(flat)
+    assert output[CompoundKey(["user"])] == "alice"
+    assert output[CompoundKey(["greeting"])] == "hi alice"
+    assert output[CompoundKey(["missing"])] == ""
+
+
+def test_file_resolver_strips_trailing_newline(temp_dir: pathlib.Path):
+    secret = temp_dir / "password"
+    secret.write_text("hunter2\n")
+    flat = {CompoundKey(["password"]): f"${{file:{secret}}}"}
+    assert replace_variable_references(flat)[CompoundKey(["password"])] == "hunter2"
+
+
+def test_failed_resolution_raises(temp_dir: pathlib.Path):
+    flat = {CompoundKey(["password"]): f"${{file:{temp_dir / 'missing'}}}"}
+    with pytest.raises(errors.ResolverError, match="file"):
+        replace_variable_references(flat)
+
+
+def test_unregistered_namespace_is_a_key_lookup():
+    flat = {
+        CompoundKey(["a:b"]): 1,
+        CompoundKey(["ref"]): "${a:b}",
+    }
+    assert replace_variable_references(flat)[CompoundKey(["ref"])] == 1
+
+
+def test_references_are_memoized(calls):
+    flat = {CompoundKey([f"key{i}"]): "${upper:value}" for i in range(40)}
+    flat[CompoundKey(["list"])] = ["${upper:value}", "${upper:other}"]
+    output = replace_variable_references(flat)
+    assert output.pop(CompoundKey(["list"])) == ["VALUE", "OTHER"]
+    assert set(output.values()) == {"VALUE"}
+    assert sorted(calls["upper"]) == ["other", "value"]
+
+
+def test_memoization_can_be_disabled(calls):
+    upper = resolvers._RESOLVERS["upper"].function
+    resolvers.register_resolver("upper", upper, memoize=False)
+    context = resolvers.ResolutionContext()
+    assert context.resolve("upper", "a") == context.resolve("upper", "a") == "A"
+    assert calls["upper"] == ["a", "a"]
+
+
+def test_batch_resolvers_are_called_once(calls):
+    flat = {
+        CompoundKey(["a"]): "${batch:one}",
+        CompoundKey(["b"]): "${batch:two} and ${batch:one}",
+        CompoundKey(["c"]): ["${batch:three}"],
+    }
+    output = replace_variable_references(flat)
+    assert output[CompoundKey(["a"])] == "batched-one"
+    assert output[CompoundKey(["b"])] == "batched-two and batched-one"
+    assert output[CompoundKey(["c"])] == ["batched-three"]
+    assert calls["batch"] == [["one", "three", "two"]]
+
+
+def test_nested_reference_inside_resolver_argument(calls):
+    flat = {
+        CompoundKey(["name"]): "value",
+        CompoundKey(["ref"]): "${upper:${name}}",
+    }
+    assert replace_variable_references(flat)[CompoundKey(["ref"])] == "VALUE"
+
+
+def test_invalid_namespace():
+    with pytest.raises(ValueError):
+        resolvers.register_resolver("not valid", str)
+
+
+def test_cmd_resolver():
+    command = f"{sys.executable} -c 'print(42)'"
+    assert resolvers.resolve_cmd(command) == "42"
+    assert resolvers.parse_reference(f"cmd:{command}") is None
+
+
+def test_load_configuration_reads_each_file_once(temp_dir: pathlib.Path, monkeypatch):
+    secret = temp_dir / "token"
+    secret.write_text("s3cret\n")
+    reads = []
+    monkeypatch.setitem(
+        resolvers._RESOLVERS,
+        "file",
+        resolvers._RESOLVERS["file"]._replace(
+            function=lambda path: reads.append(path) or resolvers.resolve_file(path)
+        ),
+    )
+
+    location = temp_dir / "config.toml"
+    contents = {
+        f"service_{i}": {
+            "token": f"${{file:{secret}}}",
+            "header": "Bearer ${file:%s}" % secret,
+        }
+        for i in range(20)
+    }
+    location.write_text(toml.dumps(contents))
+
+    config = load_configuration(location)
+    assert config.service_0.token == "s3cret"
+    assert config.service_19.header == "Bearer s3cret"
+    assert reads == [str(secret)]
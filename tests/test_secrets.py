@@ -0,0 +1,171 @@
+import pathlib
+import tempfile
+import time
+
+import pytest
+import toml
+
+from dotcfg import resolvers
+from dotcfg.configuration import load_configuration
+from dotcfg.secrets import (
+    SECRET_NAMESPACE,
+    CachedSecretProvider,
+    FileSecretProvider,
+    SecretProvider,
+    register_secret_provider,
+)
+
+
+class CountingProvider(SecretProvider):
+    def __init__(self, secrets: dict) -> None:
+        self.secrets = secrets
+        self.calls = []
+
+    def fetch_many(self, names):
+        self.calls.append(sorted(names))
+        return {name: self.secrets[name] for name in names if name in self.secrets}
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def temp_dir():
+    with tempfile.TemporaryDirectory() as td:
+        yield pathlib.Path(td)
+
+
+@pytest.fixture
+def unregister():
+    yield
+    resolvers.unregister_resolver(SECRET_NAMESPACE)
+
+
+def test_file_provider(temp_dir: pathlib.Path):
+    (temp_dir / "db_password").write_text("hunter2\n")
+    provider = FileSecretProvider(temp_dir)
+    assert provider.fetch_many(["db_password", "missing"]) == {"db_password": "hunter2"}
+    assert provider.fetch("db_password") == "hunter2"
+    assert provider.fetch("missing") is None
+
+    with pytest.raises(ValueError):
+        provider.fetch("../etc/passwd")
+
+
+def test_secrets_fetched_in_one_batch(temp_dir: pathlib.Path, unregister):
+    provider = CountingProvider({"db": "hunter2", "api": "token"})
+    register_secret_provider(provider)
+
+    location = temp_dir / "config.toml"
+    contents = {
+        f"service_{i}": {"password": "${secret:db}", "header": "Bearer ${secret:api}"}
+        for i in range(40)
+    }
+    location.write_text(toml.dumps(contents))
+
+    config = load_configuration(location)
+    assert config.service_0.password == "hunter2"
+    assert config.service_39.header == "Bearer token"
+    assert provider.calls == [["api", "db"]]
+
+
+def test_cached_provider_ttl():
+    clock = Clock()
+    backing = CountingProvider({"db": "one"})
+    provider = CachedSecretProvider(backing, ttl=10, clock=clock)
+
+    assert provider.fetch_many(["db"]) == {"db": "one"}
+    backing.secrets["db"] = "two"
+    clock.now = 9
+    assert provider.fetch("db") == "one"
+    assert len(backing.calls) == 1
+
+    clock.now = 10
+    assert provider.fetch("db") == "two"
+    assert len(backing.calls) == 2
+
+
+def test_cached_provider_refreshes_expiring_secrets():
+    clock = Clock()
+    backing = CountingProvider({"db": "one", "api": "token"})
+    provider = CachedSecretProvider(backing, ttl=10, refresh_before=2, clock=clock)
+    provider.fetch_many(["db"])
+    clock.now = 5
+    provider.fetch_many(["api"])
+
+    backing.secrets["db"] = "two"
+    clock.now = 8
+    provider.refresh()
+    # Only the secret about to expire is refetched
+    assert backing.calls[-1] == ["db"]
+    clock.now = 12
+    assert provider.fetch_many(["db", "api"]) == {"db": "two", "api": "token"}
+    assert len(backing.calls) == 3
+
+
+def test_cached_provider_keeps_values_when_refresh_fails():
+    class FailingProvider(CountingProvider):
+        fail = False
+
+        def fetch_many(self, names):
+            if self.fail:
+                raise ConnectionError("unavailable")
+            return super().fetch_many(names)
+
+    clock = Clock()
+    backing = FailingProvider({"db": "one"})
+    provider = CachedSecretProvider(backing, ttl=10, clock=clock)
+    provider.fetch("db")
+
+    backing.fail = True
+    clock.now = 9
+    provider.refresh()
+    assert isinstance(provider.last_error, ConnectionError)
+    assert provider.fetch("db") == "one"
+
+
+def test_background_refresh():
+    backing = CountingProvider({"db": "one"})
+    provider = CachedSecretProvider(backing, ttl=0.2, refresh_before=0.15)
+    provider.fetch("db")
+    backing.secrets["db"] = "two"
+
+    provider.start(interval=0.01)
+    try:
+        deadline = time.monotonic() + 5
+        while provider.get("db") != "two" and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        provider.stop()
+
+    assert provider.get("db") == "two"
+    assert provider.get("missing") is None
+
+
+def test_cached_provider_only_refreshes_requested_secrets():
+    clock = Clock()
+    backing = CountingProvider({"db": "one", "api": "token"})
+    provider = CachedSecretProvider(backing, ttl=10, refresh_before=2, clock=clock)
+    provider.fetch_many(["db", "api"])
+
+    clock.now = 8
+    provider.refresh()
+    assert backing.calls[-1] == ["api", "db"]
+
+    # Only "db" was requested within the last TTL
+    clock.now = 12
+    provider.fetch("db")
+    clock.now = 17
+    provider.refresh()
+    assert backing.calls[-1] == ["db"]
+
+    # Secrets that are no longer requested are dropped once they expire
+    clock.now = 19
+    provider.refresh()
+    assert provider.get("api") is None
+    assert provider.get("db") == "one"
@@ -0,0 +1,140 @@
+import datetime
+import io
+import json
+
+import pytest
+import toml
+
+from dotcfg import collections
+from dotcfg.configuration import load_environment_variables
+from dotcfg.serializers import REDACTED, dump_env, dump_json, dump_toml
+
+
+@pytest.fixture
+def config():
+    return collections.Config(
+        {
+            "name": "api",
+            "debug": False,
+            "ratio": 0.5,
+            "created": datetime.datetime(2020, 1, 1, 12, 30),
+            "database": {
+                "host": "localhost",
+                "port": 5432,
+                "password": "hunter2",
+                "replica": {"host": "replica", "weird key": 'quoted "value"\n'},
+            },
+            "tags": ["a", "b"],
+            "services": [
+                {"name": "web", "port": 80, "limits": {"cpu": 2}},
+                {"name": "worker", "port": 81},
+            ],
+            "empty": {},
+        }
+    )
+
+
+def dumped(dump, config, **kwargs) -> str:
+    buffer = io.StringIO()
+    dump(config, buffer, **kwargs)
+    return buffer.getvalue()
+
+
+class TestDumpJson:
+    def test_round_trip(self, config):
+        expected = json.loads(json.dumps(config.to_dict(), default=str))
+        expected["created"] = "2020-01-01T12:30:00"
+        assert json.loads(dumped(dump_json, config)) == expected
+
+    def test_empty(self):
+        assert dumped(dump_json, {}) == "{}"
+
+    def test_redaction(self, config):
+        data = json.loads(
+            dumped(dump_json, config, redact=["*.password", "services.*.limits"])
+        )
+        assert data["database"]["password"] == REDACTED
+        assert data["database"]["host"] == "localhost"
+        assert data["services"][0]["limits"] == REDACTED
+
+
+class TestDumpToml:
+    def test_round_trip(self, config):
+        assert toml.loads(dumped(dump_toml, config)) == config.to_dict()
+
+    def test_skips_none(self):
+        assert toml.loads(dumped(dump_toml, {"a": None, "b": 1})) == {"b": 1}
+
+    def test_redacts_sections(self, config):
+        data = toml.loads(
+            dumped(dump_toml, config, redact=["database.replica", "services.0.*"])
+        )
+        assert data["database"]["replica"] == REDACTED
+        assert data["services"][0] == {
+            "name": REDACTED,
+            "port": REDACTED,
+            "limits": REDACTED,
+        }
+        assert data["services"][1]["name"] == "worker"
+        assert data["database"]["port"] == 5432
+
+
+class TestDumpEnv:
+    @pytest.fixture
+    def config(self, config):
+        # Dates can't be represented as environment variables
+        del config["created"]
+        return config
+
+    def test_round_trip(self, config, monkeypatch):
+        for line in dumped(dump_env, config, prefix="DOTCFG").splitlines():
+            name, value = line.split("=", 1)
+            monkeypatch.setenv(name, value)
+
+        loaded = load_environment_variables("DOTCFG")
+        assert loaded[collections.CompoundKey(["database", "port"])] == 5432
+        assert loaded[collections.CompoundKey(["debug"])] is False
+        assert loaded[collections.CompoundKey(["tags"])] == ["a", "b"]
+        assert (
+            loaded[collections.CompoundKey(["database", "replica", "weird key"])]
+            == 'quoted "value"\n'
+        )
+
+    def test_redaction(self, config):
+        lines = dumped(dump_env, config, redact=["database.*"]).splitlines()
+        assert f"DATABASE__PASSWORD={REDACTED}" in lines
+        assert f"DATABASE__REPLICA={REDACTED}" in lines
+        assert "NAME=api" in lines
+
+    def test_unrepresentable_keys(self):
+        with pytest.raises(ValueError, match="Upper"):
+            dumped(dump_env, {"section": {"Upper": 1}})
+
+
+@pytest.mark.parametrize("dump", [dump_json, dump_toml, dump_env])
+def test_writes_in_chunks(dump, config):
+    del config["created"]
+
+    class CountingIO(io.StringIO):
+        writes = 0
+
+        def write(self, text):
+            self.writes += 1
+            return super().write(text)
+
+    small, large = CountingIO(), CountingIO()
+    dump(config, small, chunk_size=16)
+    dump(config, large)
+    assert small.getvalue() == large.getvalue()
+    assert small.writes > 1
+    assert large.writes == 1
+
+
+def test_compact_arrays():
+    config = collections.Config({"buckets": [1, 2, 3], "weights": {"w": [0.5, 1.5]}})
+    expected = config.to_dict()
+    collections.compact_lists(config, min_length=2)
+
+    assert json.loads(dumped(dump_json, config)) == expected
+    assert toml.loads(dumped(dump_toml, config)) == expected
+    assert dumped(dump_env, config) == "BUCKETS=[1, 2, 3]\nWEIGHTS__W=[0.5, 1.5]\n"
@@ -0,0 +1,163 @@
+import pathlib
+import tempfile
+
+import pytest
+import toml
+
+from dotcfg.configuration import load_configuration
+from dotcfg.sources import (
+    CallableSource,
+    ConfigLoader,
+    DictSource,
+    DirectorySource,
+    EnvSource,
+    FileSource,
+)
+
+
+@pytest.fixture
+def temp_dir():
+    with tempfile.TemporaryDirectory() as td:
+        yield pathlib.Path(td)
+
+
+def write(location: pathlib.Path, contents: dict) -> None:
+    location.write_text(toml.dumps(contents))
+
+
+class CountingSource(DictSource):
+    def __init__(self, data: dict) -> None:
+        super().__init__(data)
+        self.loads = 0
+
+    def load(self) -> dict:
+        self.loads += 1
+        return super().load()
+
+
+def test_file_source(temp_dir: pathlib.Path):
+    write(temp_dir / "common.toml", {"database": {"port": 5432}})
+    write(temp_dir / "config.toml", {"include": "common.toml", "env": "dev"})
+    source = FileSource(temp_dir / "config.toml")
+
+    assert source.load() == {"database": {"port": 5432}, "env": "dev"}
+    version = source.version()
+    assert not source.changed_since(version)
+
+    # Changes to included files are detected too
+    write(temp_dir / "common.toml", {"database": {"port": 15432}})
+    assert source.changed_since(version)
+
+
+def test_directory_source(temp_dir: pathlib.Path):
+    write(temp_dir / "10-base.toml", {"env": "base", "port": 80})
+    write(temp_dir / "20-prod.toml", {"env": "prod"})
+    (temp_dir / "README.md").write_text("Not configuration")
+    source = DirectorySource(temp_dir)
+
+    assert source.load() == {"env": "prod", "port": 80}
+    version = source.version()
+    assert not source.changed_since(version)
+
+    write(temp_dir / "30-local.toml", {"port": 8080})
+    assert source.changed_since(version)
+    assert source.load() == {"env": "prod", "port": 8080}
+
+
+def test_env_source(monkeypatch):
+    monkeypatch.setenv("DOTCFG__DATABASE__PORT", "5432")
+    source = EnvSource("DOTCFG")
+    assert source.load() == {"database": {"port": 5432}}
+
+    version = source.version()
+    monkeypatch.setenv("OTHER", "value")
+    assert not source.changed_since(version)
+    monkeypatch.setenv("DOTCFG__ENV", "prod")
+    assert source.changed_since(version)
+
+
+def test_dict_and_callable_sources():
+    source = DictSource({"env": "dev"})
+    version = source.version()
+    source.replace({"env": "prod"})
+    assert source.changed_since(version)
+    assert source.load() == {"env": "prod"}
+
+    unversioned = CallableSource(lambda: {"env": "dev"})
+    assert unversioned.changed_since(unversioned.version())
+    versioned = CallableSource(lambda: {"env": "dev"}, version=lambda: 1)
+    assert not versioned.changed_since(versioned.version())
+
+
+class TestConfigLoader:
+    def test_skips_unchanged_sources(self):
+        base = CountingSource({"env": "dev", "url": "https://${env}.example.com"})
+        overrides = CountingSource({"port": 80})
+        loader = ConfigLoader(base, overrides)
+
+        config = loader.load()
+        assert config.url == "https://dev.example.com"
+        assert loader.load() is config
+        assert (base.loads, overrides.loads) == (1, 1)
+
+        base.replace({"env": "prod", "url": "https://${env}.example.com"})
+        reloaded = loader.load()
+        assert reloaded.url == "https://prod.example.com"
+        assert reloaded.port == 80
+        assert (base.loads, overrides.loads) == (2, 1)
+
+    def test_skips_unchanged_files(self, temp_dir: pathlib.Path, monkeypatch):
+        (temp_dir / "conf.d").mkdir()
+        write(temp_dir / "common.toml", {"database": {"port": 5432}})
+        write(temp_dir / "config.toml", {"include": "common.toml", "env": "dev"})
+        write(temp_dir / "conf.d" / "10-base.toml", {"include": "../common.toml"})
+        write(temp_dir / "conf.d" / "20-prod.toml", {"env": "prod"})
+        monkeypatch.chdir(temp_dir)
+
+        loads = []
+
+        class CountingFileSource(FileSource):
+            def load(self) -> dict:
+                loads.append(self)
+                return super().load()
+
+        class CountingDirectorySource(DirectorySource):
+            def load(self) -> dict:
+                loads.append(self)
+                return super().load()
+
+        loader = ConfigLoader(
+            CountingFileSource("config.toml"), CountingDirectorySource("conf.d")
+        )
+        config = loader.load()
+        assert loader.load() is config
+        assert len(loads) == 2
+
+        write(temp_dir / "common.toml", {"database": {"port": 15432}})
+        assert loader.load().database.port == 15432
+        assert len(loads) == 4
+
+    def test_modified_configs_are_rebuilt(self):
+        loader = ConfigLoader(DictSource({"env": "dev"}))
+        config = loader.load()
+        config.env = "changed"
+        assert loader.load() == {"env": "dev"}
+
+    def test_paths(self, temp_dir: pathlib.Path, monkeypatch):
+        write(temp_dir / "config.toml", {"env": "dev"})
+        monkeypatch.setenv("DOTCFG__ENV", "prod")
+        loader = ConfigLoader(str(temp_dir / "config.toml"), EnvSource("DOTCFG"))
+        assert loader.load() == {"env": "prod"}
+
+
+def test_load_configuration_with_sources(temp_dir: pathlib.Path):
+    write(temp_dir / "config.toml", {"env": "dev", "port": 80})
+    config = load_configuration(
+        temp_dir / "config.toml",
+        DictSource({"port": 8080}),
+        FileSource(temp_dir / "config.toml"),
+    )
+    assert config == {"env": "dev", "port": 80}
+
+    config = load_configuration(temp_dir / "config.toml", DictSource({"port": 8080}))
+    assert config == {"env": "dev", "port": 8080}
@@ -0,0 +1,134 @@
+import pathlib
+import tempfile
+import threading
+import time
+
+import pytest
+import toml
+
+from dotcfg.configuration import load_configuration
+from dotcfg.tenants import TenantConfigCache, config_size
+
+
+@pytest.fixture
+def temp_dir():
+    with tempfile.TemporaryDirectory() as td:
+        yield pathlib.Path(td)
+
+
+@pytest.fixture
+def base(temp_dir: pathlib.Path) -> pathlib.Path:
+    location = temp_dir / "base.toml"
+    location.write_text(
+        toml.dumps(
+            {
+                "tenant": "default",
+                "url": "https://${tenant}.example.com",
+                "database": {"host": "shared", "port": 5432},
+                "features": {f"flag_{i}": i % 2 == 0 for i in range(50)},
+            }
+        )
+    )
+    return location
+
+
+def test_file_overlays(temp_dir: pathlib.Path, base: pathlib.Path):
+    (temp_dir / "tenants").mkdir()
+    overlay = temp_dir / "tenants" / "acme.toml"
+    overlay.write_text(toml.dumps({"tenant": "acme", "database": {"host": "acme"}}))
+    tenants = TenantConfigCache([base], str(temp_dir / "tenants" / "{tenant}.toml"))
+
+    acme = tenants.get("acme")
+    assert acme == load_configuration(base, overlay)
+    assert acme.url == "https://acme.example.com"
+    assert tenants.get("acme") is acme
+
+    # Tenants without an overlay get the base configuration
+    assert tenants.get("other") == load_configuration(base)
+
+    with pytest.raises(ValueError):
+        tenants.get("../base")
+    assert tenants.info()[:4] == (1, 3, 0, 2)
+
+
+def test_arrays_of_tables(temp_dir: pathlib.Path):
+    base = temp_dir / "services.toml"
+    base.write_text(
+        toml.dumps({"host": "h", "services": [{"url": "${host}:1", "port": "8080"}]})
+    )
+    tenants = TenantConfigCache([base], lambda tenant: {"host": tenant})
+
+    assert tenants.get("acme").services == [{"url": "acme:1", "port": 8080}]
+
+
+def test_evicts_by_size(base: pathlib.Path):
+    tenants = TenantConfigCache([base], lambda tenant: {"tenant": tenant})
+    size = config_size(tenants.build("a"), tenants._shared)
+    # Values shared with the base aren't counted
+    assert size < config_size(tenants.build("a"))
+
+    tenants.max_bytes = int(size * 2.5)
+    first = tenants.get("a")
+    tenants.get("b")
+    tenants.get("a")
+    tenants.get("c")
+
+    assert "b" not in tenants
+    assert tenants.get("a") is first
+    info = tenants.info()
+    assert info.evictions == 1
+    assert info.nbytes <= info.max_bytes
+    assert len(tenants) == 2
+
+
+def test_single_flight(base: pathlib.Path):
+    builds = []
+
+    def slow_overlay(tenant: str) -> dict:
+        builds.append(tenant)
+        time.sleep(0.05)
+        return {"tenant": tenant}
+
+    tenants = TenantConfigCache([base], slow_overlay)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(tenants.get("acme")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert builds == ["acme"]
+    assert len(results) == 8
+    assert all(result is results[0] for result in results)
+
+
+def test_failed_builds_are_retried(base: pathlib.Path):
+    failures = [RuntimeError("unavailable")]
+
+    def overlay(tenant: str) -> dict:
+        if failures:
+            raise failures.pop()
+        return {"tenant": tenant}
+
+    tenants = TenantConfigCache([base], overlay)
+    with pytest.raises(RuntimeError):
+        tenants.get("acme")
+    assert tenants.get("acme").tenant == "acme"
+
+
+def test_invalidate_and_modified_configs(base: pathlib.Path):
+    tenants = TenantConfigCache([base], lambda tenant: None)
+    config = tenants.get("acme")
+    config.tenant = "changed"
+    rebuilt = tenants.get("acme")
+    assert rebuilt is not config
+    assert rebuilt.tenant == "default"
+
+    tenants.invalidate("acme")
+    assert "acme" not in tenants
+    tenants.get("acme")
+    tenants.invalidate()
+    assert tenants.info().nbytes == 0
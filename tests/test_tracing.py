@@ -0,0 +1,117 @@
+import pickle
+import time
+
+import pytest
+
+from dotcfg import collections
+from dotcfg.collections import CompoundKey
+from dotcfg.tracing import AccessTracer, TracedConfig
+
+
+@pytest.fixture
+def config():
+    return collections.Config(
+        {
+            "env": "prod",
+            "unused": 1,
+            "database": {"host": "localhost", "port": 5432, "legacy": {"a": 1}},
+            "services": [{"name": "api"}],
+        }
+    )
+
+
+def test_exact_dead_keys(config):
+    with AccessTracer(config, interval=60, exact_dead_keys=True) as tracer:
+        config.env
+        config["database"]["host"]
+        config.database.get("port")
+        config.services[0].name
+        report = tracer.report()
+
+    assert report.dead == [
+        CompoundKey(["unused"]),
+        CompoundKey(["database", "legacy", "a"]),
+    ]
+    assert CompoundKey(["database", "host"]) in report.first_reads
+    assert report.first_reads[CompoundKey(["env"])].startswith(__file__)
+
+
+def test_fully_read_nodes_stop_being_traced(config):
+    with AccessTracer(config, interval=60, exact_dead_keys=True):
+        assert type(config.database) is TracedConfig
+        assert type(config.database.legacy) is TracedConfig
+        config.database.host
+        config.database.port
+        config.database.legacy
+        # Every key of `database` has been read
+        assert type(config.database) is collections.Config
+        assert type(config.database.legacy) is TracedConfig
+
+    assert type(config) is collections.Config
+    assert type(config.database.legacy) is collections.Config
+
+
+def test_sampled_dead_keys(config):
+    with AccessTracer(config, interval=60) as tracer:
+        # Nothing is traced outside of sampling windows
+        assert type(config) is collections.Config
+        config.unused
+        tracer._begin_window()
+        config.env
+        tracer._end_window()
+        assert type(config) is collections.Config
+        report = tracer.report()
+
+    assert CompoundKey(["env"]) not in report.dead
+    assert CompoundKey(["unused"]) in report.dead
+    assert report.hot[0].path == CompoundKey(["env"])
+
+
+def test_sampled_counts(config):
+    with AccessTracer(config, sample_rate=0.5, interval=0.02) as tracer:
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            config.database.host
+            config.env
+            config.database.host
+        report = tracer.report(top=2)
+
+    hottest = report.hot[0]
+    assert {stats.path for stats in report.hot} == {
+        CompoundKey(["database"]),
+        CompoundKey(["database", "host"]),
+    }
+    # Windows can start or end between the two reads
+    assert report.hot[0].sampled_reads == pytest.approx(
+        report.hot[1].sampled_reads, rel=0.01
+    )
+    assert hottest.estimated_reads > hottest.sampled_reads
+    assert hottest.callers[0][0].startswith(__file__)
+
+
+def test_new_nodes_are_traced_after_the_next_window(config):
+    tracer = AccessTracer(config, interval=60, exact_dead_keys=True)
+    tracer.start()
+    try:
+        config.cache = {"ttl": 5}
+        tracer._begin_window()
+        tracer._end_window()
+        assert type(config.cache) is TracedConfig
+        assert CompoundKey(["cache", "ttl"]) in tracer.report().dead
+    finally:
+        tracer.stop()
+
+
+def test_invalid_sample_rate(config):
+    with pytest.raises(ValueError):
+        AccessTracer(config, sample_rate=0)
+
+
+def test_traced_configs_pickle_as_configs(config):
+    with AccessTracer(config, interval=60, exact_dead_keys=True):
+        assert type(config) is TracedConfig
+        restored = pickle.loads(pickle.dumps(config))
+
+    assert type(restored) is collections.Config
+    assert type(restored.database) is collections.Config
+    assert restored == config
@@ -1,9 +1,12 @@
 import functools
+import gc
+import math
 
 import pytest
 
 import tests
-from dotcfg.utils import set_temporary_config
+from dotcfg.collections import Config
+from dotcfg.utils import freeze_for_fork, set_temporary_config
 
 
 class TestSetTemporaryConfig:
@@ -62,3 +65,66 @@ class TestPartialedTempConfig:
         )
         with stc({"env": "OVERRIDE"}):
             assert tests.config.env == "OVERRIDE"
+
+
+class TestFreezeForFork:
+    @pytest.fixture(autouse=True)
+    def unfreeze(self):
+        yield
+        gc.unfreeze()
+
+    def test_freezes_objects(self):
+        config = Config({"a": {"host": "localhost"}, "b": {"host": "localhost"}})
+        result = freeze_for_fork(config)
+
+        assert result is config
+        assert gc.get_freeze_count() > 0
+
+    def test_values_unchanged(self):
+        contents = {
+            "flag": True,
+            "count": 1,
+            "ratio": 1.0,
+            "nested": {"name": "x", "items": [1, 1.0, True, "x"]},
+        }
+        config = freeze_for_fork(Config(contents))
+
+        assert config == contents
+        assert config.nested["items"][1] is not config.nested["items"][0]
+        assert isinstance(config.flag, bool)
+
+    def test_keeps_signed_zeros(self):
+        config = freeze_for_fork(Config({"a": 0.0, "b": -0.0, "c": [-0.0, 0.0]}))
+        assert math.copysign(1.0, config.a) == 1.0
+        assert math.copysign(1.0, config.b) == -1.0
+        assert [math.copysign(1.0, value) for value in config.c] == [-1.0, 1.0]
+
+    def test_shares_duplicate_keys_and_values(self):
+        config = Config(
+            {
+                "a": {"".join(["ho", "st"]): "".join(["local", "host"])},
+                "b": {"".join(["ho", "st"]): "".join(["local", "host"])},
+            }
+        )
+        freeze_for_fork(config)
+
+        a_key, a_value = next(iter(config.a.items()))
+        b_key, b_value = next(iter(config.b.items()))
+        assert a_key is b_key
+        assert a_value is b_value
+
+
+def test_temporary_config_keeps_unrelated_derived_values():
+    calls = []
+    env = tests.config.derived(lambda cfg: calls.append(1) or cfg.env)
+    assert env() == "testing"
+
+    with set_temporary_config({"setting": 1, "nested.key": 2}, set_location=tests):
+        assert env() == "testing"
+    assert env() == "testing"
+    assert len(calls) == 1
+
+    with set_temporary_config({"env": "OVERRIDE"}, set_location=tests):
+        assert env() == "OVERRIDE"
+    assert env() == "testing"
+    assert len(calls) == 3